@@ -0,0 +1,183 @@
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from io import BytesIO
+
+from benchmarks.fixtures import mandelbrot_style, counting_loops, large_source, last_digits, random_inputs
+from examples.bfuck import HELLO_WORLD, SIERPINSKI_TRINAGLE, GAME_OF_LIFE
+from interpreters import BrainFuckInterpreter
+from interpreters.bfuck import bytecode
+from interpreters.bfuck.ast_builder import BEASTBuilder
+from interpreters.bfuck.bytecode import OP_NAMES
+from interpreters.bfuck.environment import BFEnvironment
+from interpreters.bfuck.interpreter import ENGINES, AST_ENGINE, ENGINE_PROGRAMS
+from interpreters.bfuck.lockstep import BFLockstepRunner
+from interpreters.bfuck.optimizer import BFOptimizer
+from interpreters.bfuck.pool import BFInterpreterPool
+from interpreters.bfuck.profiler import BFProfiler
+
+# Draws a glider, lets it run for a couple of generations and quits
+GAME_OF_LIFE_INPUT = b"bc\ncd\ndb\ndc\ndd\n\n\nq\n"
+
+
+def workloads(large_size):
+    return {"hello_world": (HELLO_WORLD, b""),
+            "sierpinski": (SIERPINSKI_TRINAGLE, b""),
+            "game_of_life": (GAME_OF_LIFE, GAME_OF_LIFE_INPUT),
+            "mandelbrot_style": (mandelbrot_style(), b""),
+            "counting_loops": (counting_loops(), b""),
+            "large_source": (large_source(large_size), b"")}
+
+
+def count_instructions(code, input_data, optimize):
+    # Commands of the command graph executed, the common yardstick for every engine. Counting the unoptimized
+    # source instead would mean running hundreds of millions of steps for a couple of Game of Life generations.
+    env = BFEnvironment(input_stream=BytesIO(input_data), output_stream=BytesIO())
+    command = BEASTBuilder(code).build_ast()
+    if optimize:
+        command = BFOptimizer(env.cell_bits).optimize(command)
+    executed = 0
+    while command is not None:
+        command = command.execute(env)
+        executed += 1
+    return executed
+
+
+def run_phases(code, input_data, engine, optimize):
+    output_stream = BytesIO()
+    interpreter = BrainFuckInterpreter(code, engine=engine, optimize=optimize, input_stream=BytesIO(input_data),
+                                       output_stream=output_stream)
+    timings = {}
+    start = time.perf_counter()
+    ast = BEASTBuilder(code).build_ast()
+    timings["parse_seconds"] = time.perf_counter() - start
+    start = time.perf_counter()
+    if optimize:
+        ast = BFOptimizer(interpreter.env.cell_bits).optimize(ast)
+    timings["optimize_seconds"] = time.perf_counter() - start
+    interpreter._cached_ast = ast
+    start = time.perf_counter()
+    if engine in ENGINE_PROGRAMS:
+        interpreter._cached_program = interpreter._compile(ast)
+    timings["compile_seconds"] = time.perf_counter() - start
+    start = time.perf_counter()
+    interpreter.execute()
+    timings["execute_seconds"] = time.perf_counter() - start
+    timings["output_bytes"] = len(output_stream.getvalue())
+    return timings
+
+
+def tune_superinstructions(programs, optimize=True):
+    profilers = []
+    for code, input_data in programs.values():
+        env = BFEnvironment(input_stream=BytesIO(input_data), output_stream=BytesIO())
+        ast = BEASTBuilder(code).build_ast()
+        if optimize:
+            ast = BFOptimizer(env.cell_bits, fresh_tape=True).optimize(ast)
+        profiler = BFProfiler(ast)
+        profiler.run(env)
+        profilers.append(profiler)
+    return [[OP_NAMES[op] for op in pattern] for pattern in bytecode.tune_superinstructions(profilers)]
+
+
+def lockstep(lanes, optimize=True, repeat=3):
+    # One input driven program over a batch of inputs, all of them in lockstep against one pooled run per input
+    code, inputs = last_digits(), random_inputs(lanes)
+    lockstep_seconds = separate_seconds = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        BFLockstepRunner(code, optimize=optimize, max_lanes=lanes).run(inputs)
+        lockstep_seconds = min(lockstep_seconds, time.perf_counter() - start)
+        start = time.perf_counter()
+        pool = BFInterpreterPool(code, optimize=optimize)
+        for input_data in inputs:
+            pool.execute(BytesIO(input_data), BytesIO())
+        separate_seconds = min(separate_seconds, time.perf_counter() - start)
+    print(f"last_digits x{lanes:<10} lockstep {lockstep_seconds:>9.4f}s separate {separate_seconds:>9.4f}s",
+          file=sys.stderr)
+    return {"program": "last_digits",
+            "lanes": lanes,
+            "lockstep_seconds": lockstep_seconds,
+            "separate_seconds": separate_seconds,
+            "speedup": separate_seconds / lockstep_seconds}
+
+
+def peak_memory(code, input_data, engine, optimize):
+    tracemalloc.start()
+    try:
+        run_phases(code, input_data, engine, optimize)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def benchmark(programs, engines, optimize=True, repeat=3, memory=True):
+    results = []
+    comparisons = {}
+    for name, (code, input_data) in programs.items():
+        instructions = count_instructions(code, input_data, optimize)
+        execute_seconds = {}
+        for engine in engines:
+            runs = [run_phases(code, input_data, engine, optimize) for _ in range(repeat)]
+            best = {key: min(run[key] for run in runs) for key in runs[0]}
+            result = {"program": name,
+                      "engine": engine,
+                      "optimize": optimize,
+                      "source_bytes": len(code),
+                      "instructions": instructions,
+                      "instructions_per_second": instructions / best["execute_seconds"],
+                      **best}
+            if memory:
+                result["peak_memory_bytes"] = peak_memory(code, input_data, engine, optimize)
+            results.append(result)
+            execute_seconds[engine] = best["execute_seconds"]
+            print(f"{name:<18} {engine:<10} {best['execute_seconds']:>9.4f}s "
+                  f"{result['instructions_per_second']:>14,.0f} instructions/s", file=sys.stderr)
+        if AST_ENGINE in execute_seconds:
+            comparisons[name] = {engine: execute_seconds[AST_ENGINE] / seconds
+                                 for engine, seconds in execute_seconds.items()}
+    return {"python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "results": results,
+            "speedup_over_ast": comparisons}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time parsing, optimization and execution of brainfuck programs")
+    parser.add_argument("--engines", nargs="+", default=list(ENGINES), choices=ENGINES)
+    parser.add_argument("--programs", nargs="+", help="Only run these workloads")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement, the best one is kept")
+    parser.add_argument("--no-optimize", action="store_true")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the (slow) traced peak memory run")
+    parser.add_argument("--large-size", type=int, default=200000, help="Size of the generated large source")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--tune-superinstructions", action="store_true",
+                        help="Report the bytecode superinstructions ordered by dispatches saved instead of timing")
+    parser.add_argument("--lockstep", type=int, metavar="LANES",
+                        help="Time a batch of this many inputs on the lockstep engine against separate runs instead")
+    args = parser.parse_args(argv)
+
+    programs = workloads(args.large_size)
+    if args.programs:
+        programs = {name: programs[name] for name in args.programs}
+    if args.tune_superinstructions:
+        report = {"superinstructions": tune_superinstructions(programs, optimize=not args.no_optimize)}
+    elif args.lockstep:
+        report = {"lockstep": lockstep(args.lockstep, optimize=not args.no_optimize, repeat=args.repeat)}
+    else:
+        report = benchmark(programs, args.engines, optimize=not args.no_optimize, repeat=args.repeat,
+                           memory=not args.no_memory)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+import random
+
+
+class BFWriter:
+    # Tiny helper to write brainfuck in terms of named cells instead of raw pointer moves
+
+    def __init__(self):
+        self.code = []
+        self.pointer = 0
+
+    def goto(self, cell):
+        delta = cell - self.pointer
+        self.code.append(">" * delta if delta > 0 else "<" * -delta)
+        self.pointer = cell
+
+    def add(self, cell, amount):
+        self.goto(cell)
+        self.code.append("+" * amount if amount > 0 else "-" * -amount)
+
+    def clear(self, cell):
+        self.goto(cell)
+        self.code.append("[-]")
+
+    def output(self, cell):
+        self.goto(cell)
+        self.code.append(".")
+
+    def loop(self, cell, body):
+        self.goto(cell)
+        self.code.append("[")
+        body()
+        self.goto(cell)
+        self.code.append("]")
+
+    def move(self, source, *targets):
+        def body():
+            self.add(source, -1)
+            for target in targets:
+                self.add(target, 1)
+        self.loop(source, body)
+
+    def copy(self, source, target, temp):
+        self.move(source, target, temp)
+        self.move(temp, source)
+
+    def __str__(self):
+        return "".join(self.code)
+
+
+def mandelbrot_style(rows=12, columns=24, iterations=6):
+    # Same shape as the classic mandelbrot renderer: a grid where every point iterates z = z * z + c a fixed number
+    # of times and prints the result. The squaring is a loop around a copy loop, so it can't be folded away.
+    y, x, z, c, iteration, t1, t2, t3, newline = range(9)
+    w = BFWriter()
+    w.add(newline, 10)
+    w.add(y, rows)
+
+    def row():
+        w.add(x, columns)
+
+        def point():
+            w.clear(z)
+            w.copy(x, z, t1)
+            w.clear(c)
+            w.copy(y, c, t1)
+            w.copy(x, c, t1)
+            w.add(iteration, iterations)
+
+            def step():
+                w.copy(z, t1, t3)
+                w.copy(z, t2, t3)
+                w.clear(z)
+
+                def square():
+                    w.add(t1, -1)
+                    w.copy(t2, z, t3)
+                w.loop(t1, square)
+                w.clear(t2)
+                w.copy(c, z, t3)
+                w.add(iteration, -1)
+            w.loop(iteration, step)
+            w.output(z)
+            w.add(x, -1)
+        w.loop(x, point)
+        w.output(newline)
+        w.add(y, -1)
+    w.loop(y, row)
+    return str(w)
+
+
+def counting_loops(levels=3, count=80):
+    # Plain nested countdowns, every level resets the counter below it and bumps a tally on the way. Counters go
+    # down two at a time so the optimizer can't turn the innermost loop into a multiplication.
+    w = BFWriter()
+    tally = levels
+
+    def level(depth):
+        def body():
+            w.add(tally, 1)
+            if depth + 1 < levels:
+                w.add(depth + 1, 2 * count)
+                level(depth + 1)
+            w.add(depth, -2)
+        w.loop(depth, body)
+    w.add(0, 2 * count)
+    level(0)
+    w.output(tally)
+    return str(w)
+
+
+def large_source(size=1000000, seed=0):
+    # Machine-generated looking straight-line code with small clear/copy loops, always terminates
+    rng = random.Random(seed)
+    pieces = []
+    length = 0
+    while length < size:
+        kind = rng.random()
+        if kind < 0.4:
+            piece = rng.choice("+-") * rng.randint(1, 12)
+        elif kind < 0.7:
+            piece = rng.choice("<>") * rng.randint(1, 4)
+        elif kind < 0.85:
+            piece = "[-]"
+        elif kind < 0.95:
+            piece = "[->+<]" if rng.random() < 0.5 else "[-<+>]"
+        else:
+            piece = "."
+        pieces.append(piece)
+        length += len(piece)
+    # Keep the pointer away from the tape edges
+    return ">" * 64 + "".join(pieces)
+
+
+def last_digits():
+    # Prints the last decimal digit of every byte it reads. The division loop goes round once per unit of the byte, so
+    # runs fed different bytes take different paths through it.
+    return ",[>++++++++++<[->-[>+>>]>[+[-<+>]>+>>]<<<<<]>[-]>" + "+" * 48 + ".[-]>[-]<<<,]"
+
+
+def random_inputs(count, max_length=24, seed=0):
+    # Never a zero byte, that's where input driven programs stop
+    rng = random.Random(seed)
+    return [bytes(rng.randrange(1, 256) for _ in range(rng.randint(1, max_length))) for _ in range(count)]
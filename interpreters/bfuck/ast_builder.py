@@ -1,59 +1,118 @@
-from typing import Union
+import gc
+import mmap
+import re
 
 from interpreters.bfuck.commands import BFCommand, TOKEN_TO_COMMAND, BFRepetibleCommand, OpenBranchCommand, \
-    ClosingBranchCommand, BFBranchCommand
+    ClosingBranchCommand, BFBranchCommand, CellValueIncrementCommand, CellPointerIncrementCommand
+from interpreters.bfuck.grammar import PLUS_SIGN, MINUS_SIGN, GT_COMPARATOR, LT_COMPARATOR
 
-from interpreters.bfuck.grammar import GRAMMAR
+# Runs of +/- and </> come out as a single token, everything that isn't code is skipped by the regex engine
+TOKENS = re.compile(r"[+\-]+|[<>]+|[.,\[\]]")
+
+
+class BFSyntaxError(ValueError):
+
+    def __init__(self, message, positions):
+        super().__init__(message)
+        self.positions = positions
+
+    def __reduce__(self):
+        # Has to cross process boundaries, batch workers send it back as a job's error
+        return type(self), (self.args[0], self.positions)
 
 
 class BEASTBuilder:
+    CHUNK_SIZE = 1 << 20
 
-    def __init__(self, code, env):
-        self.env = env
-        self.code = [c for c in code if c in GRAMMAR]  # Ignore other chars
+    def __init__(self, code, strict=False):
+        # code may be a str, bytes, a memory map or a file object opened in either mode
+        self.code = code
+        self.strict = strict
 
     def build_ast(self):
-        if not self.code:
-            return BFCommand(self.env)
-        pre_ast = self._pre_build_ast()
-        ast = self._chain_ast(pre_ast)
-        return ast
-
-    def _pre_build_ast(self):
-        return [self._get_command_from_token(token) for token in self.code]
+        # Millions of freshly allocated commands would keep triggering the cycle collector for nothing
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return self._build_ast()
+        finally:
+            if gc_was_enabled:
+                gc.enable()
 
-    def _chain_ast(self, pre_ast):
+    def _build_ast(self):
+        ast_root = last_command = last_command_type = None
         jump_stack = []
-        ast_root = last_command = pre_ast.pop(0)
-        if type(last_command) is OpenBranchCommand:
-            jump_stack.append(last_command)
-        while pre_ast:
-            current_command = pre_ast.pop(0)
-            if type(current_command) is OpenBranchCommand:
-                jump_stack.append(current_command)
-            elif type(current_command) is ClosingBranchCommand:
+        for position, token in self._tokens():
+            command = self._get_command_from_token(token)
+            command_type = type(command)
+            if command_type is last_command_type and isinstance(command, BFRepetibleCommand):
+                last_command.times += command.times
+                continue
+            if command_type is OpenBranchCommand:
+                jump_stack.append(command)
+            elif command_type is ClosingBranchCommand:
+                if not jump_stack:
+                    raise BFSyntaxError(f"Unmatched ']' at offset {position}", [position])
                 companion = jump_stack.pop()
-                current_command.companion = companion
-                companion.companion = current_command
-            last_command = self._simple_chain(last_command, current_command)
+                command.companion = companion
+                companion.companion = command
+            command.position = position
+            if last_command is None:
+                ast_root = command
+            elif isinstance(last_command, BFBranchCommand):
+                last_command.no_jump = command
+            else:
+                last_command.next = command
+            last_command = command
+            last_command_type = command_type
+        if jump_stack and self.strict:
+            positions = [command.position for command in jump_stack]
+            raise BFSyntaxError(f"Unmatched '[' at offset{'s' if len(positions) > 1 else ''} "
+                                f"{', '.join(map(str, positions))}", positions)
+        if ast_root is None:
+            return BFCommand()
         return ast_root
 
-    def _simple_chain(self, last_command: Union[BFCommand, BFRepetibleCommand],
-                      current_command: Union[BFCommand, BFRepetibleCommand]):
-
-        last_type = type(last_command)
-        current_type = type(current_command)
+    def _tokens(self):
+        offset = 0
+        for chunk in self._chunks():
+            for match in TOKENS.finditer(chunk):
+                yield offset + match.start(), match.group()
+            offset += len(chunk)
 
-        if last_type == current_type and isinstance(last_command, BFRepetibleCommand):
-            chained_command = last_command + current_command
-
-        elif isinstance(last_command, BFBranchCommand):
-            last_command.no_jump = current_command
-            chained_command = current_command
+    def _chunks(self):
+        code = self.code
+        if isinstance(code, str):
+            yield code
+        elif isinstance(code, (bytes, bytearray, memoryview, mmap.mmap)):
+            # latin-1 maps every byte to one char, so offsets stay byte offsets
+            for start in range(0, len(code), self.CHUNK_SIZE):
+                yield bytes(code[start:start + self.CHUNK_SIZE]).decode("latin-1")
         else:
-            last_command.next = current_command
-            chained_command = current_command
-        return chained_command
+            while True:
+                chunk = code.read(self.CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk.decode("latin-1") if isinstance(chunk, bytes) else chunk
 
     def _get_command_from_token(self, token):
-        return TOKEN_TO_COMMAND[token](self.env)
+        if len(token) == 1:
+            return TOKEN_TO_COMMAND[token]()
+        if token[0] in (PLUS_SIGN, MINUS_SIGN):
+            return CellValueIncrementCommand(times=token.count(PLUS_SIGN) - token.count(MINUS_SIGN))
+        return CellPointerIncrementCommand(times=token.count(GT_COMPARATOR) - token.count(LT_COMPARATOR))
+
+
+def walk_ast(ast):
+    # Commands in program order, branches are followed through their no_jump link
+    command = ast
+    while command is not None:
+        yield command
+        command = command.no_jump if isinstance(command, BFBranchCommand) else command.next
+
+
+def run_ast(ast, env):
+    # The ast engine: every command does its bit and hands over the one after it
+    command = ast
+    while command is not None:
+        command = command.execute(env)
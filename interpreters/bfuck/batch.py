@@ -0,0 +1,160 @@
+import signal
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from functools import partial
+from io import BytesIO
+
+from interpreters.bfuck.ast_builder import run_ast
+from interpreters.bfuck.cache import BFProgramCache
+from interpreters.bfuck.environment import BFEnvironment
+from interpreters.bfuck.interpreter import BrainFuckInterpreter, BYTECODE_ENGINE, ENGINE_PROGRAMS, ENGINES, \
+    TRACING_ENGINE
+from interpreters.bfuck.optimizer import BFOptimizer
+from interpreters.bfuck.streams import EOF_ZERO
+
+BFJobResult = namedtuple("BFJobResult", "index output error")
+BFJobSettings = namedtuple("BFJobSettings", "engine optimize cell_bits eof max_output timeout cache max_programs")
+
+
+class BFJobLimitExceeded(Exception):
+    pass
+
+
+class BFOutputLimitExceeded(BFJobLimitExceeded):
+    pass
+
+
+class BFTimeLimitExceeded(BFJobLimitExceeded):
+    pass
+
+
+class BFBatchRunner:
+    # Runs lots of (code, input) jobs over a pool of processes, one per core unless told otherwise. Every worker keeps
+    # its own LRU of compiled programs, so a program shared by many jobs is only compiled once per worker.
+
+    def __init__(self, engine=BYTECODE_ENGINE, optimize=True, cell_bits=8, eof=EOF_ZERO, max_output=None,
+                 timeout=None, workers=None, chunk_size=8, cache=None, max_programs=128):
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine '{engine}'")
+        self.settings = BFJobSettings(engine, optimize, cell_bits, eof, max_output, timeout, cache, max_programs)
+        self.chunk_size = chunk_size
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+
+    def map(self, jobs, ordered=True):
+        futures = [self.executor.submit(_run_chunk, chunk, self.settings) for chunk in self._chunks(jobs)]
+        try:
+            for future in (futures if ordered else as_completed(futures)):
+                yield from future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def run(self, jobs, ordered=True):
+        return list(self.map(jobs, ordered=ordered))
+
+    def close(self):
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _chunks(self, jobs):
+        chunk = []
+        for index, job in enumerate(jobs):
+            code, input_data = (job, b"") if isinstance(job, str) else job
+            if isinstance(input_data, str):
+                input_data = input_data.encode("latin-1")
+            chunk.append((index, code, input_data))
+            if len(chunk) == self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+class LimitedBytesIO(BytesIO):
+
+    def __init__(self, limit=None):
+        super().__init__()
+        self.limit = limit
+
+    def write(self, data):
+        if self.limit is not None and self.tell() + len(data) > self.limit:
+            # Keep what fits, so the job still reports the output up to the limit
+            super().write(data[:self.limit - self.tell()])
+            raise BFOutputLimitExceeded(f"Output went over {self.limit} bytes")
+        return super().write(data)
+
+
+# Per worker process
+_programs = OrderedDict()
+
+
+def _run_chunk(chunk, settings):
+    return [run_job(index, code, input_data, settings) for index, code, input_data in chunk]
+
+
+def run_job(index, code, input_data, settings):
+    output = LimitedBytesIO(settings.max_output)
+    env = BFEnvironment(cell_bits=settings.cell_bits, input_stream=BytesIO(input_data), output_stream=output,
+                        eof=settings.eof)
+    error = None
+    try:
+        # Compiling is part of the job, a program that doesn't even parse only fails its own job
+        run = _get_program(code, settings)
+        with _time_limit(settings.timeout):
+            run(env)
+        env.output_buffer.flush()
+    except Exception as e:
+        # A broken job must not take the rest of the batch down with it
+        error = e
+        try:
+            env.output_buffer.flush()
+        except BFOutputLimitExceeded:
+            pass
+    return BFJobResult(index, output.getvalue(), error)
+
+
+def _get_program(code, settings):
+    # Whatever the engine runs, as a function of the environment. Nothing compiled holds on to an environment, so
+    # every job running the program shares it.
+    key = BFProgramCache.key(code, settings.engine, settings.optimize and BFOptimizer.VERSION, settings.cell_bits)
+    program = _programs.get(key)
+    if program is not None:
+        _programs.move_to_end(key)
+        return program
+    interpreter = BrainFuckInterpreter(code, engine=settings.engine, optimize=settings.optimize,
+                                       cell_bits=settings.cell_bits, cache=settings.cache)
+    if settings.engine in ENGINE_PROGRAMS:
+        program = interpreter._get_program().run
+    elif settings.engine == TRACING_ENGINE:
+        program = interpreter._get_tracer().run
+    else:
+        program = partial(run_ast, interpreter._get_ast())
+    _programs[key] = program
+    while len(_programs) > settings.max_programs:
+        _programs.popitem(last=False)
+    return program
+
+
+def _raise_time_limit(signum, frame):
+    raise BFTimeLimitExceeded("Job ran out of time")
+
+
+@contextmanager
+def _time_limit(seconds):
+    # Only the main thread gets signals, which is where pool workers run their jobs
+    if not seconds or not hasattr(signal, "setitimer"):
+        yield
+        return
+    previous = signal.signal(signal.SIGALRM, _raise_time_limit)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
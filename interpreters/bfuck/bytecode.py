@@ -0,0 +1,320 @@
+import marshal
+
+from interpreters.bfuck.ast_builder import walk_ast
+from interpreters.bfuck.commands import BFCommand, CellValueIncrementCommand, CellPointerIncrementCommand, \
+    GetCellValueCommand, SetCellValueCommand, OpenBranchCommand, ClosingBranchCommand, ClearCellCommand, \
+    MultiplyLoopCommand, AssignCellCommand
+from interpreters.bfuck.streams import SUSPEND_OUTPUT, SUSPEND_INPUT, SUSPEND_PAUSE, run_execution
+
+OP_ADD = 0
+OP_MOVE = 1
+OP_JUMP_IF_ZERO = 2
+OP_JUMP_IF_NOT_ZERO = 3
+OP_OUTPUT = 4
+OP_INPUT = 5
+OP_CLEAR = 6
+OP_MULTIPLY = 7
+OP_ASSIGN = 8
+# Superinstructions, two of the above fused into a single dispatch
+OP_ADD_JUMP_IF_NOT_ZERO = 9
+OP_MOVE_JUMP_IF_NOT_ZERO = 10
+OP_MULTIPLY_JUMP_IF_NOT_ZERO = 11
+OP_MULTIPLY_MOVE = 12
+OP_OUTPUT_MOVE = 13
+
+OP_NAMES = {OP_ADD: "ADD",
+            OP_MOVE: "MOVE",
+            OP_JUMP_IF_ZERO: "JZ",
+            OP_JUMP_IF_NOT_ZERO: "JNZ",
+            OP_OUTPUT: "OUT",
+            OP_INPUT: "IN",
+            OP_CLEAR: "CLR",
+            OP_MULTIPLY: "MUL",
+            OP_ASSIGN: "SET",
+            OP_ADD_JUMP_IF_NOT_ZERO: "AJNZ",
+            OP_MOVE_JUMP_IF_NOT_ZERO: "MJNZ",
+            OP_MULTIPLY_JUMP_IF_NOT_ZERO: "UJNZ",
+            OP_MULTIPLY_MOVE: "MULM",
+            OP_OUTPUT_MOVE: "OUTM"
+            }
+
+JUMP_OPS = (OP_JUMP_IF_ZERO, OP_JUMP_IF_NOT_ZERO, OP_ADD_JUMP_IF_NOT_ZERO, OP_MOVE_JUMP_IF_NOT_ZERO,
+            OP_MULTIPLY_JUMP_IF_NOT_ZERO)
+
+# Pairs of instructions fused into one, where they overlap the one earlier in the table wins. Ordered by dispatches
+# saved on the benchmark workloads, tune_superinstructions() orders them for some other set of programs. Runs of
+# adds or multiplies aren't worth fusing: looping over them costs as much as dispatching them one by one.
+SUPERINSTRUCTIONS = {(OP_MOVE, OP_JUMP_IF_NOT_ZERO): OP_MOVE_JUMP_IF_NOT_ZERO,
+                     (OP_ADD, OP_JUMP_IF_NOT_ZERO): OP_ADD_JUMP_IF_NOT_ZERO,
+                     (OP_MULTIPLY, OP_MOVE): OP_MULTIPLY_MOVE,
+                     (OP_MULTIPLY, OP_JUMP_IF_NOT_ZERO): OP_MULTIPLY_JUMP_IF_NOT_ZERO,
+                     (OP_OUTPUT, OP_MOVE): OP_OUTPUT_MOVE
+                     }
+
+
+class BFBytecodeProgram:
+
+    def __init__(self, ops=None, args=None, jumps=None, consts=None, offsets=None):
+        # Parallel flat lists: indexing a list is cheaper than indexing an array.array in the dispatch loop
+        self.ops = ops if ops is not None else []
+        self.args = args if args is not None else []
+        self.jumps = jumps if jumps is not None else []
+        # Operands that don't fit in a single int live here, args holds the index
+        self.consts = consts if consts is not None else []
+        # Cell each instruction works on, relative to the pointer
+        self.offsets = offsets if offsets is not None else []
+
+    def __len__(self):
+        return len(self.ops)
+
+    def __repr__(self):
+        return "\n".join(f"{pc:>6} {OP_NAMES[op]:<4} {arg:>6} {jump:>6} {offset:>+6}"
+                         for pc, (op, arg, jump, offset) in enumerate(zip(self.ops, self.args, self.jumps,
+                                                                          self.offsets)))
+
+    def dumps(self):
+        return marshal.dumps((self.ops, self.args, self.jumps, self.consts, self.offsets))
+
+    @classmethod
+    def loads(cls, data):
+        return cls(*marshal.loads(data))
+
+    def emit(self, op, arg=0, jump=0, offset=0):
+        self.ops.append(op)
+        self.args.append(arg)
+        self.jumps.append(jump)
+        self.offsets.append(offset)
+        return len(self.ops) - 1
+
+    def add_const(self, value):
+        self.consts.append(value)
+        return len(self.consts) - 1
+
+    def run(self, env):
+        run_execution(self.execute(env), env)
+
+    def execute(self, env, pc=0, back_edges=None):
+        # Everything the loop touches is bound to a local, attribute lookups are what we're running away from
+        ops, args, jumps, consts, offsets = self.ops, self.args, self.jumps, self.consts, self.offsets
+        cells = env.cells
+        mask = env.cell_mask
+        p = env.cell_pointer
+        write = env.output_buffer.write
+        read = env.input_buffer.read
+        ready = env.input_buffer.ready
+        n_ops = len(ops)
+        # Loop iterations left until the next pause, it never gets to zero from -1 so nothing pauses by default
+        fuel = back_edges or -1
+        try:
+            while pc < n_ops:
+                op = ops[pc]
+                # Most executed first, every comparison that fails is paid on every dispatch after it
+                if op == OP_ADD:
+                    cell = p + offsets[pc]
+                    cells[cell] = (cells[cell] + args[pc]) & mask
+                elif op == OP_MULTIPLY:
+                    cell = p + offsets[pc]
+                    value = cells[cell]
+                    if value:
+                        for offset, coefficient in consts[args[pc]]:
+                            cells[cell + offset] = (cells[cell + offset] + value * coefficient) & mask
+                        cells[cell] = 0
+                elif op == OP_JUMP_IF_NOT_ZERO:
+                    if cells[p]:
+                        pc = jumps[pc]
+                        fuel -= 1
+                        if not fuel:
+                            env.cell_pointer, env.code_pointer = p, pc
+                            # Whoever is driving may hand back a different number of iterations until the next pause
+                            fuel = (yield SUSPEND_PAUSE) or back_edges
+                        continue
+                elif op == OP_ADD_JUMP_IF_NOT_ZERO:
+                    cell = p + offsets[pc]
+                    cells[cell] = (cells[cell] + args[pc]) & mask
+                    if cells[p]:
+                        pc = jumps[pc]
+                        fuel -= 1
+                        if not fuel:
+                            env.cell_pointer, env.code_pointer = p, pc
+                            fuel = (yield SUSPEND_PAUSE) or back_edges
+                        continue
+                elif op == OP_MOVE_JUMP_IF_NOT_ZERO:
+                    p += args[pc]
+                    if cells[p]:
+                        pc = jumps[pc]
+                        fuel -= 1
+                        if not fuel:
+                            env.cell_pointer, env.code_pointer = p, pc
+                            fuel = (yield SUSPEND_PAUSE) or back_edges
+                        continue
+                elif op == OP_MULTIPLY_JUMP_IF_NOT_ZERO:
+                    cell = p + offsets[pc]
+                    value = cells[cell]
+                    if value:
+                        for offset, coefficient in consts[args[pc]]:
+                            cells[cell + offset] = (cells[cell + offset] + value * coefficient) & mask
+                        cells[cell] = 0
+                    if cells[p]:
+                        pc = jumps[pc]
+                        fuel -= 1
+                        if not fuel:
+                            env.cell_pointer, env.code_pointer = p, pc
+                            fuel = (yield SUSPEND_PAUSE) or back_edges
+                        continue
+                elif op == OP_MOVE:
+                    p += args[pc]
+                elif op == OP_JUMP_IF_ZERO:
+                    if not cells[p]:
+                        pc = jumps[pc]
+                        continue
+                elif op == OP_CLEAR:
+                    cells[p + offsets[pc]] = 0
+                elif op == OP_ASSIGN:
+                    cells[p + offsets[pc]] = args[pc]
+                elif op == OP_MULTIPLY_MOVE:
+                    # Fused instructions that don't jump keep their second operand in jumps
+                    cell = p + offsets[pc]
+                    value = cells[cell]
+                    if value:
+                        for offset, coefficient in consts[args[pc]]:
+                            cells[cell + offset] = (cells[cell + offset] + value * coefficient) & mask
+                        cells[cell] = 0
+                    p += jumps[pc]
+                elif op == OP_OUTPUT:
+                    if write(cells[p + offsets[pc]]):
+                        pc += 1
+                        env.cell_pointer, env.code_pointer = p, pc
+                        yield SUSPEND_OUTPUT
+                        continue
+                elif op == OP_OUTPUT_MOVE:
+                    full = write(cells[p + offsets[pc]])
+                    p += jumps[pc]
+                    if full:
+                        pc += 1
+                        env.cell_pointer, env.code_pointer = p, pc
+                        yield SUSPEND_OUTPUT
+                        continue
+                else:
+                    if not ready():
+                        # Nothing to read yet, come back to this same instruction once the input has been fed
+                        env.cell_pointer, env.code_pointer = p, pc
+                        yield SUSPEND_INPUT
+                        continue
+                    cell = p + offsets[pc]
+                    cells[cell] = read(cells[cell]) & mask
+                pc += 1
+        finally:
+            env.cell_pointer, env.code_pointer = p, pc
+
+
+class BFBytecodeCompiler:
+    # Bump whenever the emitted bytecode changes, cached programs are keyed on it
+    VERSION = 5
+
+    def __init__(self, ast: BFCommand, cell_bits=8, superinstructions=tuple(SUPERINSTRUCTIONS)):
+        self.ast = ast
+        self.cell_mask = (1 << cell_bits) - 1
+        self.superinstructions = superinstructions
+
+    def compile(self):
+        program = BFBytecodeProgram()
+        jump_stack = []
+        for command in walk_ast(self.ast):
+            command_type = type(command)
+            if command_type is CellValueIncrementCommand:
+                if command.times:
+                    program.emit(OP_ADD, command.times, offset=command.offset)
+            elif command_type is CellPointerIncrementCommand:
+                if command.times:
+                    program.emit(OP_MOVE, command.times)
+            elif command_type is GetCellValueCommand:
+                program.emit(OP_OUTPUT, offset=command.offset)
+            elif command_type is SetCellValueCommand:
+                program.emit(OP_INPUT, offset=command.offset)
+            elif command_type is ClearCellCommand:
+                program.emit(OP_CLEAR, offset=command.offset)
+            elif command_type is AssignCellCommand:
+                program.emit(OP_ASSIGN, command.value & self.cell_mask, offset=command.offset)
+            elif command_type is MultiplyLoopCommand:
+                coefficients = command.coefficients(self.cell_mask)
+                program.emit(OP_MULTIPLY, program.add_const(coefficients), offset=command.offset)
+            elif command_type is OpenBranchCommand:
+                jump_stack.append(program.emit(OP_JUMP_IF_ZERO))
+            elif command_type is ClosingBranchCommand:
+                open_pc = jump_stack.pop()
+                close_pc = program.emit(OP_JUMP_IF_NOT_ZERO, jump=open_pc + 1)
+                program.jumps[open_pc] = close_pc + 1
+        # An unmatched "[" skips to the end of the program, same as the command graph does
+        for open_pc in jump_stack:
+            program.jumps[open_pc] = len(program)
+        if self.superinstructions:
+            program = self._fuse(program)
+        return program
+
+    def _fuse(self, program):
+        ops, args, jumps, offsets = program.ops, program.args, program.jumps, program.offsets
+        # Jumping into the middle of a fused instruction isn't possible, only its first half may be a target
+        targets = {jump for op, jump in zip(ops, jumps) if op in JUMP_OPS}
+        claimed = [False] * len(ops)
+        # Fused opcode of every pair, keyed on where it starts
+        groups = {}
+        # A pattern earlier in the table gets first pick where two of them overlap
+        for first, second in self.superinstructions:
+            fused_op = SUPERINSTRUCTIONS[first, second]
+            for pc in range(len(ops) - 1):
+                if ops[pc] != first or ops[pc + 1] != second or claimed[pc] or claimed[pc + 1] or \
+                        pc + 1 in targets:
+                    continue
+                claimed[pc] = claimed[pc + 1] = True
+                groups[pc] = fused_op
+        fused = BFBytecodeProgram(consts=program.consts)
+        new_pcs = {}
+        pc = 0
+        while pc < len(ops):
+            new_pcs[pc] = len(fused)
+            if pc not in groups:
+                fused.emit(ops[pc], args[pc], jumps[pc], offsets[pc])
+                pc += 1
+                continue
+            if ops[pc + 1] == OP_JUMP_IF_NOT_ZERO:
+                fused.emit(groups[pc], args[pc], jumps[pc + 1], offsets[pc])
+            else:
+                fused.emit(groups[pc], args[pc], args[pc + 1], offsets[pc])
+            pc += 2
+        new_pcs[len(ops)] = len(fused)
+        for pc, op in enumerate(fused.ops):
+            if op in JUMP_OPS:
+                fused.jumps[pc] = new_pcs[fused.jumps[pc]]
+        return fused
+
+
+# Opcode each command compiles to, before any fusion
+COMMAND_OPS = {CellValueIncrementCommand: OP_ADD,
+               CellPointerIncrementCommand: OP_MOVE,
+               GetCellValueCommand: OP_OUTPUT,
+               SetCellValueCommand: OP_INPUT,
+               ClearCellCommand: OP_CLEAR,
+               AssignCellCommand: OP_ASSIGN,
+               MultiplyLoopCommand: OP_MULTIPLY,
+               OpenBranchCommand: OP_JUMP_IF_ZERO,
+               ClosingBranchCommand: OP_JUMP_IF_NOT_ZERO
+               }
+
+
+def tune_superinstructions(profilers, candidates=tuple(SUPERINSTRUCTIONS)):
+    # Orders the candidate patterns by the dispatches they would have saved on runs already counted by BFProfilers,
+    # dropping the ones that never applied. Meant to be fed to BFBytecodeCompiler as superinstructions.
+    saved = dict.fromkeys(candidates, 0)
+    for profiler in profilers:
+        previous = None
+        for command in profiler.commands:
+            op = COMMAND_OPS.get(type(command))
+            if op is None or (op in (OP_ADD, OP_MOVE) and not command.times):
+                # Emits nothing
+                continue
+            pattern = (previous, op)
+            if pattern in saved:
+                saved[pattern] += profiler.counts[command]
+            # Loop bodies and whatever follows a loop are jump targets, nothing fuses into them
+            previous = None if op in (OP_JUMP_IF_ZERO, OP_JUMP_IF_NOT_ZERO) else op
+    return tuple(pattern for pattern in sorted(saved, key=saved.get, reverse=True) if saved[pattern])
@@ -0,0 +1,110 @@
+import hashlib
+import mmap
+import os
+import re
+import tempfile
+
+from interpreters.bfuck.grammar import GRAMMAR
+
+NOT_GRAMMAR = re.compile(f"[^{re.escape(GRAMMAR)}]")
+NOT_GRAMMAR_BYTES = re.compile(NOT_GRAMMAR.pattern.encode())
+KEY_CHUNK_SIZE = 1 << 20
+ENTRY_SUFFIX = ".bfc"
+
+
+class BFProgramCache:
+
+    def __init__(self, directory, max_size=64 * 1024 * 1024):
+        self.directory = directory
+        self.max_size = max_size
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(code, *parts):
+        # Comments and layout don't change the program, only the filtered source goes into the hash
+        if isinstance(code, str):
+            digest = hashlib.sha256(NOT_GRAMMAR.sub("", code).encode())
+        elif isinstance(code, (bytes, bytearray, memoryview, mmap.mmap)):
+            # Bytes and memory maps are hashed a chunk at a time, they hash the same as the equivalent str
+            digest = hashlib.sha256()
+            for start in range(0, len(code), KEY_CHUNK_SIZE):
+                digest.update(NOT_GRAMMAR_BYTES.sub(b"", code[start:start + KEY_CHUNK_SIZE]))
+        else:
+            # File objects too, then they're put back where they were for the builder to read them again
+            if not code.seekable():
+                raise ValueError("Only seekable file objects can be cached, the source is read twice")
+            digest = hashlib.sha256()
+            start = code.tell()
+            while True:
+                chunk = code.read(KEY_CHUNK_SIZE)
+                if not chunk:
+                    break
+                if isinstance(chunk, str):
+                    chunk = NOT_GRAMMAR.sub("", chunk).encode()
+                else:
+                    chunk = NOT_GRAMMAR_BYTES.sub(b"", chunk)
+                digest.update(chunk)
+            code.seek(start)
+        for part in parts:
+            digest.update(b"\0" + str(part).encode())
+        return digest.hexdigest()
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            # mtime doubles as the last access time for the LRU eviction
+            os.utime(path)
+        except OSError:
+            return None
+        return data
+
+    def put(self, key, data):
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            # Readers in other processes either see the old entry or the whole new one, never half of it
+            os.replace(temp_path, self._path(key))
+        except BaseException:
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+            raise
+        self._evict()
+
+    def discard(self, key):
+        try:
+            os.unlink(self._path(key))
+        except OSError:
+            pass
+
+    def size(self):
+        return sum(size for _, _, size in self._entries())
+
+    def _evict(self):
+        entries = sorted(self._entries())
+        total = sum(size for _, _, size in entries)
+        for _, path, size in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                # Someone else got rid of it first
+                pass
+            total -= size
+
+    def _entries(self):
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(ENTRY_SUFFIX):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                yield stat.st_mtime_ns, entry.path, stat.st_size
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ENTRY_SUFFIX)
@@ -0,0 +1,88 @@
+import hashlib
+import marshal
+
+from interpreters.bfuck.tape import BFPagedTape
+
+# Bump whenever the snapshot layout changes
+SNAPSHOT_VERSION = 1
+
+
+def program_hash(program):
+    return hashlib.sha256(program.dumps()).hexdigest()
+
+
+class BFSnapshot:
+    # Everything a bytecode program paused at an instruction boundary needs to carry on somewhere else. Only the
+    # stretch of tape between the first and last non zero cells is kept, the rest is zeros anyway. tape_length is
+    # None for paged tapes.
+
+    def __init__(self, program_hash, code_pointer, cell_bits, tape_length, tape_start, tape, cell_pointer, consumed,
+                 written):
+        self.program_hash = program_hash
+        self.code_pointer = code_pointer
+        self.cell_bits = cell_bits
+        self.tape_length = tape_length
+        self.tape_start = tape_start
+        self.tape = tape
+        self.cell_pointer = cell_pointer
+        self.consumed = consumed
+        self.written = written
+
+    @classmethod
+    def take(cls, program, env, digest=None):
+        # Hashing means marshalling the whole program, whoever takes snapshots of one over and over passes its digest
+        if isinstance(env.cells, BFPagedTape):
+            # Paged tapes have no fixed length, only the allocated pages are looked at
+            origin, data = env.cells.used()
+            itemsize, tape_length = env.cells.itemsize, None
+        else:
+            view = memoryview(env.cells)
+            origin, data = 0, view.cast("B").tobytes()
+            itemsize, tape_length = view.itemsize, len(env.cells)
+        start = len(data) - len(data.lstrip(b"\0"))
+        end = len(data.rstrip(b"\0"))
+        # Round out to whole cells
+        start -= start % itemsize
+        end += -end % itemsize
+        if start >= end:
+            start = end = 0
+        return cls(digest or program_hash(program), env.code_pointer, env.cell_bits, tape_length,
+                   origin + start // itemsize, data[start:end], env.cell_pointer, env.input_buffer.consumed,
+                   env.output_buffer.written)
+
+    def restore(self, program, env, digest=None):
+        if self.program_hash != (digest or program_hash(program)):
+            raise ValueError("Snapshot was taken from a different program")
+        if self.cell_bits != env.cell_bits:
+            raise ValueError(f"Snapshot has {self.cell_bits} bit cells, the environment {env.cell_bits} bit ones")
+        env.reset()
+        paged = isinstance(env.cells, BFPagedTape)
+        tape_length = None if paged else len(env.cells)
+        if self.tape_length != tape_length:
+            raise ValueError(f"Snapshot tape has {self.tape_length or 'unbounded'} cells, "
+                             f"the environment {tape_length or 'unbounded'}")
+        if paged:
+            env.cells.load(self.tape_start, self.tape)
+        else:
+            view = memoryview(env.cells)
+            start = self.tape_start * view.itemsize
+            view.cast("B")[start:start + len(self.tape)] = self.tape
+        env.cell_pointer = self.cell_pointer
+        env.code_pointer = self.code_pointer
+        env.pristine = False
+        # The input stream starts where the snapshotted run started, skip what it had already consumed
+        env.input_buffer.skip(self.consumed)
+        env.output_buffer.written = self.written
+
+    def dumps(self):
+        return marshal.dumps((SNAPSHOT_VERSION, self.program_hash, self.code_pointer, self.cell_bits,
+                              self.tape_length, self.tape_start, self.tape, self.cell_pointer, self.consumed,
+                              self.written))
+
+    @classmethod
+    def loads(cls, data):
+        fields = marshal.loads(data)
+        version = fields[0] if isinstance(fields, tuple) and fields else None
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported snapshot version {version}")
+        return cls(*fields[1:])
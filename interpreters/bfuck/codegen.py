@@ -0,0 +1,140 @@
+import marshal
+
+from interpreters.bfuck.ast_builder import walk_ast
+from interpreters.bfuck.commands import BFCommand, CellValueIncrementCommand, CellPointerIncrementCommand, \
+    GetCellValueCommand, SetCellValueCommand, OpenBranchCommand, ClosingBranchCommand, ClearCellCommand, \
+    MultiplyLoopCommand, AssignCellCommand
+from interpreters.bfuck.streams import SUSPEND_OUTPUT, SUSPEND_INPUT, run_execution
+
+ENTRY_POINT = "bf_program"
+INDENT = "    "
+
+
+class BFPythonProgram:
+
+    def __init__(self, source, code=None):
+        self.source = source
+        self.code = code if code is not None else compile(source, "<brainfuck>", "exec")
+        namespace = {}
+        exec(self.code, namespace)
+        self._function = namespace[ENTRY_POINT]
+
+    def dumps(self):
+        return marshal.dumps((self.source, self.code))
+
+    @classmethod
+    def loads(cls, data):
+        return cls(*marshal.loads(data))
+
+    def run(self, env):
+        run_execution(self.execute(env), env)
+
+    def execute(self, env):
+        input_buffer = env.input_buffer
+        env.cell_pointer = yield from self._function(env.cells, env.cell_pointer, env.output_buffer.write,
+                                                     input_buffer.read, input_buffer.ready)
+
+
+class BFPythonCompiler:
+    # CPython refuses more than 20 statically nested blocks, deeper loops are moved into functions of their own
+    MAX_NESTING = 16
+    # Bump whenever the generated source changes, cached programs are keyed on it
+    VERSION = 6
+
+    def __init__(self, ast: BFCommand, cell_bits=8):
+        self.ast = ast
+        self.cell_mask = (1 << cell_bits) - 1
+        self.mask = hex(self.cell_mask)
+
+    def compile(self):
+        return BFPythonProgram(self.generate())
+
+    def generate(self, commands=None):
+        # Any stretch of commands with its loops matched compiles as well as a whole program, a single loop included
+        if commands is None:
+            commands = list(walk_ast(self.ast))
+        unmatched = self._unmatched_open_branches(commands)
+        functions = []
+        loop_functions = 0
+        # Each entry is [lines, depth, is_loop_function]
+        stack = [[[f"def {ENTRY_POINT}(t, p, write, read, ready):"], 1, False]]
+        for command in commands:
+            context = stack[-1]
+            command_type = type(command)
+            if command_type is OpenBranchCommand:
+                if context[1] >= self.MAX_NESTING and command not in unmatched:
+                    loop_functions += 1
+                    name = f"_loop_{loop_functions}"
+                    context[0].append(INDENT * context[1] + f"p = yield from {name}(t, p, write, read, ready)")
+                    context = [[f"def {name}(t, p, write, read, ready):"], 1, True]
+                    stack.append(context)
+                header = "if t[p]:" if command in unmatched else "while t[p]:"
+                context[0].append(INDENT * context[1] + header)
+                context[1] += 1
+            elif command_type is ClosingBranchCommand:
+                if context[0][-1].endswith(":"):
+                    context[0].append(INDENT * context[1] + "pass")
+                context[1] -= 1
+                if context[2] and context[1] == 1:
+                    context[0].extend(self._epilogue())
+                    functions.append(context[0])
+                    stack.pop()
+            else:
+                context[0].extend(INDENT * context[1] + line for line in self._statements(command))
+        for context in stack:
+            if context[0][-1].endswith(":"):
+                context[0].append(INDENT * context[1] + "pass")
+        entry_point = stack[0][0]
+        entry_point.extend(self._epilogue())
+        functions.append(entry_point)
+        return "\n\n\n".join("\n".join(lines) for lines in functions) + "\n"
+
+    @staticmethod
+    def _epilogue():
+        yield INDENT + "return p"
+        # Never reached, but it makes every function a generator even when it has no I/O of its own
+        yield INDENT + "yield"
+
+    def _statements(self, command):
+        command_type = type(command)
+        cell = self._cell(command.offset)
+        if command_type is CellValueIncrementCommand:
+            if command.times:
+                yield f"{cell} = ({cell} + {command.times}) & {self.mask}"
+        elif command_type is CellPointerIncrementCommand:
+            if command.times:
+                yield f"p += {command.times}"
+        elif command_type is GetCellValueCommand:
+            yield f"if write({cell}):"
+            yield f"{INDENT}yield {SUSPEND_OUTPUT}"
+        elif command_type is SetCellValueCommand:
+            yield "while not ready():"
+            yield f"{INDENT}yield {SUSPEND_INPUT}"
+            yield f"{cell} = read({cell}) & {self.mask}"
+        elif command_type is ClearCellCommand:
+            yield f"{cell} = 0"
+        elif command_type is AssignCellCommand:
+            yield f"{cell} = {command.value & self.cell_mask}"
+        elif command_type is MultiplyLoopCommand:
+            yield f"v = {cell}"
+            yield "if v:"
+            for offset, coefficient in command.coefficients(self.cell_mask):
+                target = self._cell(command.offset + offset)
+                yield f"{INDENT}{target} = ({target} + v * {coefficient}) & {self.mask}"
+            yield f"{INDENT}{cell} = 0"
+
+    @staticmethod
+    def _cell(offset):
+        if not offset:
+            return "t[p]"
+        return f"t[p + {offset}]" if offset > 0 else f"t[p - {-offset}]"
+
+    @staticmethod
+    def _unmatched_open_branches(commands):
+        open_branches = []
+        for command in commands:
+            if type(command) is OpenBranchCommand:
+                open_branches.append(command)
+            elif type(command) is ClosingBranchCommand:
+                open_branches.pop()
+        return set(open_branches)
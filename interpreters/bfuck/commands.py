@@ -1,47 +1,49 @@
-import sys
-
 from interpreters.bfuck.environment import BFEnvironment
 from interpreters.bfuck.grammar import PLUS_SIGN, MINUS_SIGN, GT_COMPARATOR, LT_COMPARATOR, DOT, COMMA, OPEN_BRACKET, \
     CLOSE_BRACKET
 
 
 class BFCommand:
+    # Commands are slotted and don't hold on to the environment, it's handed to execute, which returns the command to
+    # run after it. A node only costs its slots: tracemalloc puts a parsed program at about 95 bytes a command, the
+    # object headers and the int holding its source position included.
+    __slots__ = ("next", "position", "offset")
+    _operator = ""
 
-    def __init__(self, env: BFEnvironment, next: 'BFCommand' = None, operator: str = ""):
-        self._operator = operator
-        self.env = env
-        self._next = next
-
-    @property
-    def next(self):
-        return self._next
-
-    @next.setter
-    def next(self, value):
-        self._next = value
+    def __init__(self, next: 'BFCommand' = None):
+        self.next = next
+        self.position = None  # Offset in the source, set by the builder
+        self.offset = 0  # Cell the command works on relative to the pointer, set by the optimizer
 
-    def execute(self):
-        pass
+    def execute(self, env: BFEnvironment):
+        return self.next
 
     @property
     def operator(self):
         return self._operator
 
+    def _at_offset(self, text):
+        if not self.offset:
+            return text
+        there, back = (">", "<") if self.offset > 0 else ("<", ">")
+        return there * abs(self.offset) + text + back * abs(self.offset)
+
     def __repr__(self):
-        return self.operator
+        return self._at_offset(self.operator)
 
     def __str__(self):
-        return self.operator
+        return self._at_offset(self.operator)
 
 
 class BFRepetibleCommand(BFCommand):
+    __slots__ = ("times",)
+    _operator_ez = ""
+    _operator_gz = ""
+    _operator_lz = ""
 
-    def __init__(self, env, next=None, operator="", times=0):
+    def __init__(self, next=None, times=0):
         self.times = times
-        self._operator_ez = ""
-        self._operator_gz = ""
-        self._operator_lz = ""
-        super().__init__(env, next=next, operator=operator)
+        super().__init__(next=next)
 
     @property
     def operator(self):
@@ -53,10 +55,10 @@ class BFRepetibleCommand(BFCommand):
             return self._operator_lz
 
     def __repr__(self):
-        return self.operator * abs(self.times)
+        return self._at_offset(self.operator * abs(self.times))
 
     def __str__(self):
-        return self.operator * abs(self.times)
+        return self._at_offset(self.operator * abs(self.times))
 
     def __add__(self, other):
         self.times += other.times
@@ -64,19 +66,20 @@ class BFRepetibleCommand(BFCommand):
 
 
 class BFBranchCommand(BFCommand):
+    __slots__ = ("companion", "no_jump")
+    _operator = "["
 
-    def __init__(self, env: BFEnvironment, companion: BFCommand = None, no_jump: BFCommand = None, operator="["):
+    def __init__(self, companion: BFCommand = None, no_jump: BFCommand = None):
         self.companion = companion
         self.no_jump = no_jump
-        super().__init__(env, operator=operator)
+        super().__init__()
 
-    def branch_condition(self):
-        return bool(self.env.current_cell)
+    def branch_condition(self, env):
+        return bool(env.cells[env.cell_pointer])
 
-    @property
-    def next(self):
+    def execute(self, env):
         next = self.no_jump
-        if self.branch_condition():
+        if self.branch_condition(env):
             # Ohhh shit! This guy's jumping!
             next = self.companion
             if isinstance(self.companion, BFBranchCommand):
@@ -85,70 +88,143 @@ class BFBranchCommand(BFCommand):
 
 
 class CellPointerIncrementCommand(BFRepetibleCommand):
+    __slots__ = ()
+    _operator_gz = ">"
+    _operator_lz = "<"
 
-    def __init__(self, env: BFEnvironment, times: int = 1, next=None, operator='+'):
-        super().__init__(env, times=times, next=next, operator=operator)
-        self._operator_gz = ">"
-        self._operator_lz = "<"
+    def __init__(self, times: int = 1, next=None):
+        super().__init__(times=times, next=next)
 
-    def execute(self):
-        self.env.cell_pointer += self.times
+    def execute(self, env):
+        env.cell_pointer += self.times
+        return self.next
 
 
 class CellValueIncrementCommand(BFRepetibleCommand):
+    __slots__ = ()
+    _operator_gz = "+"
+    _operator_lz = "-"
 
-    def __init__(self, env: BFEnvironment, times: int = 1, next=None, operator='>'):
-        super().__init__(env, times=times, next=next, operator=operator)
-        self._operator_gz = "+"
-        self._operator_lz = "-"
+    def __init__(self, times: int = 1, next=None):
+        super().__init__(times=times, next=next)
 
-    def execute(self):
-        self.env.current_cell += self.times
+    def execute(self, env):
+        cell = env.cell_pointer + self.offset
+        env.cells[cell] = (env.cells[cell] + self.times) & env.cell_mask
+        return self.next
 
 
 class SetCellValueCommand(BFCommand):
+    __slots__ = ()
+    _operator = ","
 
-    def __init__(self, env, next=None):
-        super().__init__(env, operator=",", next=next)
-
-    def execute(self):
-        char = "\n"
-        while char == "\n":
-            char = sys.stdin.read(1)
-        self.env.current_cell = ord(char)
+    def execute(self, env):
+        cell = env.cell_pointer + self.offset
+        env.cells[cell] = env.input_buffer.read(env.cells[cell]) & env.cell_mask
+        return self.next
 
 
 class GetCellValueCommand(BFCommand):
+    __slots__ = ()
+    _operator = "."
 
-    def __init__(self, env, next=None):
-        super().__init__(env, operator=".", next=next)
-
-    def execute(self):
-        print(chr(self.env.current_cell), flush=False, end="")
+    def execute(self, env):
+        if env.output_buffer.write(env.cells[env.cell_pointer + self.offset]):
+            env.output_buffer.flush()
+        return self.next
 
 
 class OpenBranchCommand(BFBranchCommand):
+    __slots__ = ()
+    _operator = "["
 
-    def __init__(self, env, **kwargs):
-        super().__init__(env, operator='[', **kwargs)
-
-    def branch_condition(self):
-        return not bool(self.env.current_cell)
+    def branch_condition(self, env):
+        return not env.cells[env.cell_pointer]
 
 
 class ClosingBranchCommand(BFBranchCommand):
+    __slots__ = ()
+    _operator = "]"
+
+    def branch_condition(self, env):
+        return bool(env.cells[env.cell_pointer])
+
+
+class ClearCellCommand(BFCommand):
+    __slots__ = ()
+    _operator = "[-]"
 
-    def __init__(self, env, **kwargs):
-        super().__init__(env, operator="]", **kwargs)
+    def execute(self, env):
+        env.cells[env.cell_pointer + self.offset] = 0
+        return self.next
 
-    def branch_condition(self):
-        return bool(self.env.current_cell)
+
+class AssignCellCommand(BFCommand):
+    # A clear followed by a run of +/-, or any other store of a value known before running
+    __slots__ = ("value",)
+
+    def __init__(self, value=0, next=None):
+        self.value = value
+        super().__init__(next=next)
+
+    @property
+    def operator(self):
+        return "[-]" + CellValueIncrementCommand(times=self.value).operator * abs(self.value)
+
+    def execute(self, env):
+        env.cells[env.cell_pointer + self.offset] = self.value & env.cell_mask
+        return self.next
+
+
+class MultiplyLoopCommand(BFCommand):
+    # A balanced loop such as [->+>++<<]: the loop cell changes by `step` on every iteration and each (offset, factor)
+    # target gets `factor` added per iteration. When the step is odd it can be divided by modulo the cell width, so
+    # the number of iterations, -value / step, is known up front and it all collapses into one multiplication.
+    __slots__ = ("factors", "step", "_coefficients")
+
+    def __init__(self, factors=(), step=-1, next=None):
+        self.factors = tuple(factors)
+        self.step = step
+        # (cell_mask, coefficients) for the last cell width it ran with
+        self._coefficients = None
+        super().__init__(next=next)
+
+    @property
+    def operator(self):
+        body = CellValueIncrementCommand(times=self.step).operator * abs(self.step)
+        pointer = 0
+        for offset, factor in self.factors:
+            body += CellPointerIncrementCommand(times=offset - pointer).operator * abs(offset - pointer)
+            body += CellValueIncrementCommand(times=factor).operator * abs(factor)
+            pointer = offset
+        body += CellPointerIncrementCommand(times=-pointer).operator * abs(pointer)
+        return f"[{body}]"
+
+    def coefficients(self, cell_mask):
+        # What each target gets per unit of the loop cell value, the factor times -1 / step
+        modulus = cell_mask + 1
+        inverse = pow(self.step, -1, modulus)
+        if inverse > modulus // 2:
+            # Keeps the usual steps of 1 and -1 as they are
+            inverse -= modulus
+        return tuple((offset, -inverse * factor) for offset, factor in self.factors)
+
+    def execute(self, env):
+        cells, pointer, mask = env.cells, env.cell_pointer + self.offset, env.cell_mask
+        value = cells[pointer]
+        if value:
+            if self._coefficients is None or self._coefficients[0] != mask:
+                self._coefficients = mask, self.coefficients(mask)
+            for offset, coefficient in self._coefficients[1]:
+                cells[pointer + offset] = (cells[pointer + offset] + value * coefficient) & mask
+            cells[pointer] = 0
+        return self.next
 
 
 TOKEN_TO_COMMAND = {PLUS_SIGN: CellValueIncrementCommand,
-                    MINUS_SIGN: lambda env: CellValueIncrementCommand(env, times=-1),
+                    MINUS_SIGN: lambda: CellValueIncrementCommand(times=-1),
                     GT_COMPARATOR: CellPointerIncrementCommand,
-                    LT_COMPARATOR: lambda env: CellPointerIncrementCommand(env, times=-1),
+                    LT_COMPARATOR: lambda: CellPointerIncrementCommand(times=-1),
                     DOT: GetCellValueCommand,
                     COMMA: SetCellValueCommand,
                     OPEN_BRACKET: OpenBranchCommand,
@@ -1,15 +1,76 @@
+from array import array
+
+from interpreters.bfuck.streams import BFInputBuffer, BFOutputBuffer, EOF_ZERO
+from interpreters.bfuck.tape import BFPagedTape, PAGE_CELLS
+
+CELL_TYPECODES = {8: None, 16: 'H', 32: 'I'}
+
+# Read only tapes of zeros reset() copies from, shared by every environment
+_ZERO_TAPES = {}
+
+
 class BFEnvironment:
     N_CELLS = 30000
 
-    def __init__(self):
-        self.cells = [0 for _ in range(self.N_CELLS * 2)]
-        self.cell_pointer = int(len(self.cells) / 2)
-        self.code_pointer = 0
+    def __init__(self, cell_bits=8, input_stream=None, output_stream=None, eof=EOF_ZERO, paged=False,
+                 max_tape_bytes=None):
+        if cell_bits not in CELL_TYPECODES:
+            raise ValueError(f"Cell width must be one of {sorted(CELL_TYPECODES)} bits, got {cell_bits}")
+        if max_tape_bytes is not None and not paged:
+            raise ValueError("Only paged tapes can be capped")
+        self.cell_bits = cell_bits
+        # A paged tape starts empty and grows page by page in both directions, up to max_tape_bytes if given
+        self.paged = paged
+        self.max_tape_bytes = max_tape_bytes
+        self.cell_mask = (1 << cell_bits) - 1
+        self.eof = eof
+        self.set_streams(input_stream, output_stream)
+        self.cells = None
+        self.reset()
+
+    def set_streams(self, input_stream=None, output_stream=None):
+        self.output_buffer = BFOutputBuffer(output_stream)
+        self.input_buffer = BFInputBuffer(input_stream, eof=self.eof, before_read=self.output_buffer.flush)
 
     def reset(self):
-        self.cells = [0 for _ in range(self.N_CELLS * 2)]
-        self.cell_pointer = int(len(self.cells) / 2)
+        self._clear_tape()
+        self.cell_pointer = 0 if self.paged else len(self.cells) // 2
         self.code_pointer = 0
+        # Nothing has run on or written to this tape yet, cleared by whoever runs a program on it and by the setters
+        # below. Code writing to cells directly has to clear it too, or the optimizer may count on a tape of zeros.
+        self.pristine = True
+
+    def _new_tape(self):
+        typecode = CELL_TYPECODES[self.cell_bits]
+        if self.paged:
+            max_pages = None
+            if self.max_tape_bytes is not None:
+                max_pages = self.max_tape_bytes // (PAGE_CELLS * self.cell_bits // 8)
+            return BFPagedTape(typecode, max_pages=max_pages)
+        if typecode is None:
+            return bytearray(self.N_CELLS * 2)
+        return array(typecode, [0]) * (self.N_CELLS * 2)
+
+    def _clear_tape(self):
+        if self.cells is None:
+            self.cells = self._new_tape()
+        elif self.paged:
+            self.cells.pages.clear()
+        else:
+            # Zeroed in place with a single copy: no new tape to allocate on every reset, and views of it stay valid
+            key = CELL_TYPECODES[self.cell_bits], len(self.cells)
+            zeros = _ZERO_TAPES.get(key)
+            if zeros is None:
+                zeros = _ZERO_TAPES[key] = bytes(len(self.cells)) if key[0] is None else self._new_tape()
+            self.cells[:] = zeros
+
+    def tape_view(self):
+        if self.paged:
+            # Pages come and go, there's no single buffer to look at
+            raise TypeError("Paged tapes have no flat view, cells.used() copies out the allocated stretch")
+        # Writable, so the tape may not stay all zeros
+        self.pristine = False
+        return memoryview(self.cells)
 
     @property
     def current_cell(self):
@@ -17,7 +78,8 @@ class BFEnvironment:
 
     @current_cell.setter
     def current_cell(self, val):
-        self.cells[self.cell_pointer] = val
+        self.cells[self.cell_pointer] = val & self.cell_mask
+        self.pristine = False
 
     def __repr__(self):
         return f"Value: {self.current_cell}, pointer: {self.cell_pointer}"
@@ -1,20 +1,217 @@
+import asyncio
+import inspect
+import mmap
+import sys
+
+from interpreters.bfuck.bytecode import BFBytecodeCompiler, BFBytecodeProgram
+from interpreters.bfuck.codegen import BFPythonCompiler, BFPythonProgram
 from interpreters.bfuck.environment import BFEnvironment
-from interpreters.bfuck.ast_builder import BEASTBuilder
+from interpreters.bfuck.ast_builder import BEASTBuilder, run_ast
+from interpreters.bfuck.checkpoint import BFSnapshot, program_hash
+from interpreters.bfuck.limits import run_limited
+from interpreters.bfuck.optimizer import BFOptimizer
+from interpreters.bfuck.profiler import BFProfiler
+from interpreters.bfuck.streams import BFInputBuffer, BFOutputBuffer, EOF_ZERO, FLUSH_FULL, SUSPEND_INPUT, \
+    SUSPEND_OUTPUT, SUSPEND_PAUSE, write_stream
+from interpreters.bfuck.tracing import BFTracer
+
+AST_ENGINE = "ast"
+BYTECODE_ENGINE = "bytecode"
+PYTHON_ENGINE = "python"
+TRACING_ENGINE = "tracing"
+
+ENGINES = (AST_ENGINE, BYTECODE_ENGINE, PYTHON_ENGINE, TRACING_ENGINE)
+ENGINE_PROGRAMS = {BYTECODE_ENGINE: (BFBytecodeCompiler, BFBytecodeProgram),
+                   PYTHON_ENGINE: (BFPythonCompiler, BFPythonProgram)}
 
 
 class BrainFuckInterpreter:
 
-    def __init__(self, code):
+    def __init__(self, code, engine=AST_ENGINE, optimize=True, cell_bits=8, cache=None, input_stream=None,
+                 output_stream=None, eof=EOF_ZERO, paged=False, max_tape_bytes=None):
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine '{engine}'")
         self._code = code
+        # Set when the code is a memory map from_file opened, close() lets go of it
+        self._owns_code = False
+        # Where a file object source started, builds after the first one read it again from there
+        self._code_start = None
         self._code_is_dirty = False
         self._cached_ast = None
-        self.env = BFEnvironment()
+        self._cached_program = None
+        # What the ast, python and tracing engines run with limits, checkpoints or from asyncio
+        self._cached_bytecode = None
+        self._cached_tracer = None
+        self._assumes_fresh_tape = False
+        self.engine = engine
+        self.optimize = optimize
+        self.cache = cache
+        self.env = BFEnvironment(cell_bits=cell_bits, input_stream=input_stream, output_stream=output_stream, eof=eof,
+                                 paged=paged, max_tape_bytes=max_tape_bytes)
+
+    @classmethod
+    def from_file(cls, path, **kwargs):
+        # The source is tokenized straight from the mapping, it's never read into a str
+        with open(path, "rb") as f:
+            try:
+                code = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # Empty files can't be mapped
+                code = b""
+        interpreter = cls(code, **kwargs)
+        interpreter._owns_code = isinstance(code, mmap.mmap)
+        return interpreter
+
+    def close(self):
+        # Unmaps the source from_file mapped. What's been built from it keeps running, the source itself is gone.
+        if self._owns_code:
+            self._code.close()
+            self._owns_code = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
 
-    def execute(self):
-        next_command = self._get_ast()
-        while next_command is not None:
-            next_command.execute()
-            next_command = next_command.next
+    def execute(self, max_steps=None, timeout=None):
+        self._check_fresh_tape()
+        try:
+            if max_steps is not None or timeout is not None:
+                # Limits are checked by the bytecode VM at back-edges, so that's what runs whatever the engine
+                program = self._get_bytecode_program()
+                self.env.pristine = False
+                run_limited(program, self.env, max_steps=max_steps, timeout=timeout)
+                return
+            if self.engine in ENGINE_PROGRAMS:
+                program = self._get_program()
+                self.env.pristine = False
+                program.run(self.env)
+                return
+            if self.engine == TRACING_ENGINE:
+                tracer = self._get_tracer()
+                self.env.pristine = False
+                tracer.run(self.env)
+                return
+            ast = self._get_ast()
+            self.env.pristine = False
+            run_ast(ast, self.env)
+        finally:
+            self.env.output_buffer.flush()
+
+    def profile(self):
+        # Always runs the command graph, whatever the engine, so counts map back to commands and source offsets
+        self._check_fresh_tape()
+        try:
+            ast = self._get_ast()
+            if self._cached_tracer is not None and self._cached_tracer.compiled:
+                # Loops the tracer compiled would count as a single command, the profile gets a graph of its own
+                ast, _ = self._build_ast()
+            profiler = BFProfiler(ast, self.code)
+            self.env.pristine = False
+            return profiler.run(self.env)
+        finally:
+            self.env.output_buffer.flush()
+
+    def checkpoints(self, back_edges=1 << 20, snapshot=None):
+        # Runs the program handing out a snapshot every `back_edges` loop iterations, or picks it up from one. Only
+        # the bytecode can stop at any instruction and carry on later, so that's what runs whatever the engine.
+        env = self.env
+        if snapshot is not None:
+            # Its tape takes the place of this one, whatever was run on it before doesn't count
+            env.reset()
+        self._check_fresh_tape()
+        program = self._get_bytecode_program()
+        digest = program_hash(program)
+        if snapshot is not None and snapshot.program_hash != digest and self._cached_ast is not None:
+            # Maybe built for the used tape of an earlier run, while the snapshotted one started from a fresh tape
+            self._forget_compiled()
+            program = self._get_bytecode_program()
+            digest = program_hash(program)
+        pc = 0
+        if snapshot is not None:
+            snapshot.restore(program, env, digest)
+            pc = env.code_pointer
+        env.pristine = False
+        execution = program.execute(env, pc=pc, back_edges=back_edges)
+        try:
+            for reason in execution:
+                if reason == SUSPEND_PAUSE:
+                    # Output up to here is out, so the snapshot's output position is the stream's
+                    env.output_buffer.flush()
+                    yield BFSnapshot.take(program, env, digest)
+                elif reason == SUSPEND_OUTPUT:
+                    env.output_buffer.flush()
+                else:
+                    env.input_buffer.close()
+        finally:
+            execution.close()
+            env.output_buffer.flush()
+
+    def resume(self, snapshot):
+        for _ in self.checkpoints(back_edges=None, snapshot=snapshot):
+            pass
+
+    def stream(self, input_chunks=(), chunk_size=4096, flush=FLUSH_FULL):
+        # The command graph can't be suspended halfway, so the ast and tracing engines stream through their bytecode
+        self._check_fresh_tape()
+        if self.engine in ENGINE_PROGRAMS:
+            program = self._get_program()
+        else:
+            program = self._get_bytecode_program()
+        env = self.env
+        env.pristine = False
+        chunks = iter(input_chunks)
+        saved_buffers = env.input_buffer, env.output_buffer
+        env.output_buffer = output_buffer = BFOutputBuffer(buffer_size=chunk_size, flush=flush)
+        env.input_buffer = input_buffer = BFInputBuffer(eof=saved_buffers[0].eof, fed=True)
+        execution = program.execute(env)
+        try:
+            for reason in execution:
+                data = output_buffer.take()
+                if data:
+                    yield data
+                if reason == SUSPEND_INPUT:
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        input_buffer.close()
+                    else:
+                        input_buffer.feed(chunk)
+            data = output_buffer.take()
+            if data:
+                yield data
+        finally:
+            execution.close()
+            env.input_buffer, env.output_buffer = saved_buffers
+
+    async def execute_async(self, input_stream=None, output_stream=None, chunk_size=4096, back_edges=1 << 14,
+                            flush=FLUSH_FULL):
+        # `,` awaits input_stream.read(), what `.` prints goes to output_stream.write() (awaiting its drain(), if it
+        # has one) and every back_edges loop iterations the event loop gets a turn, so lots of sessions can share it.
+        # Like checkpoints, only the bytecode can stop anywhere, so that's what runs whatever the engine.
+        self._check_fresh_tape()
+        program = self._get_bytecode_program()
+        env = self.env
+        env.pristine = False
+        saved_buffers = env.input_buffer, env.output_buffer
+        env.output_buffer = output_buffer = BFOutputBuffer(buffer_size=chunk_size, flush=flush)
+        env.input_buffer = input_buffer = BFInputBuffer(eof=saved_buffers[0].eof, fed=True)
+        execution = program.execute(env, back_edges=back_edges)
+        try:
+            for reason in execution:
+                await _write_async(output_stream, output_buffer.take())
+                if reason == SUSPEND_INPUT:
+                    chunk = await input_stream.read(chunk_size) if input_stream is not None else b""
+                    if chunk:
+                        input_buffer.feed(chunk.encode("latin-1") if isinstance(chunk, str) else chunk)
+                    else:
+                        input_buffer.close()
+                elif reason == SUSPEND_PAUSE:
+                    await asyncio.sleep(0)
+            await _write_async(output_stream, output_buffer.take())
+        finally:
+            execution.close()
+            env.input_buffer, env.output_buffer = saved_buffers
 
     @property
     def code(self):
@@ -25,10 +222,109 @@ class BrainFuckInterpreter:
         if value != self._code:
             self._code_is_dirty = True
             self._code = value
+            self._code_start = None
+
+    def _check_fresh_tape(self):
+        # The optimizer may have relied on the tape being all zeros, which doesn't hold for a second run on it
+        if self._assumes_fresh_tape and not self.env.pristine:
+            self._forget_compiled()
+
+    def _forget_compiled(self):
+        self._cached_ast = None
+        self._cached_program = None
+        self._cached_bytecode = None
+        self._assumes_fresh_tape = False
 
     def _get_ast(self):
         if self._code_is_dirty or self._cached_ast is None:
-            b = BEASTBuilder(self.code, self.env)
-            self._cached_ast = b.build_ast()
+            self._cached_ast, self._assumes_fresh_tape = self._build_ast()
+            self._cached_program = None
+            self._cached_bytecode = None
             self._code_is_dirty = False
         return self._cached_ast
+
+    def _build_ast(self):
+        # The graph and whether the optimizer counted on the tape being all zeros for it
+        ast = BEASTBuilder(self._source()).build_ast()
+        if not self.optimize:
+            return ast, False
+        optimizer = BFOptimizer(self.env.cell_bits, fresh_tape=self.env.pristine)
+        return optimizer.optimize(ast), optimizer.assumed_fresh_tape
+
+    def _source(self):
+        # A second run on a used tape builds the graph again, by then a file object has been read to its end
+        code = self._code
+        if isinstance(code, (str, bytes, bytearray, memoryview, mmap.mmap)):
+            return code
+        if self._code_start is None:
+            self._code_start = code.tell() if code.seekable() else -1
+        elif self._code_start < 0:
+            raise ValueError("The program has to be built again but its source can't be rewound")
+        else:
+            code.seek(self._code_start)
+        return code
+
+    def _get_program(self):
+        if self._code_is_dirty:
+            self._cached_ast = None
+            self._cached_program = None
+            self._code_is_dirty = False
+        if self._cached_program is None:
+            self._cached_program = self._load_program()
+        return self._cached_program
+
+    def _load_program(self):
+        if self.cache is None:
+            return self._compile(self._get_ast())
+        compiler, program_class = ENGINE_PROGRAMS[self.engine]
+        fresh_tape = self.optimize and self.env.pristine
+        key = self.cache.key(self._source(), self.engine, compiler.VERSION, self.optimize and BFOptimizer.VERSION,
+                             fresh_tape, self.env.cell_bits, sys.implementation.cache_tag)
+        data = self.cache.get(key)
+        if data is not None:
+            try:
+                program = program_class.loads(data)
+                # No way to tell whether this one relied on it, play safe
+                self._assumes_fresh_tape = fresh_tape
+                return program
+            except (ValueError, EOFError, TypeError):
+                # Truncated or stale entry, compile it again
+                self.cache.discard(key)
+        program = self._compile(self._get_ast())
+        self.cache.put(key, program.dumps())
+        return program
+
+    def _get_tracer(self):
+        # Loops it has compiled stay patched into the command graph, the tracer lives as long as the graph does
+        ast = self._get_ast()
+        if self._cached_tracer is None or self._cached_tracer.ast is not ast:
+            self._cached_tracer = BFTracer(ast)
+        return self._cached_tracer
+
+    def _get_bytecode_program(self):
+        if self.engine == BYTECODE_ENGINE:
+            return self._get_program()
+        ast = self._get_ast()
+        if self._cached_bytecode is None:
+            self._cached_bytecode = BFBytecodeCompiler(ast, cell_bits=self.env.cell_bits).compile()
+        return self._cached_bytecode
+
+    def _compile(self, ast):
+        if self.engine == PYTHON_ENGINE:
+            return BFPythonCompiler(ast, cell_bits=self.env.cell_bits).compile()
+        return BFBytecodeCompiler(ast, cell_bits=self.env.cell_bits).compile()
+
+
+async def _write_async(stream, data):
+    if not data:
+        return
+    if stream is None:
+        # No sink, straight to stdout like the other ways of running a program
+        write_stream(None, data)
+        return
+    result = stream.write(data)
+    if inspect.isawaitable(result):
+        await result
+    drain = getattr(stream, "drain", None)
+    if drain is not None:
+        await drain()
@@ -0,0 +1,86 @@
+import time
+from collections import namedtuple
+
+from interpreters.bfuck.streams import SUSPEND_OUTPUT, SUSPEND_PAUSE
+
+# Loop iterations between two looks at the clock
+CHECK_EVERY = 1 << 14
+
+BFExecutionStats = namedtuple("BFExecutionStats", "steps elapsed consumed written")
+
+
+class BFLimitExceeded(Exception):
+
+    def __init__(self, message, output, stats):
+        super().__init__(message)
+        # Everything the program wrote before being stopped, it has already gone to the output stream too
+        self.output = output
+        self.stats = stats
+
+    def __reduce__(self):
+        # Batch and server workers send it back to another process
+        return type(self), (self.args[0], self.output, self.stats)
+
+
+class BFStepLimitExceeded(BFLimitExceeded):
+    pass
+
+
+class BFDeadlineExceeded(BFLimitExceeded):
+    pass
+
+
+def run_limited(program, env, max_steps=None, timeout=None, check_every=CHECK_EVERY):
+    # Drives a bytecode program the way run_execution does, stopping it once it goes over max_steps loop iterations
+    # or runs for longer than timeout seconds. Straight line code always ends, so loop iterations are the only steps
+    # worth counting, and the VM counts them itself at back-edges: the limits cost nothing per instruction.
+    for name, limit in (("max_steps", max_steps), ("timeout", timeout)):
+        # Negative fuel never runs out, a negative budget would mean no budget at all
+        if limit is not None and limit < 0:
+            raise ValueError(f"{name} must be a non negative number, got {limit}")
+    start = time.monotonic()
+    deadline = None if timeout is None else start + timeout
+    output = bytearray()
+    steps = 0
+
+    def next_pause():
+        # One more than what's left, the pause after the last allowed iteration is the one going over
+        return check_every if max_steps is None else min(check_every, max_steps - steps + 1)
+
+    def flush():
+        output.extend(env.output_buffer.buffer)
+        env.output_buffer.flush()
+
+    def stop(error_class, message):
+        flush()
+        stats = BFExecutionStats(steps, time.monotonic() - start, env.input_buffer.consumed,
+                                 env.output_buffer.written)
+        return error_class(message, bytes(output), stats)
+
+    fuel = next_pause()
+    # Reads flush what's pending first, that has to go through here too or it would be missing from the error
+    saved_before_read = env.input_buffer.before_read
+    env.input_buffer.before_read = flush
+    execution = program.execute(env, back_edges=fuel)
+    try:
+        reason = next(execution)
+        while True:
+            if reason == SUSPEND_PAUSE:
+                steps += fuel
+                if max_steps is not None and steps > max_steps:
+                    raise stop(BFStepLimitExceeded, f"Program went over {max_steps} steps")
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise stop(BFDeadlineExceeded, f"Program ran for over {timeout} seconds")
+                fuel = next_pause()
+                reason = execution.send(fuel)
+                continue
+            if reason == SUSPEND_OUTPUT:
+                flush()
+            else:
+                env.input_buffer.close()
+            reason = next(execution)
+    except StopIteration:
+        pass
+    finally:
+        execution.close()
+        env.input_buffer.before_read = saved_before_read
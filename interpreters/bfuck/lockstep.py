@@ -0,0 +1,269 @@
+import time
+from heapq import heappop, heappush
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from interpreters.bfuck.batch import BFJobResult
+from interpreters.bfuck.bytecode import BFBytecodeCompiler, OP_ADD, OP_MOVE, OP_OUTPUT, OP_CLEAR, OP_ASSIGN, \
+    OP_MULTIPLY, OP_JUMP_IF_ZERO, OP_JUMP_IF_NOT_ZERO
+from interpreters.bfuck.environment import BFEnvironment
+from interpreters.bfuck.interpreter import BrainFuckInterpreter
+from interpreters.bfuck.limits import BFExecutionStats, BFStepLimitExceeded
+from interpreters.bfuck.streams import EOF_MINUS_ONE, EOF_UNCHANGED, EOF_ZERO
+
+CELL_TYPES = {8: "uint8", 16: "uint16", 32: "uint32"}
+
+
+class BFLockstepRunner:
+    # Runs one program over lots of inputs at once. Every input gets a lane: a row of a 2-D tape, a pointer and a
+    # program counter. Lanes sitting on the same instruction run it together as a handful of NumPy operations, so the
+    # cost of dispatching an instruction is paid once for the whole group instead of once per input.
+    #
+    # Lanes part ways where a loop condition differs between them. The group with the lowest program counter always
+    # goes next: lanes still looping run first while the ones that left the loop wait after it, and they join up again
+    # there. A group only ever holds its own lanes, finished or waiting lanes cost nothing.
+    #
+    # Needs numpy.
+
+    def __init__(self, code, optimize=True, cell_bits=8, eof=EOF_ZERO, n_cells=BFEnvironment.N_CELLS * 2,
+                 max_lanes=1024, max_steps=None):
+        if numpy is None:
+            raise ImportError("The lockstep engine needs numpy")
+        interpreter = BrainFuckInterpreter(code, optimize=optimize, cell_bits=cell_bits, eof=eof)
+        # Superinstructions save dispatches, here a dispatch is already shared by every lane in the group
+        self.program = BFBytecodeCompiler(interpreter._get_ast(), cell_bits=cell_bits, superinstructions=()).compile()
+        self.cell_type = numpy.dtype(CELL_TYPES[cell_bits])
+        self.mask = interpreter.env.cell_mask
+        self.eof = eof
+        self.n_cells = n_cells
+        self.max_lanes = max_lanes
+        self.max_steps = max_steps
+        # Operands as cell typed scalars, adding them wraps around the way the other engines mask
+        cell = self.cell_type.type
+        self._operands = [cell(arg & self.mask) if op in (OP_ADD, OP_ASSIGN) else arg
+                          for op, arg in zip(self.program.ops, self.program.args)]
+        self._coefficients = [[(offset, cell(coefficient & self.mask)) for offset, coefficient in const]
+                              for const in self.program.consts]
+        # Lowest and highest cell each instruction touches, relative to the pointer
+        self._reach = []
+        for op, arg, offset in zip(self.program.ops, self.program.args, self.program.offsets):
+            touched = [0]
+            if op == OP_MULTIPLY:
+                touched += [target for target, _ in self.program.consts[arg]]
+            self._reach.append((offset + min(touched), offset + max(touched)))
+
+    def map(self, inputs):
+        # Yields a BFJobResult per input, in order. Inputs go through max_lanes at a time, a lane holds a whole tape.
+        lanes = []
+        index = 0
+        for input_data in inputs:
+            if isinstance(input_data, str):
+                input_data = input_data.encode("latin-1")
+            lanes.append(input_data)
+            if len(lanes) == self.max_lanes:
+                yield from self._run_lanes(index, lanes)
+                index += len(lanes)
+                lanes = []
+        if lanes:
+            yield from self._run_lanes(index, lanes)
+
+    def run(self, inputs):
+        return list(self.map(inputs))
+
+    def _run_lanes(self, first_index, inputs):
+        start = time.monotonic()
+        n_lanes = len(inputs)
+        if not self.program.ops:
+            # Nothing left after optimizing, nothing to write either
+            for lane in range(n_lanes):
+                yield BFJobResult(first_index + lane, b"", None)
+            return
+        n_cells = self.n_cells
+        ops, args, jumps, offsets = self.program.ops, self.program.args, self.program.jumps, self.program.offsets
+        operands, coefficients, reach = self._operands, self._coefficients, self._reach
+        n_ops = len(ops)
+        tapes = numpy.zeros((n_lanes, n_cells), self.cell_type)
+        # Lanes address the tapes as a single flat array, lane * n_cells + cell. Indexing that is twice as fast as
+        # picking (lane, cell) pairs out of the 2-D array, and moving a whole group is a single addition.
+        cells = tapes.reshape(-1)
+        # Inputs padded into a single array, the column right after a lane's input is what it reads at EOF
+        lengths = numpy.array([len(input_data) for input_data in inputs], numpy.intp)
+        stream = numpy.zeros((n_lanes, int(lengths.max()) + 1), self.cell_type)
+        for lane, input_data in enumerate(inputs):
+            stream[lane, :len(input_data)] = numpy.frombuffer(input_data, numpy.uint8)
+        if self.eof == EOF_MINUS_ONE:
+            stream[numpy.arange(n_lanes), lengths] = self.mask
+        positions = numpy.zeros(n_lanes, numpy.intp)
+        steps = numpy.zeros(n_lanes, numpy.int64)
+        errors = {}
+        written = []
+        # Lanes waiting on each instruction: their indexes, the address of their current cell and bounds on their
+        # pointers, which start halfway along the tape like the environment's
+        lanes = numpy.arange(n_lanes)
+        origin = n_cells // 2
+        groups = {0: (lanes, lanes * n_cells + origin, origin, origin)}
+        pending = [0]
+
+        def move_to(pc, lanes, addresses, low, high):
+            if pc >= n_ops:
+                return
+            group = groups.get(pc)
+            if group is None:
+                groups[pc] = lanes, addresses, low, high
+                heappush(pending, pc)
+            else:
+                groups[pc] = (numpy.concatenate((group[0], lanes)), numpy.concatenate((group[1], addresses)),
+                              min(group[2], low), max(group[3], high))
+
+        def jump_back(pc, lanes, addresses, low, high):
+            if self.max_steps is not None:
+                steps[lanes] += 1
+                over = steps[lanes] > self.max_steps
+                if over.any():
+                    for lane in lanes[over].tolist():
+                        errors[lane] = BFStepLimitExceeded, f"Program went over {self.max_steps} steps"
+                    lanes, addresses = lanes[~over], addresses[~over]
+                    if not len(lanes):
+                        return
+            move_to(jumps[pc], lanes, addresses, low, high)
+
+        def run_lane(pc, lane, pointer):
+            # A single lane through a single instruction, the way the bytecode VM does it, for lanes close enough to
+            # either end of their tape that the flat addresses would spill into the next lane
+            op = ops[pc]
+            tape = tapes[lane]
+            cell = pointer + offsets[pc]
+            if op == OP_JUMP_IF_ZERO:
+                return pc + 1 if tape[cell] else jumps[pc]
+            elif op == OP_JUMP_IF_NOT_ZERO:
+                return jumps[pc] if tape[cell] else pc + 1
+            elif op == OP_ADD:
+                tape[cell] = (int(tape[cell]) + args[pc]) & self.mask
+            elif op == OP_MULTIPLY:
+                value = int(tape[cell])
+                if value:
+                    for offset, coefficient in self.program.consts[args[pc]]:
+                        tape[cell + offset] = (int(tape[cell + offset]) + value * coefficient) & self.mask
+                    tape[cell] = 0
+            elif op == OP_OUTPUT:
+                written.append((numpy.array([lane]), numpy.array([tape[cell]], self.cell_type)))
+            elif op == OP_CLEAR:
+                tape[cell] = 0
+            elif op == OP_ASSIGN:
+                tape[cell] = args[pc]
+            else:
+                at = positions[lane]
+                if at < lengths[lane]:
+                    positions[lane] += 1
+                    tape[cell] = stream[lane, at]
+                elif self.eof is not EOF_UNCHANGED:
+                    tape[cell] = stream[lane, at]
+            return pc + 1
+
+        while pending:
+            pc = heappop(pending)
+            lanes, addresses, low, high = groups.pop(pc)
+            op = ops[pc]
+            if op == OP_MOVE:
+                amount = operands[pc]
+                move_to(pc + 1, lanes, addresses + amount, low + amount, high + amount)
+                continue
+            lowest, highest = reach[pc]
+            if low + lowest < 0 or high + highest >= n_cells:
+                # Some lane might touch a cell outside its own row. The bounds get loose as groups merge, lanes well
+                # inside their row carry on together and the rest go one by one.
+                pointers = addresses - lanes * n_cells
+                inside = (pointers + lowest >= 0) & (pointers + highest < n_cells)
+                if inside.any():
+                    move_to(pc, lanes[inside], addresses[inside], int(pointers[inside].min()),
+                            int(pointers[inside].max()))
+                for lane, pointer in zip(lanes[~inside].tolist(), pointers[~inside].tolist()):
+                    try:
+                        next_pc = run_lane(pc, lane, pointer)
+                    except IndexError:
+                        errors[lane] = IndexError, "Cell pointer went off the tape"
+                        continue
+                    group = numpy.array([lane]), numpy.array([lane * n_cells + pointer]), pointer, pointer
+                    if op == OP_JUMP_IF_NOT_ZERO and next_pc != pc + 1:
+                        jump_back(pc, *group)
+                    else:
+                        move_to(next_pc, *group)
+                continue
+            if op == OP_JUMP_IF_ZERO or op == OP_JUMP_IF_NOT_ZERO:
+                values = cells[addresses]
+                non_zero = numpy.count_nonzero(values)
+                if non_zero == len(lanes):
+                    if op == OP_JUMP_IF_ZERO:
+                        move_to(pc + 1, lanes, addresses, low, high)
+                    else:
+                        jump_back(pc, lanes, addresses, low, high)
+                elif not non_zero:
+                    if op == OP_JUMP_IF_ZERO:
+                        move_to(jumps[pc], lanes, addresses, low, high)
+                    else:
+                        move_to(pc + 1, lanes, addresses, low, high)
+                else:
+                    non_zero = values != 0
+                    zero = ~non_zero
+                    if op == OP_JUMP_IF_ZERO:
+                        move_to(jumps[pc], lanes[zero], addresses[zero], low, high)
+                        move_to(pc + 1, lanes[non_zero], addresses[non_zero], low, high)
+                    else:
+                        jump_back(pc, lanes[non_zero], addresses[non_zero], low, high)
+                        move_to(pc + 1, lanes[zero], addresses[zero], low, high)
+                continue
+            cell = addresses + offsets[pc] if offsets[pc] else addresses
+            if op == OP_ADD:
+                cells[cell] += operands[pc]
+            elif op == OP_MULTIPLY:
+                values = cells[cell]
+                non_zero = values != 0
+                if not non_zero.all():
+                    # Lanes with a zero cell have nothing to multiply
+                    cell, values = cell[non_zero], values[non_zero]
+                for offset, coefficient in coefficients[operands[pc]]:
+                    cells[cell + offset] += values * coefficient
+                cells[cell] = 0
+            elif op == OP_OUTPUT:
+                written.append((lanes, cells[cell]))
+            elif op == OP_CLEAR:
+                cells[cell] = 0
+            elif op == OP_ASSIGN:
+                cells[cell] = operands[pc]
+            else:
+                at = positions[lanes]
+                values = stream[lanes, at]
+                if self.eof is EOF_UNCHANGED:
+                    values = numpy.where(at < lengths[lanes], values, cells[cell])
+                cells[cell] = values
+                positions[lanes] = numpy.minimum(at + 1, lengths[lanes])
+            move_to(pc + 1, lanes, addresses, low, high)
+
+        outputs = self._collect_output(n_lanes, written)
+        elapsed = time.monotonic() - start
+        for lane, output in enumerate(outputs):
+            error = errors.get(lane)
+            if error is not None:
+                error_class, message = error
+                if error_class is BFStepLimitExceeded:
+                    stats = BFExecutionStats(int(steps[lane]), elapsed, int(positions[lane]), len(output))
+                    error = error_class(message, output, stats)
+                else:
+                    error = error_class(message)
+            yield BFJobResult(first_index + lane, output, error)
+
+    @staticmethod
+    def _collect_output(n_lanes, written):
+        if not written:
+            return [b""] * n_lanes
+        lanes = numpy.concatenate([lanes for lanes, _ in written])
+        # Only the lowest byte goes out, same as the output buffer
+        values = numpy.concatenate([values for _, values in written]).astype(numpy.uint8)
+        # Every lane wrote in program order, a stable sort on the lane keeps it that way
+        order = numpy.argsort(lanes, kind="stable")
+        data = values[order].tobytes()
+        ends = numpy.cumsum(numpy.bincount(lanes, minlength=n_lanes)).tolist()
+        return [data[start:end] for start, end in zip([0] + ends, ends)]
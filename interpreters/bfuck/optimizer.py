@@ -0,0 +1,274 @@
+from interpreters.bfuck.ast_builder import walk_ast
+from interpreters.bfuck.commands import BFCommand, BFBranchCommand, BFRepetibleCommand, CellValueIncrementCommand, \
+    CellPointerIncrementCommand, OpenBranchCommand, ClosingBranchCommand, ClearCellCommand, MultiplyLoopCommand, \
+    AssignCellCommand, SetCellValueCommand
+
+
+class BFOptimizer:
+    # Bump whenever a pass changes its output, cached programs are keyed on it
+    VERSION = 4
+
+    def __init__(self, cell_bits=8, fresh_tape=False):
+        self.cell_mask = (1 << cell_bits) - 1
+        # Whether the program will start on an all zeros tape, lets loops at the start be dropped
+        self.fresh_tape = fresh_tape
+        # Set when the output only holds on a fresh tape
+        self.assumed_fresh_tape = False
+
+    def optimize(self, ast):
+        commands = [command for command in walk_ast(ast) if not self._is_noop(command)]
+        commands = self._fold_loop_idioms(commands)
+        commands = self._fold_offsets(commands)
+        commands = self._propagate_constants(commands)
+        # Dropped loops leave their surrounding blocks next to each other, fold them again
+        commands = self._fold_offsets(commands)
+        commands = self._remove_dead_stores(commands)
+        return self._link(commands)
+
+    @staticmethod
+    def _is_noop(command):
+        return type(command) is BFCommand or (isinstance(command, BFRepetibleCommand) and not command.times)
+
+    def _fold_loop_idioms(self, commands):
+        folded = []
+        open_positions = []
+        for command in commands:
+            command_type = type(command)
+            if command_type is OpenBranchCommand:
+                open_positions.append(len(folded))
+            elif command_type is ClosingBranchCommand and open_positions:
+                # Inner loops are folded first, so an outer loop holding an idiom is never simple itself
+                start = open_positions.pop()
+                idiom = self._loop_idiom(folded[start + 1:])
+                if idiom is not None:
+                    idiom.position = folded[start].position
+                    del folded[start:]
+                    folded.append(idiom)
+                    continue
+            folded.append(command)
+        return folded
+
+    def _loop_idiom(self, body):
+        offset = 0
+        deltas = {}
+        for command in body:
+            command_type = type(command)
+            if command_type is CellPointerIncrementCommand:
+                offset += command.times
+            elif command_type is CellValueIncrementCommand:
+                deltas[offset] = deltas.get(offset, 0) + command.times
+            else:
+                return None
+        step = deltas.pop(0, 0)
+        # With an even step the loop only ends for some values and spins forever on the others, leave those alone
+        if offset != 0 or step % 2 == 0:
+            return None
+        factors = [(target, factor) for target, factor in deltas.items() if factor]
+        if not factors:
+            return ClearCellCommand()
+        return MultiplyLoopCommand(factors=factors, step=step)
+
+    def _fold_offsets(self, commands):
+        # Inside a basic block the pointer moves are folded into the offset of every command, and the block ends
+        # with a single move by the net amount. Adds commute with each other, so they're gathered per cell until
+        # something else touches the tape.
+        folded = []
+        offset = 0
+        adds = {}
+        # The net move stands in for the block's first move as far as the source is concerned
+        move_position = None
+        for command in commands:
+            command_type = type(command)
+            if command_type is CellPointerIncrementCommand:
+                if move_position is None:
+                    move_position = command.position
+                offset += command.times
+                continue
+            if command_type is CellValueIncrementCommand:
+                cell = offset + command.offset
+                if cell in adds:
+                    adds[cell].times += command.times
+                else:
+                    command.offset = cell
+                    adds[cell] = command
+                continue
+            folded.extend(add for add in adds.values() if add.times)
+            adds.clear()
+            if isinstance(command, BFBranchCommand):
+                if offset:
+                    folded.append(self._move(offset, move_position))
+                offset = 0
+                move_position = None
+            else:
+                command.offset += offset
+            folded.append(command)
+        folded.extend(add for add in adds.values() if add.times)
+        if offset:
+            folded.append(self._move(offset, move_position))
+        return folded
+
+    def _propagate_constants(self, commands):
+        # Follows the cells whose value is known through each block: everything is zero on a fresh tape and a loop
+        # always leaves its cell at zero. Loops that can't be entered go away, stores of a value the cell already
+        # holds too, and adds or closed form loops on cells set earlier in the block become plain stores.
+        mask = self.cell_mask
+        indexes = {command: index for index, command in enumerate(commands)}
+        propagated = []
+        # offset -> value, None when unknown. Cells not in here are zero while the tape is still fresh.
+        known = {}
+        fresh = self.fresh_tape
+        # Cells whose known value relies on the tape having started fresh
+        from_fresh = set()
+        # Cells stored to in the current block, an add to them can become a store too
+        stored = set()
+
+        def value(cell):
+            if cell in known:
+                return known[cell]
+            return 0 if fresh else None
+
+        def relies_on_fresh_tape(cell):
+            if cell in from_fresh or cell not in known:
+                self.assumed_fresh_tape = True
+
+        def store(command, cell, new_value):
+            # command is the clear or assign doing the store, or whatever it replaces
+            if value(cell) == new_value:
+                relies_on_fresh_tape(cell)
+                return
+            if type(command) is not ClearCellCommand and type(command) is not AssignCellCommand:
+                command = self._assign(new_value, cell, command.position)
+            propagated.append(command)
+            known[cell] = new_value
+            from_fresh.discard(cell)
+            stored.add(cell)
+
+        def add(command, cell, times):
+            current = value(cell)
+            if cell in stored:
+                store(command, cell, (current + times) & mask)
+                return
+            propagated.append(command)
+            if current is not None:
+                if cell not in known:
+                    from_fresh.add(cell)
+                known[cell] = (current + times) & mask
+            else:
+                known[cell] = None
+
+        index = 0
+        while index < len(commands):
+            command = commands[index]
+            command_type = type(command)
+            index += 1
+            if command_type is OpenBranchCommand:
+                if value(0) == 0:
+                    relies_on_fresh_tape(0)
+                    # An unmatched "[" skips to the end of the program
+                    index = indexes[command.companion] + 1 if command.companion is not None else len(commands)
+                    continue
+                propagated.append(command)
+                known, fresh, from_fresh, stored = {}, False, set(), set()
+            elif command_type is ClosingBranchCommand:
+                propagated.append(command)
+                known, fresh, from_fresh, stored = {0: 0}, False, set(), set()
+            elif command_type is CellPointerIncrementCommand:
+                propagated.append(command)
+                known = {cell - command.times: cell_value for cell, cell_value in known.items()}
+                from_fresh = {cell - command.times for cell in from_fresh}
+                stored = {cell - command.times for cell in stored}
+            elif command_type is CellValueIncrementCommand:
+                add(command, command.offset, command.times)
+            elif command_type is ClearCellCommand:
+                store(command, command.offset, 0)
+            elif command_type is AssignCellCommand:
+                store(command, command.offset, command.value & mask)
+            elif command_type is MultiplyLoopCommand:
+                current = value(command.offset)
+                if current is None:
+                    propagated.append(command)
+                    for offset, _ in command.factors:
+                        known[command.offset + offset] = None
+                        from_fresh.discard(command.offset + offset)
+                        stored.discard(command.offset + offset)
+                    known[command.offset] = 0
+                    from_fresh.discard(command.offset)
+                    continue
+                relies_on_fresh_tape(command.offset)
+                if current:
+                    # The loop count is known, so is what it adds to every target
+                    for offset, coefficient in command.coefficients(mask):
+                        target = command.offset + offset
+                        add(self._add(current * coefficient, target, command.position), target,
+                            current * coefficient)
+                    store(command, command.offset, 0)
+            elif command_type is SetCellValueCommand:
+                propagated.append(command)
+                known[command.offset] = None
+                from_fresh.discard(command.offset)
+                stored.discard(command.offset)
+            else:
+                propagated.append(command)
+        return propagated
+
+    @staticmethod
+    def _remove_dead_stores(commands):
+        # Walks each block backwards: whatever is written to a cell that gets stored to again before anything
+        # reads it is dead. Cells are live at the end of a block, the next one may read any of them.
+        kept = []
+        overwritten = set()
+        for command in reversed(commands):
+            command_type = type(command)
+            if isinstance(command, BFBranchCommand) or command_type is CellPointerIncrementCommand:
+                overwritten = set()
+            elif command_type is ClearCellCommand or command_type is AssignCellCommand:
+                if command.offset in overwritten:
+                    continue
+                overwritten.add(command.offset)
+            elif command_type is CellValueIncrementCommand:
+                if command.offset in overwritten:
+                    continue
+            elif command_type is MultiplyLoopCommand:
+                overwritten.discard(command.offset)
+                overwritten.difference_update(command.offset + offset for offset, _ in command.factors)
+            else:
+                # I/O reads the cell, input included since it's left unchanged on EOF_UNCHANGED
+                overwritten.discard(command.offset)
+            kept.append(command)
+        kept.reverse()
+        return kept
+
+    def _signed(self, value):
+        # Shortest run of +/- with the same effect
+        value &= self.cell_mask
+        return value - self.cell_mask - 1 if value > self.cell_mask // 2 else value
+
+    def _assign(self, value, offset, position):
+        if not value:
+            assign = ClearCellCommand()
+        else:
+            assign = AssignCellCommand(value=self._signed(value))
+        assign.offset = offset
+        assign.position = position
+        return assign
+
+    def _add(self, times, offset, position):
+        add = CellValueIncrementCommand(times=self._signed(times))
+        add.offset = offset
+        add.position = position
+        return add
+
+    def _move(self, times, position):
+        move = CellPointerIncrementCommand(times=times)
+        move.position = position
+        return move
+
+    def _link(self, commands):
+        if not commands:
+            return BFCommand()
+        for command, following in zip(commands, commands[1:] + [None]):
+            if isinstance(command, BFBranchCommand):
+                command.no_jump = following
+            else:
+                command.next = following
+        return commands[0]
@@ -0,0 +1,70 @@
+from collections import deque
+from contextlib import contextmanager
+
+from interpreters.bfuck.interpreter import BrainFuckInterpreter, BYTECODE_ENGINE, ENGINE_PROGRAMS, TRACING_ENGINE
+from interpreters.bfuck.streams import EOF_ZERO
+
+
+class BFInterpreterPool:
+    # Hands out interpreters for a single program, ready to run: the program is compiled once for the whole pool and
+    # returned interpreters keep their environment, only its tape is zeroed. Serving a request then allocates nothing
+    # but the I/O buffers.
+
+    def __init__(self, code, engine=BYTECODE_ENGINE, optimize=True, cell_bits=8, eof=EOF_ZERO, cache=None,
+                 paged=False, max_tape_bytes=None, max_idle=16):
+        self.code = code
+        self.max_idle = max_idle
+        self._settings = dict(engine=engine, optimize=optimize, cell_bits=cell_bits, eof=eof, cache=cache,
+                              paged=paged, max_tape_bytes=max_tape_bytes)
+        self._idle = deque()
+        # What the first interpreter compiled, handed to every later one
+        self._compiled = None
+        self.created = 0
+
+    def acquire(self, input_stream=None, output_stream=None):
+        try:
+            interpreter = self._idle.pop()
+        except IndexError:
+            interpreter = self._new_interpreter()
+        interpreter.env.set_streams(input_stream, output_stream)
+        return interpreter
+
+    def release(self, interpreter):
+        interpreter.env.reset()
+        # Don't keep the caller's streams alive while idle
+        interpreter.env.set_streams()
+        if len(self._idle) < self.max_idle:
+            self._idle.append(interpreter)
+
+    @contextmanager
+    def interpreter(self, input_stream=None, output_stream=None):
+        interpreter = self.acquire(input_stream, output_stream)
+        try:
+            yield interpreter
+        finally:
+            self.release(interpreter)
+
+    def execute(self, input_stream=None, output_stream=None, **limits):
+        with self.interpreter(input_stream, output_stream) as interpreter:
+            interpreter.execute(**limits)
+
+    def _new_interpreter(self):
+        interpreter = BrainFuckInterpreter(self.code, **self._settings)
+        self.created += 1
+        # Neither programs nor command graphs hold on to an environment, whatever the engine runs is shared by the
+        # whole pool. Loops the tracing engine compiles stay patched into the shared graph, later runs start hot.
+        if self._compiled is None:
+            if interpreter.engine in ENGINE_PROGRAMS:
+                interpreter._get_program()
+            elif interpreter.engine == TRACING_ENGINE:
+                interpreter._get_tracer()
+            else:
+                interpreter._get_ast()
+            # Runs with limits go through the bytecode whatever the engine, compiled up front so it's shared too
+            interpreter._get_bytecode_program()
+            self._compiled = (interpreter._cached_ast, interpreter._cached_program, interpreter._cached_bytecode,
+                              interpreter._cached_tracer, interpreter._assumes_fresh_tape)
+        else:
+            (interpreter._cached_ast, interpreter._cached_program, interpreter._cached_bytecode,
+             interpreter._cached_tracer, interpreter._assumes_fresh_tape) = self._compiled
+        return interpreter
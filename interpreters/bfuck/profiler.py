@@ -0,0 +1,91 @@
+import mmap
+from collections import namedtuple
+
+from interpreters.bfuck.ast_builder import walk_ast
+from interpreters.bfuck.commands import OpenBranchCommand, ClosingBranchCommand
+
+BFCommandProfile = namedtuple("BFCommandProfile", "position operator executions")
+BFLoopProfile = namedtuple("BFLoopProfile", "start end source entries iterations executions")
+
+
+class BFProfiler:
+    # Runs a command graph counting every command it executes. It's a loop of its own instead of a flag in
+    # BrainFuckInterpreter.execute, so not profiling costs nothing.
+
+    def __init__(self, ast, code=""):
+        self.ast = ast
+        self.code = code
+        self.commands = list(walk_ast(ast))
+        self.counts = dict.fromkeys(self.commands, 0)
+
+    def run(self, env):
+        counts = self.counts
+        command = self.ast
+        while command is not None:
+            counts[command] += 1
+            command = command.execute(env)
+        return self.profile()
+
+    def profile(self):
+        counts = self.counts
+        commands = [BFCommandProfile(command.position, str(command), counts[command]) for command in self.commands]
+        # executed[i] is the number of commands executed before the i-th one in program order, so the cost of a
+        # loop including everything nested in it is a single subtraction
+        executed = [0]
+        for command in commands:
+            executed.append(executed[-1] + command.executions)
+        loops = []
+        open_indexes = []
+        for index, command in enumerate(self.commands):
+            if type(command) is OpenBranchCommand:
+                open_indexes.append(index)
+            elif type(command) is ClosingBranchCommand and open_indexes:
+                start = open_indexes.pop()
+                opening = self.commands[start]
+                source = "".join(profile.operator for profile in commands[start:index + 1])
+                loops.append(BFLoopProfile(opening.position, command.position, source, counts[opening],
+                                           counts[command], executed[index + 1] - executed[start]))
+        return BFProfile(self.code, commands, loops)
+
+
+class BFProfile:
+
+    def __init__(self, code, commands, loops):
+        self.code = code
+        self.commands = commands
+        self.loops = loops
+
+    @property
+    def executions(self):
+        return sum(command.executions for command in self.commands)
+
+    def hot_commands(self, top=None):
+        return sorted(self.commands, key=lambda command: command.executions, reverse=True)[:top]
+
+    def hot_loops(self, top=None):
+        return sorted(self.loops, key=lambda loop: loop.executions, reverse=True)[:top]
+
+    def line_column(self, position):
+        if position is None or not isinstance(self.code, (str, bytes, bytearray, mmap.mmap)):
+            # File objects have been read already, there's nothing to look lines up in, only offsets
+            return None
+        newline = "\n" if isinstance(self.code, str) else b"\n"
+        line = self.code[:position].count(newline) + 1
+        return line, position - self.code.rfind(newline, 0, position)
+
+    def report(self, top=10, width=40):
+        total = self.executions
+        lines = [f"{total} commands executed, {len(self.loops)} loops",
+                 f"{'rank':>4} {'offset':>7} {'line:col':>9} {'entries':>9} {'iterations':>11} {'executed':>12} "
+                 f"{'share':>6}  loop"]
+        for rank, loop in enumerate(self.hot_loops(top), 1):
+            location = self.line_column(loop.start)
+            location = f"{location[0]}:{location[1]}" if location else "?"
+            source = loop.source if len(loop.source) <= width else loop.source[:width - 3] + "..."
+            share = loop.executions / total if total else 0
+            lines.append(f"{rank:>4} {loop.start if loop.start is not None else '?':>7} {location:>9} "
+                         f"{loop.entries:>9} {loop.iterations:>11} {loop.executions:>12} {share:>6.1%}  {source}")
+        return "\n".join(lines)
+
+    def __str__(self):
+        return self.report()
@@ -0,0 +1,368 @@
+import argparse
+import json
+import multiprocessing
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+
+from interpreters.bfuck.batch import BFOutputLimitExceeded
+from interpreters.bfuck.cache import BFProgramCache
+from interpreters.bfuck.interpreter import BYTECODE_ENGINE, ENGINES
+from interpreters.bfuck.limits import BFLimitExceeded
+from interpreters.bfuck.optimizer import BFOptimizer
+from interpreters.bfuck.pool import BFInterpreterPool
+from interpreters.bfuck.streams import EOF_ZERO
+
+# Seconds a worker gets past a job's timeout before it's killed and replaced
+KILL_GRACE = 2
+# Requests the latency percentiles are computed over
+LATENCY_WINDOW = 1000
+
+
+class BFServer:
+    # Runs programs sent over localhost HTTP on a pool of warm worker processes. Every worker keeps an LRU of
+    # interpreter pools keyed on the source hash, so a program that keeps coming back is only compiled once per
+    # worker. A job waits for an idle worker, then its output is streamed back as the worker flushes it.
+    #
+    #   POST /run      {"code": ..., "input": ..., "max_steps": ..., "timeout": ..., "max_output": ...}
+    #                  answers with JSON lines: {"output": ...} as output comes, then {"error": ..., "stats": ...}
+    #   GET /metrics   queue depth, workers busy and latency percentiles
+    #
+    # Strings carry bytes as latin-1. Limits asked for by a job can only lower the server's own.
+
+    def __init__(self, host="127.0.0.1", port=0, workers=None, engine=BYTECODE_ENGINE, optimize=True, cell_bits=8,
+                 eof=EOF_ZERO, max_programs=128, max_steps=None, timeout=None, max_output=None):
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine '{engine}'")
+        self.settings = dict(engine=engine, optimize=optimize, cell_bits=cell_bits, eof=eof,
+                             max_programs=max_programs)
+        self.limits = dict(max_steps=max_steps, timeout=timeout, max_output=max_output)
+        self.metrics = BFServerMetrics()
+        # Forking a process that's already running server threads isn't safe
+        self._context = multiprocessing.get_context("spawn")
+        self._idle = queue.Queue()
+        self._workers = []
+        self._workers_lock = threading.Lock()
+        for _ in range(workers or multiprocessing.cpu_count()):
+            self._idle.put(self._spawn())
+        self.httpd = ThreadingHTTPServer((host, port), _BFRequestHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.bf_server = self
+        self._thread = None
+
+    @property
+    def address(self):
+        return self.httpd.server_address[:2]
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        if self._thread is not None:
+            self.httpd.shutdown()
+            self._thread.join()
+        self.httpd.server_close()
+        with self._workers_lock:
+            workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.stop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def run(self, job):
+        # Yields ("output", data) while the job runs, then a single ("done", error, stats)
+        limits = self._job_limits(job)
+        code, input_data = job["code"], job.get("input", "").encode("latin-1")
+        self.metrics.queued()
+        worker = self._idle.get()
+        self.metrics.started()
+        error = None
+        done = False
+        try:
+            for message in worker.run(code, input_data, limits):
+                if message[0] == "done":
+                    error, done = message[1], True
+                yield message
+        except BFWorkerLost as e:
+            worker = self._replace(worker)
+            error, done = type(e).__name__, True
+            yield "done", error, None
+        finally:
+            if not done:
+                # Abandoned halfway, whatever the worker still has to say would end up in the next job
+                worker = self._replace(worker)
+                error = "Cancelled"
+            self.metrics.finished(error)
+            self._idle.put(worker)
+
+    def _job_limits(self, job):
+        limits = {}
+        for name, limit in self.limits.items():
+            value = job.get(name)
+            if value is not None and (not isinstance(value, (int, float)) or value < 0):
+                raise ValueError(f"{name} must be a non negative number")
+            if limit is not None:
+                value = limit if value is None else min(value, limit)
+            limits[name] = value
+        return limits
+
+    def _spawn(self):
+        worker = _Worker(self._context, self.settings)
+        with self._workers_lock:
+            self._workers.append(worker)
+        return worker
+
+    def _replace(self, worker):
+        worker.kill()
+        with self._workers_lock:
+            self._workers.remove(worker)
+        return self._spawn()
+
+
+class BFServerMetrics:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.waiting = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self._local = threading.local()
+
+    def queued(self):
+        self._local.start = time.perf_counter()
+        with self.lock:
+            self.waiting += 1
+
+    def started(self):
+        with self.lock:
+            self.waiting -= 1
+            self.running += 1
+
+    def finished(self, error):
+        latency = time.perf_counter() - self._local.start
+        with self.lock:
+            self.running -= 1
+            self.completed += 1
+            self.failed += error is not None
+            self.latencies.append(latency)
+
+    def snapshot(self):
+        with self.lock:
+            latencies = sorted(self.latencies)
+            metrics = {"queue_depth": self.waiting, "running": self.running, "completed": self.completed,
+                       "failed": self.failed}
+        latency = {"count": len(latencies)}
+        if latencies:
+            latency["mean"] = sum(latencies) / len(latencies)
+            for percentile in (50, 90, 99):
+                latency[f"p{percentile}"] = latencies[min(len(latencies) - 1, len(latencies) * percentile // 100)]
+            latency["max"] = latencies[-1]
+        metrics["latency_seconds"] = latency
+        return metrics
+
+
+class BFWorkerLost(Exception):
+    pass
+
+
+class _Worker:
+
+    def __init__(self, context, settings):
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_connection, settings), daemon=True)
+        self.process.start()
+        child_connection.close()
+
+    def run(self, code, input_data, limits):
+        timeout = limits["timeout"]
+        deadline = None if timeout is None else time.monotonic() + timeout + KILL_GRACE
+        try:
+            self.connection.send((code, input_data, limits))
+            while True:
+                # The deadline is checked by the worker, this is for when it can't even do that
+                if deadline is not None and not self.connection.poll(max(0, deadline - time.monotonic())):
+                    raise BFWorkerLost("Worker stopped answering")
+                message = self.connection.recv()
+                yield message
+                if message[0] == "done":
+                    return
+        except (EOFError, OSError):
+            raise BFWorkerLost("Worker died")
+
+    def stop(self):
+        try:
+            self.connection.send(None)
+        except OSError:
+            pass
+        self.process.join(1)
+        if self.process.is_alive():
+            self.kill()
+        self.connection.close()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+
+
+class _PipeOutput:
+
+    def __init__(self, connection, limit=None):
+        self.connection = connection
+        self.limit = limit
+        self.written = 0
+
+    def write(self, data):
+        if self.limit is not None and self.written + len(data) > self.limit:
+            data = data[:self.limit - self.written]
+            self._send(data)
+            raise BFOutputLimitExceeded(f"Output went over {self.limit} bytes")
+        self._send(data)
+
+    def _send(self, data):
+        if data:
+            self.written += len(data)
+            self.connection.send(("output", bytes(data)))
+
+
+def _worker_main(connection, settings):
+    pools = OrderedDict()
+    while True:
+        try:
+            job = connection.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+        code, input_data, limits = job
+        error = stats = None
+        try:
+            pool = _get_pool(pools, code, settings)
+            pool.execute(BytesIO(input_data), _PipeOutput(connection, limits["max_output"]),
+                         max_steps=limits["max_steps"], timeout=limits["timeout"])
+        except BFLimitExceeded as e:
+            error, stats = type(e).__name__, e.stats._asdict()
+        except Exception as e:
+            # A broken job must not take the worker down with it
+            error = type(e).__name__
+        connection.send(("done", error, stats))
+
+
+def _get_pool(pools, code, settings):
+    key = BFProgramCache.key(code, settings["engine"], settings["optimize"] and BFOptimizer.VERSION,
+                             settings["cell_bits"])
+    pool = pools.get(key)
+    if pool is not None:
+        pools.move_to_end(key)
+        return pool
+    pool = pools[key] = BFInterpreterPool(code, engine=settings["engine"], optimize=settings["optimize"],
+                                          cell_bits=settings["cell_bits"], eof=settings["eof"], max_idle=1)
+    while len(pools) > settings["max_programs"]:
+        pools.popitem(last=False)
+    return pool
+
+
+class _BFRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if self.path != "/metrics":
+            return self._send_json(404, {"error": "Not found"})
+        server = self.server.bf_server
+        metrics = server.metrics.snapshot()
+        metrics["workers"] = len(server._workers)
+        metrics["idle_workers"] = server._idle.qsize()
+        self._send_json(200, metrics)
+
+    def do_POST(self):
+        if self.path != "/run":
+            return self._send_json(404, {"error": "Not found"})
+        try:
+            job = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            if not isinstance(job, dict) or not isinstance(job.get("code"), str) or \
+                    not isinstance(job.get("input", ""), str):
+                raise ValueError("A job needs a code string and an optional input string")
+            messages = self.server.bf_server.run(job)
+            # Limits are validated before anything is sent
+            first = next(messages)
+        except (ValueError, UnicodeError) as e:
+            return self._send_json(400, {"error": str(e)})
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        connected = True
+        for message in _chain(first, messages):
+            if message[0] == "output":
+                line = {"output": message[1].decode("latin-1")}
+            else:
+                line = {"error": message[1], "stats": message[2]}
+            if connected:
+                try:
+                    self._write_chunk(json.dumps(line).encode() + b"\n")
+                except OSError:
+                    # The client is gone, the job still has to run to the end to get the worker back
+                    connected = False
+        if connected:
+            self._write_chunk(b"")
+
+    def _write_chunk(self, data):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _chain(first, rest):
+    yield first
+    yield from rest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve brainfuck program runs over localhost HTTP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, help="Worker processes, one per core by default")
+    parser.add_argument("--engine", default=BYTECODE_ENGINE, choices=ENGINES)
+    parser.add_argument("--cell-bits", type=int, default=8, choices=(8, 16, 32))
+    parser.add_argument("--max-programs", type=int, default=128, help="Compiled programs kept by each worker")
+    parser.add_argument("--max-steps", type=int, help="Loop iterations allowed per job")
+    parser.add_argument("--timeout", type=float, help="Seconds allowed per job")
+    parser.add_argument("--max-output", type=int, help="Output bytes allowed per job")
+    args = parser.parse_args(argv)
+    server = BFServer(args.host, args.port, workers=args.workers, engine=args.engine, cell_bits=args.cell_bits,
+                      max_programs=args.max_programs, max_steps=args.max_steps, timeout=args.timeout,
+                      max_output=args.max_output)
+    print(f"Serving on http://{server.address[0]}:{server.address[1]}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+import io
+import sys
+
+EOF_ZERO = 0
+EOF_MINUS_ONE = -1
+EOF_UNCHANGED = None
+
+EOF_BEHAVIOURS = (EOF_ZERO, EOF_MINUS_ONE, EOF_UNCHANGED)
+
+FLUSH_FULL = "full"
+FLUSH_LINE = "line"
+
+FLUSH_POLICIES = (FLUSH_FULL, FLUSH_LINE)
+
+# Reasons a running program hands control back to whoever is driving it
+SUSPEND_OUTPUT = 0
+SUSPEND_INPUT = 1
+SUSPEND_PAUSE = 2
+
+
+def _is_text(stream):
+    return isinstance(stream, io.TextIOBase)
+
+
+class BFOutputBuffer:
+
+    def __init__(self, stream=None, buffer_size=8192, flush=FLUSH_FULL):
+        if flush not in FLUSH_POLICIES:
+            raise ValueError(f"Flush policy must be one of {FLUSH_POLICIES}, got {flush}")
+        self.stream = stream
+        self.buffer_size = buffer_size
+        self.buffer = bytearray()
+        self.written = 0
+        if flush == FLUSH_LINE:
+            self.write = self._write_line
+
+    def write(self, value):
+        # Only the lowest byte goes out, wider cells are truncated
+        self.buffer.append(value & 0xFF)
+        return len(self.buffer) >= self.buffer_size
+
+    def _write_line(self, value):
+        value &= 0xFF
+        self.buffer.append(value)
+        return value == 10 or len(self.buffer) >= self.buffer_size
+
+    def take(self):
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        self.written += len(data)
+        return data
+
+    def flush(self):
+        write_stream(self.stream, self.take())
+
+
+def write_stream(stream, data):
+    # sys.stdout is looked up on every write so redirections done after building the environment still apply
+    if stream is None:
+        stream = sys.stdout
+    if data:
+        stream.write(data.decode("latin-1") if _is_text(stream) else data)
+    flush = getattr(stream, "flush", None)
+    if flush is not None:
+        flush()
+
+
+class BFInputBuffer:
+
+    def __init__(self, stream=None, chunk_size=4096, eof=EOF_ZERO, before_read=None, fed=False):
+        if eof not in EOF_BEHAVIOURS:
+            raise ValueError(f"EOF behaviour must be one of {EOF_BEHAVIOURS}, got {eof}")
+        self.stream = stream
+        # A fed buffer never reads a stream, its data comes from feed() and it ends with close()
+        self.fed = fed
+        self.chunk_size = chunk_size
+        self.eof = eof
+        self.before_read = before_read
+        self.buffer = b""
+        self.position = 0
+        self.consumed = 0
+        self.exhausted = False
+
+    def feed(self, data):
+        self.buffer = self.buffer[self.position:] + bytes(data)
+        self.position = 0
+
+    def close(self):
+        self.exhausted = True
+
+    def ready(self):
+        return not self.fed or self.exhausted or self.position < len(self.buffer)
+
+    def read(self, current=0):
+        if self.position >= len(self.buffer) and not self._fill():
+            return current if self.eof is EOF_UNCHANGED else self.eof
+        value = self.buffer[self.position]
+        self.position += 1
+        self.consumed += 1
+        return value
+
+    def skip(self, count):
+        # Moves past input a previous run already consumed, when picking it up again from a snapshot
+        while count:
+            if self.position >= len(self.buffer) and not self._fill():
+                break
+            taken = min(count, len(self.buffer) - self.position)
+            self.position += taken
+            self.consumed += taken
+            count -= taken
+
+    def _fill(self):
+        if self.exhausted or self.fed:
+            return False
+        if self.before_read is not None:
+            # Whatever the program printed so far (a prompt, usually) has to be visible before blocking on input
+            self.before_read()
+        chunk = self._read_chunk(self.stream if self.stream is not None else sys.stdin)
+        if not chunk:
+            self.exhausted = True
+            return False
+        self.buffer = chunk
+        self.position = 0
+        return True
+
+    def _read_chunk(self, stream):
+        if _is_text(stream):
+            # readline instead of read, so interactive sessions get their line as soon as it's typed
+            return stream.readline(self.chunk_size).encode("latin-1", errors="replace")
+        read1 = getattr(stream, "read1", None)
+        if read1 is not None:
+            return read1(self.chunk_size)
+        return stream.read(self.chunk_size)
+
+
+def run_execution(execution, env):
+    # Drives a suspendable execution to the end, the way a plain execute() call behaves
+    for reason in execution:
+        if reason == SUSPEND_INPUT:
+            env.input_buffer.close()
+        elif reason == SUSPEND_OUTPUT:
+            env.output_buffer.flush()
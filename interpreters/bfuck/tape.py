@@ -0,0 +1,74 @@
+from array import array
+
+PAGE_BITS = 12
+PAGE_CELLS = 1 << PAGE_BITS
+PAGE_MASK = PAGE_CELLS - 1
+
+
+class BFTapeLimitExceeded(MemoryError):
+    pass
+
+
+class BFPagedTape:
+    # Stands in for the flat tape, indexed the same way by every engine. Cells live in fixed size pages that are only
+    # allocated the first time something non zero is written to them, so the tape costs nothing until used and grows
+    # both ways, negative indexes being just more cells to the left.
+
+    def __init__(self, typecode=None, max_pages=None):
+        self.typecode = typecode
+        self.itemsize = 1 if typecode is None else array(typecode).itemsize
+        self.max_pages = max_pages
+        self.pages = {}
+
+    def __getitem__(self, index):
+        page = self.pages.get(index >> PAGE_BITS)
+        return 0 if page is None else page[index & PAGE_MASK]
+
+    def __setitem__(self, index, value):
+        try:
+            self.pages[index >> PAGE_BITS][index & PAGE_MASK] = value
+        except KeyError:
+            # Writing a zero to a page that doesn't exist yet changes nothing
+            if value:
+                self._new_page(index >> PAGE_BITS)[index & PAGE_MASK] = value
+
+    def __len__(self):
+        return len(self.pages) * PAGE_CELLS
+
+    def __iter__(self):
+        # Only the allocated cells, everything else is zero anyway
+        for number in sorted(self.pages):
+            yield from self.pages[number]
+
+    @property
+    def nbytes(self):
+        return len(self.pages) * PAGE_CELLS * self.itemsize
+
+    def used(self):
+        # First cell and raw bytes of the allocated stretch of tape, unallocated pages in between come out as zeros
+        if not self.pages:
+            return 0, b""
+        first, last = min(self.pages), max(self.pages)
+        data = bytearray()
+        zeros = bytes(PAGE_CELLS * self.itemsize)
+        for number in range(first, last + 1):
+            page = self.pages.get(number)
+            data += zeros if page is None else memoryview(page).cast("B")
+        return first * PAGE_CELLS, bytes(data)
+
+    def load(self, start, data):
+        # Inverse of used(), zero cells don't allocate anything
+        for index, value in enumerate(memoryview(data).cast("B" if self.typecode is None else self.typecode)):
+            if value:
+                self[start + index] = value
+
+    def _new_page(self, number):
+        if self.max_pages is not None and len(self.pages) >= self.max_pages:
+            raise BFTapeLimitExceeded(f"Tape went over {self.max_pages} pages of {PAGE_CELLS} cells")
+        page = self.pages[number] = self._empty_page()
+        return page
+
+    def _empty_page(self):
+        if self.typecode is None:
+            return bytearray(PAGE_CELLS)
+        return array(self.typecode, bytes(PAGE_CELLS * self.itemsize))
@@ -0,0 +1,82 @@
+from interpreters.bfuck.ast_builder import walk_ast
+from interpreters.bfuck.codegen import BFPythonCompiler, BFPythonProgram
+from interpreters.bfuck.commands import BFBranchCommand, BFCommand, OpenBranchCommand, ClosingBranchCommand
+
+# Back-edges a loop takes before it's worth compiling
+HOT_LOOP = 128
+
+
+class BFCompiledLoopCommand(BFBranchCommand):
+    # Stands in for a whole loop once it's hot, running it as generated Python and carrying on after it. The original
+    # loop is its no_jump, so anything walking the graph in program order still finds the same commands.
+    __slots__ = ("program",)
+    _operator = ""
+
+    def __init__(self, opening, program):
+        super().__init__(companion=opening.companion, no_jump=opening)
+        self.program = program
+        self.position = opening.position
+
+    def execute(self, env):
+        self.program.run(env)
+        return self.companion.no_jump
+
+
+class BFTracer:
+    # Runs the command graph like the ast engine does, only counting the back-edges every loop takes. A loop going
+    # over hot_loop of them is compiled to Python there and then and patched into the graph, the iteration after that
+    # already runs compiled. Short programs never pay for compiling anything, long ones get compiled speed on the
+    # loops that matter. Nested loops get compiled on their own first and again as part of the loop around them once
+    # that one gets hot too.
+
+    def __init__(self, ast: BFCommand, hot_loop=HOT_LOOP):
+        self.ast = ast
+        self.root = ast
+        self.hot_loop = hot_loop
+        self.back_edges = {}
+        self.compiled = 0
+        # Command before every loop in program order, the one whose link gets patched
+        self._previous = None
+
+    def run(self, env):
+        back_edges = self.back_edges
+        hot_loop = self.hot_loop
+        command = self.root
+        while command is not None:
+            next_command = command.execute(env)
+            if command.__class__ is ClosingBranchCommand and next_command is not command.no_jump:
+                taken = back_edges[command] = back_edges.get(command, 0) + 1
+                if taken >= hot_loop:
+                    # The loop cell isn't zero, the compiled loop picks up right where this iteration ends
+                    next_command = self._compile_loop(command, env.cell_bits)
+            command = next_command
+
+    def _compile_loop(self, closing, cell_bits):
+        opening = closing.companion
+        commands = []
+        for command in walk_ast(opening):
+            commands.append(command)
+            if command is closing:
+                break
+        source = BFPythonCompiler(opening, cell_bits=cell_bits).generate(commands)
+        compiled = BFCompiledLoopCommand(opening, BFPythonProgram(source))
+        previous = self._previous_commands().get(opening)
+        if previous is None:
+            self.root = compiled
+        elif isinstance(previous, BFBranchCommand):
+            previous.no_jump = compiled
+        else:
+            previous.next = compiled
+        del self.back_edges[closing]
+        self.compiled += 1
+        return compiled
+
+    def _previous_commands(self):
+        if self._previous is None:
+            self._previous = {}
+            previous = None
+            for command in walk_ast(self.root):
+                if type(command) is OpenBranchCommand:
+                    self._previous[command] = previous
+                previous = command
+        return self._previous
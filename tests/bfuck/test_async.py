@@ -0,0 +1,75 @@
+import asyncio
+import unittest
+
+from interpreters import BrainFuckInterpreter
+
+
+class AsyncInput:
+
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+        self.reads = 0
+
+    async def read(self, size):
+        self.reads += 1
+        await asyncio.sleep(0)
+        return self.chunks.pop(0) if self.chunks else b""
+
+
+class AsyncOutput:
+
+    def __init__(self):
+        self.data = bytearray()
+        self.drains = 0
+
+    def write(self, data):
+        self.data += data
+
+    async def drain(self):
+        self.drains += 1
+
+
+class TestBFInterpreterAsync(unittest.TestCase):
+
+    def test_echo(self):
+        for engine in ("ast", "bytecode", "python"):
+            input_stream, output_stream = AsyncInput([b"ab", "c"]), AsyncOutput()
+            interpreter = BrainFuckInterpreter(",[+.,]", engine=engine)
+            asyncio.run(interpreter.execute_async(input_stream, output_stream))
+            self.assertEqual(output_stream.data, b"bcd")
+            self.assertEqual(input_stream.reads, 3)
+            self.assertGreater(output_stream.drains, 0)
+
+    def test_async_write(self):
+        written = []
+
+        class Sink:
+            async def write(self, data):
+                written.append(data)
+
+        asyncio.run(BrainFuckInterpreter("+++.").execute_async(output_stream=Sink()))
+        self.assertEqual(written, [b"\x03"])
+
+    def test_sessions_share_the_loop(self):
+        events = []
+
+        async def other_task():
+            for _ in range(3):
+                events.append("other")
+                await asyncio.sleep(0)
+
+        async def main():
+            interpreter = BrainFuckInterpreter("++++++++[>++++++++[>++++++++[-]<-]<-]", optimize=False)
+            task = asyncio.create_task(other_task())
+            await interpreter.execute_async(output_stream=AsyncOutput(), back_edges=100)
+            events.append("done")
+            await task
+
+        asyncio.run(main())
+        self.assertEqual(events, ["other"] * 3 + ["done"])
+
+    def test_restores_the_environment_buffers(self):
+        interpreter = BrainFuckInterpreter("+.")
+        buffers = interpreter.env.input_buffer, interpreter.env.output_buffer
+        asyncio.run(interpreter.execute_async(output_stream=AsyncOutput()))
+        self.assertEqual((interpreter.env.input_buffer, interpreter.env.output_buffer), buffers)
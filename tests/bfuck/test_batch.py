@@ -0,0 +1,104 @@
+import unittest
+
+from interpreters.bfuck import batch
+from interpreters.bfuck.ast_builder import BFSyntaxError
+from interpreters.bfuck.batch import BFBatchRunner, BFJobSettings, BFOutputLimitExceeded, BFTimeLimitExceeded, \
+    run_job
+from interpreters.bfuck.streams import EOF_ZERO
+
+ECHO = ",[.,]"
+
+
+class TestRunJob(unittest.TestCase):
+
+    def settings(self, **kwargs):
+        values = dict(engine="bytecode", optimize=True, cell_bits=8, eof=EOF_ZERO, max_output=None, timeout=None,
+                      cache=None, max_programs=2)
+        values.update(kwargs)
+        return BFJobSettings(**values)
+
+    def setUp(self):
+        batch._programs.clear()
+
+    def test_captures_output(self):
+        result = run_job(3, ECHO, b"hi", self.settings())
+        self.assertEqual(result, (3, b"hi", None))
+
+    def test_programs_are_compiled_once(self):
+        settings = self.settings()
+        run_job(0, ECHO, b"a", settings)
+        program = batch._programs[next(iter(batch._programs))]
+        run_job(1, ECHO + " same program", b"b", settings)
+        self.assertEqual(len(batch._programs), 1)
+        self.assertIs(batch._programs[next(iter(batch._programs))], program)
+
+    def test_program_cache_is_bounded(self):
+        settings = self.settings()
+        for code in ("+", "-", ">", "<"):
+            run_job(0, code, b"", settings)
+        self.assertEqual(len(batch._programs), 2)
+
+    def test_output_limit(self):
+        result = run_job(0, ECHO, b"abcdef", self.settings(max_output=4))
+        self.assertEqual(result.output, b"abcd")
+        self.assertIsInstance(result.error, BFOutputLimitExceeded)
+
+    def test_time_limit(self):
+        for engine in ("ast", "bytecode", "python", "tracing"):
+            result = run_job(0, "+[]", b"", self.settings(engine=engine, timeout=0.05))
+            self.assertIsInstance(result.error, BFTimeLimitExceeded, engine)
+
+    def test_errors_are_reported(self):
+        result = run_job(0, "+[<+]", b"", self.settings())
+        self.assertIsInstance(result.error, IndexError)
+
+    def test_broken_program_only_fails_its_job(self):
+        chunk = [(0, "+++.", b""), (1, "]", b""), (2, "++.", b"")]
+        first, broken, last = batch._run_chunk(chunk, self.settings())
+        self.assertEqual(first, (0, b"\x03", None))
+        self.assertEqual(broken.output, b"")
+        self.assertIsInstance(broken.error, BFSyntaxError)
+        self.assertEqual(last, (2, b"\x02", None))
+
+
+class TestBFBatchRunner(unittest.TestCase):
+
+    def test_ordered_results(self):
+        jobs = [(ECHO, bytes([65 + i])) for i in range(20)] + ["+" * 48 + "."]
+        with BFBatchRunner(workers=2, chunk_size=3) as runner:
+            results = runner.run(jobs)
+        self.assertEqual([result.index for result in results], list(range(21)))
+        self.assertEqual([result.output for result in results], [bytes([65 + i]) for i in range(20)] + [b"0"])
+
+    def test_unordered_results(self):
+        jobs = [(ECHO, str(i)) for i in range(10)]
+        with BFBatchRunner(engine="python", workers=2, chunk_size=2) as runner:
+            results = runner.run(jobs, ordered=False)
+        self.assertEqual(sorted((result.index, result.output) for result in results),
+                         [(i, str(i).encode()) for i in range(10)])
+
+    def test_limits_apply_per_job(self):
+        with BFBatchRunner(workers=2, timeout=0.1, max_output=2) as runner:
+            stuck, chatty, fine = runner.run(["+[]", (ECHO, "abc"), (ECHO, "ok")])
+        self.assertIsInstance(stuck.error, BFTimeLimitExceeded)
+        self.assertIsInstance(chatty.error, BFOutputLimitExceeded)
+        self.assertEqual(fine, (2, b"ok", None))
+
+    def test_broken_program_comes_back_from_the_workers(self):
+        with BFBatchRunner(workers=1, chunk_size=3) as runner:
+            first, broken, last = runner.run([("+++.", b""), ("]", b""), ("++.", b"")])
+            self.assertIsInstance(broken.error, BFSyntaxError)
+            self.assertEqual(broken.error.positions, [0])
+            self.assertEqual((first.output, last.output), (b"\x03", b"\x02"))
+            # The pool is still there for the next batch
+            self.assertEqual(runner.run(["+."])[0].output, b"\x01")
+
+    def test_every_engine(self):
+        for engine in ("ast", "bytecode", "python", "tracing"):
+            with BFBatchRunner(engine=engine, workers=1, chunk_size=2) as runner:
+                results = runner.run([(ECHO, "abc"), ("+" * 48 + ".", b""), (ECHO, "")])
+            self.assertEqual([result.output for result in results], [b"abc", b"0", b""], engine)
+
+    def test_unknown_engine_is_rejected(self):
+        with self.assertRaises(ValueError):
+            BFBatchRunner(engine="jit")
@@ -0,0 +1,175 @@
+import unittest
+from io import BytesIO, StringIO
+from unittest.mock import patch
+
+from interpreters.bfuck.ast_builder import BEASTBuilder
+from interpreters.bfuck.bytecode import BFBytecodeCompiler, OP_ADD, OP_MOVE, OP_JUMP_IF_ZERO, OP_JUMP_IF_NOT_ZERO, \
+    OP_OUTPUT, OP_INPUT, OP_CLEAR, OP_MULTIPLY, OP_ASSIGN, OP_ADD_JUMP_IF_NOT_ZERO, OP_MOVE_JUMP_IF_NOT_ZERO, \
+    OP_MULTIPLY_MOVE, OP_OUTPUT_MOVE, SUPERINSTRUCTIONS, tune_superinstructions
+from interpreters.bfuck.environment import BFEnvironment
+from interpreters.bfuck.optimizer import BFOptimizer
+from interpreters.bfuck.profiler import BFProfiler
+from interpreters.bfuck.streams import BFInputBuffer, BFOutputBuffer, SUSPEND_OUTPUT, SUSPEND_INPUT
+
+
+class TestBFBytecodeCompiler(unittest.TestCase):
+
+    def compile(self, code, superinstructions=()):
+        ast = BEASTBuilder(code).build_ast()
+        return BFBytecodeCompiler(ast, superinstructions=superinstructions).compile()
+
+    def test_compile_empty(self):
+        program = self.compile("")
+        self.assertEqual(len(program), 0)
+
+    def test_compile_merged_runs(self):
+        program = self.compile("+++>><-")
+        self.assertEqual(program.ops, [OP_ADD, OP_MOVE, OP_ADD])
+        self.assertEqual(program.args, [3, 1, -1])
+
+    def test_compile_skips_noop_runs(self):
+        program = self.compile("+-.<>,")
+        self.assertEqual(program.ops, [OP_OUTPUT, OP_INPUT])
+
+    def test_compile_jump_targets(self):
+        program = self.compile("+[->[-]<]")
+        self.assertEqual(program.ops, [OP_ADD, OP_JUMP_IF_ZERO, OP_ADD, OP_MOVE, OP_JUMP_IF_ZERO, OP_ADD,
+                                       OP_JUMP_IF_NOT_ZERO, OP_MOVE, OP_JUMP_IF_NOT_ZERO])
+        self.assertEqual(program.jumps[1], 9)
+        self.assertEqual(program.jumps[8], 2)
+        self.assertEqual(program.jumps[4], 7)
+        self.assertEqual(program.jumps[6], 5)
+
+    def test_compile_unmatched_open_jumps_to_end(self):
+        program = self.compile("[+")
+        self.assertEqual(program.jumps[0], len(program))
+
+    def test_compile_idioms(self):
+        ast = BFOptimizer().optimize(BEASTBuilder("[-]>+<,[->++<]").build_ast())
+        program = BFBytecodeCompiler(ast).compile()
+        self.assertEqual(program.ops, [OP_CLEAR, OP_ADD, OP_INPUT, OP_MULTIPLY])
+        self.assertEqual(program.consts[program.args[3]], ((1, 2),))
+
+    def test_compile_assign(self):
+        ast = BFOptimizer().optimize(BEASTBuilder("[-]---").build_ast())
+        program = BFBytecodeCompiler(ast).compile()
+        self.assertEqual(program.ops, [OP_ASSIGN])
+        self.assertEqual(program.args, [253])
+
+    def test_compile_offsets(self):
+        ast = BFOptimizer().optimize(BEASTBuilder(">+>++<<<.[").build_ast())
+        program = BFBytecodeCompiler(ast, superinstructions=()).compile()
+        self.assertEqual(program.ops, [OP_ADD, OP_ADD, OP_OUTPUT, OP_MOVE, OP_JUMP_IF_ZERO])
+        self.assertEqual(program.offsets, [1, 2, -1, 0, 0])
+        self.assertEqual(program.args[3], -1)
+
+    def test_superinstructions(self):
+        program = self.compile("+[->[-]<]", superinstructions=tuple(SUPERINSTRUCTIONS))
+        self.assertEqual(program.ops, [OP_ADD, OP_JUMP_IF_ZERO, OP_ADD, OP_MOVE, OP_JUMP_IF_ZERO,
+                                       OP_ADD_JUMP_IF_NOT_ZERO, OP_MOVE_JUMP_IF_NOT_ZERO])
+        self.assertEqual(program.jumps[1], 7)
+        self.assertEqual(program.jumps[4], 6)
+        self.assertEqual(program.jumps[5], 5)
+        self.assertEqual(program.jumps[6], 2)
+        self.assertEqual(program.args[5:], [-1, -1])
+
+    def test_superinstructions_subset(self):
+        program = self.compile("[.>]", superinstructions=((OP_OUTPUT, OP_MOVE),))
+        self.assertEqual(program.ops, [OP_JUMP_IF_ZERO, OP_OUTPUT_MOVE, OP_JUMP_IF_NOT_ZERO])
+        self.assertEqual(program.jumps[0], 3)
+        self.assertEqual(program.jumps[2], 1)
+        self.assertEqual(program.jumps[1], 1)
+
+    def test_superinstruction_priority(self):
+        # ADD MOVE JNZ: whichever pair comes first in the table gets the MOVE
+        moves_first = ((OP_MOVE, OP_JUMP_IF_NOT_ZERO), (OP_MULTIPLY, OP_MOVE))
+        ast = BFOptimizer().optimize(BEASTBuilder(",[[->+<]>]").build_ast())
+        program = BFBytecodeCompiler(ast, superinstructions=moves_first).compile()
+        self.assertEqual(program.ops[-2:], [OP_MULTIPLY, OP_MOVE_JUMP_IF_NOT_ZERO])
+        program = BFBytecodeCompiler(ast, superinstructions=moves_first[::-1]).compile()
+        self.assertEqual(program.ops[-2:], [OP_MULTIPLY_MOVE, OP_JUMP_IF_NOT_ZERO])
+
+    def test_tune_superinstructions(self):
+        env = BFEnvironment()
+        profiler = BFProfiler(BFOptimizer().optimize(BEASTBuilder("++++[>+++[.-]<-]").build_ast()))
+        profiler.run(env)
+        self.assertEqual(tune_superinstructions([profiler]),
+                         ((OP_ADD, OP_JUMP_IF_NOT_ZERO), (OP_MOVE, OP_JUMP_IF_NOT_ZERO)))
+
+
+class TestBFBytecodeProgram(unittest.TestCase):
+
+    def run_code(self, code, optimize=False):
+        env = BFEnvironment()
+        ast = BEASTBuilder(code).build_ast()
+        if optimize:
+            ast = BFOptimizer().optimize(ast)
+        BFBytecodeCompiler(ast).compile().run(env)
+        env.output_buffer.flush()
+        return env
+
+    def test_add_two_cells(self):
+        env = self.run_code("++++>+++++<[>+<-]")
+        self.assertEqual(env.current_cell, 0)
+        env.cell_pointer += 1
+        self.assertEqual(env.current_cell, 9)
+
+    def test_nested_loops(self):
+        env = self.run_code("+++[>+++[>++<-]<-]>>")
+        self.assertEqual(env.current_cell, 18)
+
+    def test_skipped_loop(self):
+        env = self.run_code("[>+++<]>")
+        self.assertEqual(env.current_cell, 0)
+
+    def test_superinstructions_run_like_their_parts(self):
+        codes = ("+++[>+++[>++<-]<-]>>.", "+[->+<]>>+++[<]", "++++[-.>]", ",[[->+<]>-]")
+        for code in codes:
+            outputs = []
+            for superinstructions in ((), tuple(SUPERINSTRUCTIONS)):
+                env = BFEnvironment(output_stream=BytesIO(), input_stream=BytesIO(b"\x03"))
+                ast = BFOptimizer().optimize(BEASTBuilder(code).build_ast())
+                BFBytecodeCompiler(ast, superinstructions=superinstructions).compile().run(env)
+                env.output_buffer.flush()
+                outputs.append((env.output_buffer.stream.getvalue(), env.cell_pointer, bytes(env.cells)))
+            self.assertEqual(outputs[0], outputs[1], code)
+
+    def test_optimized_idioms(self):
+        env = self.run_code("+++[>+++[>++<-]<-]>>>+++++[-]", optimize=True)
+        self.assertEqual(env.current_cell, 0)
+        env.cell_pointer -= 1
+        self.assertEqual(env.current_cell, 18)
+
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_output(self, mock_stdout):
+        self.run_code("+" * ord("a") + ".+.")
+        self.assertEqual(mock_stdout.getvalue(), "ab")
+
+    @patch('sys.stdin', new_callable=lambda: StringIO('a'))
+    def test_input(self, mock_stdin):
+        env = self.run_code(",")
+        self.assertEqual(env.current_cell, ord("a"))
+
+    def test_execute_suspends_on_full_output(self):
+        env = BFEnvironment()
+        env.output_buffer = BFOutputBuffer(buffer_size=1)
+        program = BFBytecodeCompiler(BEASTBuilder("+.+.").build_ast()).compile()
+        execution = program.execute(env)
+        self.assertEqual(next(execution), SUSPEND_OUTPUT)
+        self.assertEqual(env.code_pointer, 2)
+        self.assertEqual(env.output_buffer.take(), b"\x01")
+        self.assertEqual(next(execution), SUSPEND_OUTPUT)
+        self.assertEqual(env.output_buffer.take(), b"\x02")
+        self.assertEqual(list(execution), [])
+        self.assertEqual(env.code_pointer, len(program))
+
+    def test_execute_suspends_for_fed_input(self):
+        env = BFEnvironment()
+        env.input_buffer = BFInputBuffer(fed=True)
+        program = BFBytecodeCompiler(BEASTBuilder("+,").build_ast()).compile()
+        execution = program.execute(env)
+        self.assertEqual(next(execution), SUSPEND_INPUT)
+        self.assertEqual(env.code_pointer, 1)
+        env.input_buffer.feed(b"x")
+        self.assertEqual(list(execution), [])
+        self.assertEqual(env.current_cell, ord("x"))
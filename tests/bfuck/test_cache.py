@@ -0,0 +1,95 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from interpreters import BrainFuckInterpreter
+from interpreters.bfuck.cache import BFProgramCache
+
+
+class TestBFProgramCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = BFProgramCache(self.directory.name, max_size=100)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_key_ignores_comments(self):
+        self.assertEqual(BFProgramCache.key("+ add one\n."), BFProgramCache.key("+."))
+
+    def test_key_depends_on_parts(self):
+        self.assertNotEqual(BFProgramCache.key("+", "bytecode"), BFProgramCache.key("+", "python"))
+        self.assertNotEqual(BFProgramCache.key("+"), BFProgramCache.key("-"))
+
+    def test_get_missing(self):
+        self.assertIsNone(self.cache.get("missing"))
+
+    def test_put_get(self):
+        self.cache.put("key", b"data")
+        self.assertEqual(self.cache.get("key"), b"data")
+
+    def test_put_leaves_no_temporary_files(self):
+        self.cache.put("key", b"data")
+        self.assertEqual(os.listdir(self.directory.name), ["key.bfc"])
+
+    def test_discard(self):
+        self.cache.put("key", b"data")
+        self.cache.discard("key")
+        self.assertIsNone(self.cache.get("key"))
+
+    def test_evicts_least_recently_used(self):
+        self.cache.put("first", b"x" * 40)
+        self.cache.put("second", b"x" * 40)
+        os.utime(self.cache._path("first"), ns=(1, 1))
+        os.utime(self.cache._path("second"), ns=(2, 2))
+        self.cache.get("first")
+        self.cache.put("third", b"x" * 40)
+        self.assertIsNone(self.cache.get("second"))
+        self.assertIsNotNone(self.cache.get("first"))
+        self.assertIsNotNone(self.cache.get("third"))
+        self.assertLessEqual(self.cache.size(), 100)
+
+
+class TestBFInterpreterProgramCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = BFProgramCache(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_program_is_shared_between_interpreters(self):
+        for engine in ("bytecode", "python"):
+            first = BrainFuckInterpreter("++[>+++<-]>", engine=engine, cache=self.cache)
+            first.execute()
+            second = BrainFuckInterpreter("++[>+++<-]>", engine=engine, cache=self.cache)
+            with patch.object(second, "_compile") as compile_mock:
+                second.execute()
+                compile_mock.assert_not_called()
+            self.assertIsNone(second._cached_ast)
+            self.assertEqual(second.env.current_cell, 6)
+
+    def test_engines_do_not_share_entries(self):
+        BrainFuckInterpreter("+", engine="bytecode", cache=self.cache).execute()
+        BrainFuckInterpreter("+", engine="python", cache=self.cache).execute()
+        self.assertEqual(len(os.listdir(self.directory.name)), 2)
+
+    def test_corrupted_entry_is_recompiled(self):
+        interpreter = BrainFuckInterpreter("+", engine="bytecode", cache=self.cache)
+        interpreter.execute()
+        entry, = os.listdir(self.directory.name)
+        with open(os.path.join(self.directory.name, entry), "wb") as f:
+            f.write(b"garbage")
+        interpreter = BrainFuckInterpreter("+", engine="bytecode", cache=self.cache)
+        interpreter.execute()
+        self.assertEqual(interpreter.env.current_cell, 1)
+
+    def test_code_change_reloads_program(self):
+        interpreter = BrainFuckInterpreter("+", engine="bytecode", cache=self.cache)
+        interpreter.execute()
+        interpreter.code = "-"
+        interpreter.execute()
+        self.assertEqual(interpreter.env.current_cell, 0)
@@ -0,0 +1,112 @@
+import unittest
+from io import BytesIO
+from unittest.mock import patch
+
+from interpreters import BrainFuckInterpreter
+from interpreters.bfuck import checkpoint, interpreter as interpreter_module
+from interpreters.bfuck.ast_builder import BEASTBuilder
+from interpreters.bfuck.bytecode import BFBytecodeCompiler
+from interpreters.bfuck.checkpoint import BFSnapshot
+from interpreters.bfuck.environment import BFEnvironment
+from interpreters.bfuck.streams import SUSPEND_PAUSE, run_execution
+
+# Echoes its input shifted by one, then counts down from 200 printing every step
+CODE = ",[+.,]" + "+" * 200 + "[.-]"
+INPUT = b"abcdef"
+
+
+class TestBFBytecodePause(unittest.TestCase):
+
+    def test_pauses_every_n_back_edges(self):
+        env = BFEnvironment()
+        program = BFBytecodeCompiler(BEASTBuilder("++++++++++[-]").build_ast()).compile()
+        reasons = list(program.execute(env, back_edges=3))
+        self.assertEqual(reasons, [SUSPEND_PAUSE] * 3)
+        self.assertEqual(env.current_cell, 0)
+
+    def test_run_execution_ignores_pauses(self):
+        env = BFEnvironment()
+        program = BFBytecodeCompiler(BEASTBuilder("+++[>+<-]>").build_ast()).compile()
+        run_execution(program.execute(env, back_edges=1), env)
+        self.assertEqual(env.current_cell, 3)
+
+
+class TestBFSnapshot(unittest.TestCase):
+
+    def run_until_snapshot(self, engine, index, cell_bits=8):
+        output_stream = BytesIO()
+        interpreter = BrainFuckInterpreter(CODE, engine=engine, cell_bits=cell_bits, input_stream=BytesIO(INPUT),
+                                           output_stream=output_stream)
+        for n, snapshot in enumerate(interpreter.checkpoints(back_edges=7)):
+            if n == index:
+                return snapshot, output_stream.getvalue()
+
+    def expected_output(self):
+        output_stream = BytesIO()
+        BrainFuckInterpreter(CODE, input_stream=BytesIO(INPUT), output_stream=output_stream).execute()
+        return output_stream.getvalue()
+
+    def test_resume_from_serialized_snapshot(self):
+        for engine in ("ast", "bytecode", "python"):
+            for index in (0, 5, 20):
+                snapshot, output = self.run_until_snapshot(engine, index)
+                self.assertEqual(len(output), snapshot.written)
+                output_stream = BytesIO()
+                interpreter = BrainFuckInterpreter(CODE, engine=engine, input_stream=BytesIO(INPUT),
+                                                   output_stream=output_stream)
+                interpreter.resume(BFSnapshot.loads(snapshot.dumps()))
+                self.assertEqual(output + output_stream.getvalue(), self.expected_output(), (engine, index))
+
+    def test_only_used_tape_is_kept(self):
+        snapshot, _ = self.run_until_snapshot("bytecode", 20)
+        self.assertLessEqual(len(snapshot.tape), 1)
+        self.assertLess(len(snapshot.dumps()), 200)
+
+    def test_wide_cells(self):
+        snapshot, output = self.run_until_snapshot("bytecode", 20, cell_bits=16)
+        self.assertEqual(len(snapshot.tape), 2)
+        output_stream = BytesIO()
+        interpreter = BrainFuckInterpreter(CODE, engine="bytecode", cell_bits=16, input_stream=BytesIO(INPUT),
+                                           output_stream=output_stream)
+        interpreter.resume(snapshot)
+        self.assertEqual(output + output_stream.getvalue(), self.expected_output())
+
+    def test_program_is_hashed_once(self):
+        interpreter = BrainFuckInterpreter(CODE, engine="bytecode", input_stream=BytesIO(INPUT),
+                                           output_stream=BytesIO())
+        # Snapshots would hash it again in the checkpoint module, checkpoints() does it in the interpreter's
+        program_hash = checkpoint.program_hash
+        with patch.object(checkpoint, "program_hash", wraps=program_hash) as per_snapshot, \
+                patch.object(interpreter_module, "program_hash", wraps=program_hash) as per_run:
+            snapshots = list(interpreter.checkpoints(back_edges=7))
+        self.assertGreater(len(snapshots), 20)
+        self.assertEqual((per_run.call_count, per_snapshot.call_count), (1, 0))
+        self.assertEqual(len({snapshot.program_hash for snapshot in snapshots}), 1)
+
+    def test_resume_on_a_used_interpreter(self):
+        # Compiled for a fresh tape the multiplication folds into a constant, not so on the tape of an earlier run
+        code = "++++++++[>++++++++<-]>[.-]"
+        snapshot = list(BrainFuckInterpreter(code, output_stream=BytesIO()).checkpoints(back_edges=7))[3]
+        for engine in ("ast", "bytecode", "python", "tracing"):
+            for runs in (1, 2):
+                interpreter = BrainFuckInterpreter(code, engine=engine, output_stream=BytesIO())
+                for _ in range(runs):
+                    interpreter.execute()
+                output_stream = BytesIO()
+                interpreter.env.set_streams(output_stream=output_stream)
+                interpreter.resume(snapshot)
+                self.assertEqual(output_stream.getvalue(), bytes(range(36, 0, -1)), (engine, runs))
+
+    def test_different_program_is_rejected(self):
+        snapshot, _ = self.run_until_snapshot("bytecode", 0)
+        with self.assertRaises(ValueError):
+            BrainFuckInterpreter(CODE + "+", engine="bytecode").resume(snapshot)
+
+    def test_different_cell_width_is_rejected(self):
+        snapshot, _ = self.run_until_snapshot("bytecode", 0)
+        with self.assertRaises(ValueError):
+            BrainFuckInterpreter(CODE, engine="bytecode", cell_bits=16).resume(snapshot)
+
+    def test_unknown_version(self):
+        with self.assertRaises(ValueError):
+            BFSnapshot.loads(b"\xe9\x00\x00\x00\x00")
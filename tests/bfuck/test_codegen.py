@@ -0,0 +1,102 @@
+import unittest
+from io import StringIO
+from unittest.mock import patch
+
+from interpreters.bfuck.ast_builder import BEASTBuilder
+from interpreters.bfuck.codegen import BFPythonCompiler
+from interpreters.bfuck.environment import BFEnvironment
+from interpreters.bfuck.optimizer import BFOptimizer
+
+
+class TestBFPythonCompiler(unittest.TestCase):
+
+    def generate(self, code, cell_bits=8, optimize=False):
+        ast = BEASTBuilder(code).build_ast()
+        if optimize:
+            ast = BFOptimizer(cell_bits).optimize(ast)
+        return BFPythonCompiler(ast, cell_bits=cell_bits).generate()
+
+    def test_merged_runs(self):
+        source = self.generate("+++>>--")
+        self.assertIn("t[p] = (t[p] + 3) & 0xff", source)
+        self.assertIn("p += 2", source)
+        self.assertIn("t[p] = (t[p] + -2) & 0xff", source)
+
+    def test_cell_width_mask(self):
+        source = self.generate("+", cell_bits=16)
+        self.assertIn("& 0xffff", source)
+
+    def test_nested_while_loops(self):
+        source = self.generate("[[-]]")
+        self.assertEqual(source.count("while t[p]:"), 2)
+
+    def test_empty_loop(self):
+        source = self.generate("[]")
+        compile(source, "<test>", "exec")
+        self.assertIn("pass", source)
+
+    def test_deep_nesting_is_split_into_functions(self):
+        depth = 3 * BFPythonCompiler.MAX_NESTING
+        source = self.generate("[" * depth + "-" + "]" * depth)
+        compile(source, "<test>", "exec")
+        self.assertIn("def _loop_1(", source)
+        self.assertIn("def _loop_2(", source)
+
+    def test_unmatched_open_branch_runs_once(self):
+        source = self.generate("[+")
+        self.assertIn("if t[p]:", source)
+        self.assertNotIn("while", source)
+
+    def test_idioms(self):
+        source = self.generate("[-]>[->++<]", optimize=True)
+        self.assertIn("t[p] = 0", source)
+        self.assertIn("v = t[p + 1]", source)
+        self.assertIn("t[p + 2] = (t[p + 2] + v * 2) & 0xff", source)
+
+    def test_assign(self):
+        source = self.generate(">[-]++", optimize=True)
+        self.assertIn("t[p + 1] = 2", source)
+
+    def test_offsets(self):
+        source = self.generate(">+>++<<<-.>[", optimize=True)
+        self.assertIn("t[p + 1] = (t[p + 1] + 1) & 0xff", source)
+        self.assertIn("t[p - 1] = (t[p - 1] + -1) & 0xff", source)
+        self.assertIn("if write(t[p - 1]):", source)
+        self.assertEqual(source.count("p += "), 0)
+
+
+class TestBFPythonProgram(unittest.TestCase):
+
+    def run_code(self, code, cell_bits=8):
+        env = BFEnvironment(cell_bits=cell_bits)
+        ast = BFOptimizer(cell_bits).optimize(BEASTBuilder(code).build_ast())
+        BFPythonCompiler(ast, cell_bits=cell_bits).compile().run(env)
+        env.output_buffer.flush()
+        return env
+
+    def test_add_two_cells(self):
+        env = self.run_code("++++>+++++<[>+<-]")
+        self.assertEqual(env.current_cell, 0)
+        env.cell_pointer += 1
+        self.assertEqual(env.current_cell, 9)
+
+    def test_wraparound(self):
+        env = self.run_code("-")
+        self.assertEqual(env.current_cell, 255)
+
+    def test_deep_nesting(self):
+        depth = 2 * BFPythonCompiler.MAX_NESTING
+        env = self.run_code("+" + "[>+" * depth + "<-]" * depth)
+        self.assertEqual(env.current_cell, 0)
+        env.cell_pointer += depth
+        self.assertEqual(env.current_cell, 1)
+
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_output(self, mock_stdout):
+        self.run_code("+" * ord("a") + ".+.")
+        self.assertEqual(mock_stdout.getvalue(), "ab")
+
+    @patch('sys.stdin', new_callable=lambda: StringIO('a'))
+    def test_input(self, mock_stdin):
+        env = self.run_code(",")
+        self.assertEqual(env.current_cell, ord("a"))
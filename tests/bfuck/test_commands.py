@@ -4,29 +4,45 @@ from unittest.mock import patch
 
 from interpreters.bfuck.commands import BFRepetibleCommand, BFBranchCommand, CellPointerIncrementCommand, \
     CellValueIncrementCommand, OpenBranchCommand, ClosingBranchCommand, GetCellValueCommand, SetCellValueCommand, \
-    BFCommand
+    BFCommand, ClearCellCommand, MultiplyLoopCommand, AssignCellCommand
 from interpreters.bfuck.environment import BFEnvironment
 
 
 class TestBFCommand(unittest.TestCase):
 
     def test_next(self):
-        command_1 = BFCommand(None, next=None)
-        command_2 = BFCommand(None, next=None)
+        command_1 = BFCommand(next=None)
+        command_2 = BFCommand(next=None)
         command_1.next = command_2
         self.assertEqual(command_1.next, command_2)
 
     def test_operator_str(self):
-        command_1 = BFCommand(None, operator='test')
-        self.assertEqual(str(command_1), 'test')
+        command_1 = GetCellValueCommand()
+        self.assertEqual(str(command_1), '.')
 
     def test_operator_repr(self):
-        command_1 = BFCommand(None, operator='test')
-        self.assertEqual(repr(command_1), 'test')
+        command_1 = GetCellValueCommand()
+        self.assertEqual(repr(command_1), '.')
 
     def test_operator_execute_does_nothing(self):
-        command = BFCommand(None)
-        command.execute()
+        command = BFCommand(next=2)
+        self.assertEqual(command.execute(None), 2)
+
+    def test_execute_returns_next(self):
+        env = BFEnvironment()
+        command = CellValueIncrementCommand(next=2)
+        self.assertEqual(command.execute(env), 2)
+        self.assertEqual(env.current_cell, 1)
+
+    def test_commands_have_no_dict(self):
+        # Slotted all the way down, a command is its links and nothing else
+        commands = (BFCommand(), CellValueIncrementCommand(), CellPointerIncrementCommand(), GetCellValueCommand(),
+                    SetCellValueCommand(), OpenBranchCommand(), ClosingBranchCommand(), ClearCellCommand(),
+                    AssignCellCommand(value=3), MultiplyLoopCommand(factors=[(1, 1)]))
+        for command in commands:
+            self.assertFalse(hasattr(command, "__dict__"), type(command).__name__)
+            with self.assertRaises(AttributeError):
+                command.env = None
 
 
 class TestBFBranchCommand(unittest.TestCase):
@@ -34,49 +50,49 @@ class TestBFBranchCommand(unittest.TestCase):
     def test_branch_condition_false(self):
         env = BFEnvironment()
         env.current_cell = 0
-        b_command = BFBranchCommand(env)
-        self.assertFalse(b_command.branch_condition())
+        b_command = BFBranchCommand()
+        self.assertFalse(b_command.branch_condition(env))
 
     def test_branch_condition_true(self):
         env = BFEnvironment()
         env.current_cell = 1
-        b_command = BFBranchCommand(env)
-        self.assertTrue(b_command.branch_condition())
+        b_command = BFBranchCommand()
+        self.assertTrue(b_command.branch_condition(env))
 
     def test_jump_condition_true(self):
         env = BFEnvironment()
-        bf_command_companion, bf_command_no_jump = BFBranchCommand(env, no_jump=1), BFCommand(env, next=2)
+        bf_command_companion, bf_command_no_jump = BFBranchCommand(no_jump=1), BFCommand(next=2)
         env.current_cell = 1
-        b_command = BFBranchCommand(env, companion=bf_command_companion, no_jump=bf_command_no_jump)
-        self.assertEqual(b_command.next, 1)
+        b_command = BFBranchCommand(companion=bf_command_companion, no_jump=bf_command_no_jump)
+        self.assertEqual(b_command.execute(env), 1)
 
     def test_jump_condition_false(self):
         env = BFEnvironment()
-        bf_command_companion, bf_command_no_jump = BFBranchCommand(env, no_jump=1), 2
+        bf_command_companion, bf_command_no_jump = BFBranchCommand(no_jump=1), 2
         env.current_cell = 0
-        b_command = BFBranchCommand(env, companion=bf_command_companion, no_jump=bf_command_no_jump)
-        self.assertEqual(b_command.next, 2)
+        b_command = BFBranchCommand(companion=bf_command_companion, no_jump=bf_command_no_jump)
+        self.assertEqual(b_command.execute(env), 2)
 
 
 class TestBFRepetibleCommand(unittest.TestCase):
 
     def test_add_bfrepetible_commands_positives(self):
-        command_1, command_2 = BFRepetibleCommand(None, times=1), BFRepetibleCommand(None, times=1)
+        command_1, command_2 = BFRepetibleCommand(times=1), BFRepetibleCommand(times=1)
         command_3 = command_1 + command_2
         self.assertEqual(command_3.times, 2)
 
     def test_add_bfrepetible_commands_positive_negative(self):
-        command_1, command_2 = BFRepetibleCommand(None, times=1), BFRepetibleCommand(None, times=-1)
+        command_1, command_2 = BFRepetibleCommand(times=1), BFRepetibleCommand(times=-1)
         command_3 = command_1 + command_2
         self.assertEqual(command_3.times, 0)
 
     def test_add_bfrepetible_commands_positive_zero(self):
-        command_1, command_2 = BFRepetibleCommand(None, times=1), BFRepetibleCommand(None, times=0)
+        command_1, command_2 = BFRepetibleCommand(times=1), BFRepetibleCommand(times=0)
         command_3 = command_1 + command_2
         self.assertEqual(command_3.times, 1)
 
     def test_add_bfrepetible_commands_negatives(self):
-        command_1, command_2 = BFRepetibleCommand(None, times=-1), BFRepetibleCommand(None, times=-1)
+        command_1, command_2 = BFRepetibleCommand(times=-1), BFRepetibleCommand(times=-1)
         command_3 = command_1 + command_2
         self.assertEqual(command_3.times, -2)
 
@@ -86,82 +102,82 @@ class TestCellPointerIncrementCommand(unittest.TestCase):
     def test_simple_positive_increment(self):
         env = BFEnvironment()
         current_cell_pointer = env.cell_pointer
-        cpi_command = CellPointerIncrementCommand(env)
-        cpi_command.execute()
+        cpi_command = CellPointerIncrementCommand()
+        cpi_command.execute(env)
         self.assertEqual(env.cell_pointer, current_cell_pointer + 1)
 
     def test_simple_negative_increment(self):
         env = BFEnvironment()
         current_cell_pointer = env.cell_pointer
-        cpi_command = CellPointerIncrementCommand(env, times=-1)
-        cpi_command.execute()
+        cpi_command = CellPointerIncrementCommand(times=-1)
+        cpi_command.execute(env)
         self.assertEqual(env.cell_pointer, current_cell_pointer - 1)
 
     def test_no_increment(self):
         env = BFEnvironment()
         current_cell_pointer = env.cell_pointer
-        cpi_command = CellPointerIncrementCommand(env, times=0)
-        cpi_command.execute()
+        cpi_command = CellPointerIncrementCommand(times=0)
+        cpi_command.execute(env)
         self.assertEqual(env.cell_pointer, current_cell_pointer)
 
     def test_stacked_positive_increment(self):
         env = BFEnvironment()
         current_cell_pointer = env.cell_pointer
         times_increment = 3
-        cpi_command = CellPointerIncrementCommand(env, times=times_increment)
-        cpi_command.execute()
+        cpi_command = CellPointerIncrementCommand(times=times_increment)
+        cpi_command.execute(env)
         self.assertEqual(env.cell_pointer, current_cell_pointer + times_increment)
 
     def test_stacked_negative_increment(self):
         env = BFEnvironment()
         current_cell_pointer = env.cell_pointer
         times_increment = -3
-        cpi_command = CellPointerIncrementCommand(env, times=times_increment)
-        cpi_command.execute()
+        cpi_command = CellPointerIncrementCommand(times=times_increment)
+        cpi_command.execute(env)
         self.assertEqual(env.cell_pointer, current_cell_pointer + times_increment)
 
     def test_simple_positive_increment_str_operator(self):
-        cpi_command = CellPointerIncrementCommand(None)
+        cpi_command = CellPointerIncrementCommand()
         self.assertEqual(str(cpi_command), ">")
 
     def test_simple_negative_increment_str_operator(self):
-        cpi_command = CellPointerIncrementCommand(None, times=-1)
+        cpi_command = CellPointerIncrementCommand(times=-1)
         self.assertEqual(str(cpi_command), "<")
 
     def test_stacked_positive_increment_str_operator(self):
         times = 3
-        cpi_command = CellPointerIncrementCommand(None, times=times)
+        cpi_command = CellPointerIncrementCommand(times=times)
         self.assertEqual(str(cpi_command), ">" * times)
 
     def test_stacked_negative_increment_str_operator(self):
         times = 3
-        cpi_command = CellPointerIncrementCommand(None, times=-1 * times)
+        cpi_command = CellPointerIncrementCommand(times=-1 * times)
         self.assertEqual(str(cpi_command), "<" * times)
 
     def test_simple_no_increment_str_operator(self):
-        cpi_command = CellPointerIncrementCommand(None, times=0)
+        cpi_command = CellPointerIncrementCommand(times=0)
         self.assertEqual(str(cpi_command), "")
 
     def test_simple_positive_increment_repr_operator(self):
-        cpi_command = CellPointerIncrementCommand(None)
+        cpi_command = CellPointerIncrementCommand()
         self.assertEqual(repr(cpi_command), ">")
 
     def test_simple_negative_increment_repr_operator(self):
-        cpi_command = CellPointerIncrementCommand(None, times=-1)
+        cpi_command = CellPointerIncrementCommand(times=-1)
         self.assertEqual(repr(cpi_command), "<")
 
     def test_stacked_positive_increment_repr_operator(self):
         times = 3
-        cpi_command = CellPointerIncrementCommand(None, times=times)
+        cpi_command = CellPointerIncrementCommand(times=times)
         self.assertEqual(repr(cpi_command), ">" * times)
 
     def test_stacked_negative_increment_repr_operator(self):
         times = 3
-        cpi_command = CellPointerIncrementCommand(None, times=-1 * times)
+        cpi_command = CellPointerIncrementCommand(times=-1 * times)
         self.assertEqual(repr(cpi_command), "<" * times)
 
     def test_simple_no_increment_repr_operator(self):
-        cpi_command = CellPointerIncrementCommand(None, times=0)
+        cpi_command = CellPointerIncrementCommand(times=0)
         self.assertEqual(repr(cpi_command), "")
 
 
@@ -169,50 +185,62 @@ class TestCellValueIncrementCommand(unittest.TestCase):
     def test_simple_positive_increment(self):
         env = BFEnvironment()
         current_cell_value = env.current_cell
-        cpi_command = CellValueIncrementCommand(env)
-        cpi_command.execute()
+        cpi_command = CellValueIncrementCommand()
+        cpi_command.execute(env)
         self.assertEqual(env.current_cell, current_cell_value + 1)
 
     def test_simple_negative_increment(self):
         env = BFEnvironment()
         current_cell_value = env.current_cell
-        cpi_command = CellValueIncrementCommand(env, times=-1)
-        cpi_command.execute()
-        self.assertEqual(env.current_cell, current_cell_value - 1)
+        cpi_command = CellValueIncrementCommand(times=-1)
+        cpi_command.execute(env)
+        self.assertEqual(env.current_cell, (current_cell_value - 1) & env.cell_mask)
 
     def test_no_increment(self):
         env = BFEnvironment()
         current_cell_value = env.current_cell
-        cpi_command = CellValueIncrementCommand(env, times=0)
-        cpi_command.execute()
+        cpi_command = CellValueIncrementCommand(times=0)
+        cpi_command.execute(env)
         self.assertEqual(env.current_cell, current_cell_value)
 
     def test_stacked_positive_increment(self):
         env = BFEnvironment()
         current_cell_value = env.current_cell
         times_increment = 3
-        cpi_command = CellValueIncrementCommand(env, times=times_increment)
-        cpi_command.execute()
+        cpi_command = CellValueIncrementCommand(times=times_increment)
+        cpi_command.execute(env)
         self.assertEqual(env.current_cell, current_cell_value + times_increment)
 
     def test_stacked_negative_increment(self):
         env = BFEnvironment()
         current_cell_value = env.current_cell
         times_increment = -3
-        cpi_command = CellValueIncrementCommand(env, times=times_increment)
-        cpi_command.execute()
-        self.assertEqual(env.current_cell, current_cell_value + times_increment)
+        cpi_command = CellValueIncrementCommand(times=times_increment)
+        cpi_command.execute(env)
+        self.assertEqual(env.current_cell, (current_cell_value + times_increment) & env.cell_mask)
+
+    def test_increment_wraps_around(self):
+        env = BFEnvironment()
+        CellValueIncrementCommand(times=-1).execute(env)
+        self.assertEqual(env.current_cell, 255)
+        CellValueIncrementCommand(times=2).execute(env)
+        self.assertEqual(env.current_cell, 1)
+
+    def test_increment_wraps_around_wide_cells(self):
+        env = BFEnvironment(cell_bits=16)
+        CellValueIncrementCommand(times=-1).execute(env)
+        self.assertEqual(env.current_cell, 0xFFFF)
 
     def test_simple_positive_increment_str_operator(self):
-        cpi_command = CellValueIncrementCommand(None)
+        cpi_command = CellValueIncrementCommand()
         self.assertEqual(str(cpi_command), "+")
 
     def test_simple_negative_increment_str_operator(self):
-        cpi_command = CellValueIncrementCommand(None, times=-1)
+        cpi_command = CellValueIncrementCommand(times=-1)
         self.assertEqual(str(cpi_command), "-")
 
     def test_simple_no_increment_str_operator(self):
-        cpi_command = CellValueIncrementCommand(None, times=0)
+        cpi_command = CellValueIncrementCommand(times=0)
         self.assertEqual(str(cpi_command), "")
 
 
@@ -222,72 +250,119 @@ class TestGetCellValueCommand(unittest.TestCase):
     def test_get_cell_value(self, mock_stdout):
         env = BFEnvironment()
         env.current_cell = ord("a")
-        gc_command = GetCellValueCommand(env)
-        gc_command.execute()
+        gc_command = GetCellValueCommand()
+        gc_command.execute(env)
+        env.output_buffer.flush()
         self.assertEqual(mock_stdout.getvalue(), "a")
 
 
 class TestSetCellValueCommand(unittest.TestCase):
 
-    @patch('sys.stdin.read')
+    @patch('sys.stdin', new_callable=lambda: StringIO('a'))
     def test_set_cell_value(self, mock_stdin):
-        mock_stdin.return_value = 'a'
         env = BFEnvironment()
         env.current_cell = ord("c")
-        gc_command = SetCellValueCommand(env)
-        gc_command.execute()
+        gc_command = SetCellValueCommand()
+        gc_command.execute(env)
         self.assertEqual(env.current_cell, ord("a"))
 
 
 class TestOpenBranchCommand(unittest.TestCase):
 
     def test_assign_companion(self):
-        ob_command = OpenBranchCommand(None, companion=None)
+        ob_command = OpenBranchCommand(companion=None)
         ob_command.companion = 1
         self.assertEqual(ob_command.companion, 1)
 
     def test_assign_no_jump(self):
-        ob_command = OpenBranchCommand(None, no_jump=2)
+        ob_command = OpenBranchCommand(no_jump=2)
         ob_command.no_jump = 1
         self.assertEqual(ob_command.no_jump, 1)
 
     def test_next_true_command(self):
         env = BFEnvironment()
-        bf_command_companion, bf_command_no_jump = ClosingBranchCommand(env, no_jump=1), 2
+        bf_command_companion, bf_command_no_jump = ClosingBranchCommand(no_jump=1), 2
         env.current_cell = 1
-        ob_command = OpenBranchCommand(env, companion=bf_command_companion, no_jump=bf_command_no_jump)
-        self.assertEqual(ob_command.next, 2)
+        ob_command = OpenBranchCommand(companion=bf_command_companion, no_jump=bf_command_no_jump)
+        self.assertEqual(ob_command.execute(env), 2)
 
     def test_next_false_command(self):
         env = BFEnvironment()
-        bf_command_companion, bf_command_no_jump = ClosingBranchCommand(env, no_jump=1), BFCommand(env, next=2)
+        bf_command_companion, bf_command_no_jump = ClosingBranchCommand(no_jump=1), BFCommand(next=2)
         env.current_cell = 0
-        ob_command = OpenBranchCommand(env, companion=bf_command_companion, no_jump=bf_command_no_jump)
-        self.assertEqual(ob_command.next, 1)
+        ob_command = OpenBranchCommand(companion=bf_command_companion, no_jump=bf_command_no_jump)
+        self.assertEqual(ob_command.execute(env), 1)
 
 
 class TestClosingBranchCommand(unittest.TestCase):
 
     def test_assign_companion(self):
-        cb_command = ClosingBranchCommand(None, companion=None)
+        cb_command = ClosingBranchCommand(companion=None)
         cb_command.companion = 1
         self.assertEqual(cb_command.companion, 1)
 
     def test_assign_no_jump(self):
-        cb_command = ClosingBranchCommand(None, no_jump=2)
+        cb_command = ClosingBranchCommand(no_jump=2)
         cb_command.no_jump = 1
         self.assertEqual(cb_command.no_jump, 1)
 
     def test_next_true_command(self):
         env = BFEnvironment()
-        bf_command_companion, bf_command_no_jump = OpenBranchCommand(env, no_jump=1), BFCommand(env, next=2)
+        bf_command_companion, bf_command_no_jump = OpenBranchCommand(no_jump=1), BFCommand(next=2)
         env.current_cell = 1
-        cb_command = ClosingBranchCommand(env, companion=bf_command_companion, no_jump=bf_command_no_jump)
-        self.assertEqual(cb_command.next, 1)
+        cb_command = ClosingBranchCommand(companion=bf_command_companion, no_jump=bf_command_no_jump)
+        self.assertEqual(cb_command.execute(env), 1)
 
     def test_next_false_command(self):
         env = BFEnvironment()
-        bf_command_companion, bf_command_no_jump = OpenBranchCommand(env, no_jump=1), 2
+        bf_command_companion, bf_command_no_jump = OpenBranchCommand(no_jump=1), 2
         env.current_cell = 0
-        cb_command = ClosingBranchCommand(env, companion=bf_command_companion, no_jump=bf_command_no_jump)
-        self.assertEqual(cb_command.next, 2)
+        cb_command = ClosingBranchCommand(companion=bf_command_companion, no_jump=bf_command_no_jump)
+        self.assertEqual(cb_command.execute(env), 2)
+
+
+class TestClearCellCommand(unittest.TestCase):
+
+    def test_clear(self):
+        env = BFEnvironment()
+        env.current_cell = 42
+        ClearCellCommand().execute(env)
+        self.assertEqual(env.current_cell, 0)
+
+    def test_str_operator(self):
+        self.assertEqual(str(ClearCellCommand()), "[-]")
+
+
+class TestMultiplyLoopCommand(unittest.TestCase):
+
+    def test_multiply(self):
+        env = BFEnvironment()
+        env.current_cell = 3
+        MultiplyLoopCommand(factors=[(1, 1), (-2, 4)]).execute(env)
+        self.assertEqual(env.current_cell, 0)
+        self.assertEqual(env.cells[env.cell_pointer + 1], 3)
+        self.assertEqual(env.cells[env.cell_pointer - 2], 12)
+
+    def test_multiply_increment_step(self):
+        env = BFEnvironment()
+        env.current_cell = -3
+        MultiplyLoopCommand(factors=[(1, 2)], step=1).execute(env)
+        self.assertEqual(env.current_cell, 0)
+        self.assertEqual(env.cells[env.cell_pointer + 1], 6)
+
+    def test_multiply_odd_step(self):
+        env = BFEnvironment()
+        env.current_cell = 1
+        # [--->+<] from 1 goes 1, 254, ..., 0 in 171 iterations
+        MultiplyLoopCommand(factors=[(1, 1)], step=-3).execute(env)
+        self.assertEqual(env.current_cell, 0)
+        self.assertEqual(env.cells[env.cell_pointer + 1], 171)
+
+    def test_multiply_zero_cell(self):
+        env = BFEnvironment()
+        env.cells[env.cell_pointer + 1] = 5
+        MultiplyLoopCommand(factors=[(1, 1)]).execute(env)
+        self.assertEqual(env.cells[env.cell_pointer + 1], 5)
+
+    def test_str_operator(self):
+        self.assertEqual(str(MultiplyLoopCommand(factors=[(-1, 3), (2, -1)], step=1)), "[+<+++>>>-<<]")
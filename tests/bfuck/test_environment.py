@@ -1,4 +1,5 @@
 import unittest
+from array import array
 
 from interpreters.bfuck.environment import BFEnvironment
 
@@ -18,3 +19,53 @@ class TestBFEnvironment(unittest.TestCase):
         self.env.current_cell = 3
         self.env.reset()
         self.assertEqual(self.env.current_cell, 0)
+
+    def test_default_tape_is_bytearray(self):
+        self.assertIsInstance(self.env.cells, bytearray)
+        self.assertEqual(len(self.env.cells), BFEnvironment.N_CELLS * 2)
+
+    def test_wide_tapes(self):
+        for cell_bits, typecode in ((16, 'H'), (32, 'I')):
+            env = BFEnvironment(cell_bits=cell_bits)
+            self.assertIsInstance(env.cells, array)
+            self.assertEqual(env.cells.typecode, typecode)
+            self.assertEqual(env.cell_mask, (1 << cell_bits) - 1)
+            self.assertFalse(any(env.cells))
+
+    def test_invalid_cell_width(self):
+        with self.assertRaises(ValueError):
+            BFEnvironment(cell_bits=12)
+
+    def test_current_cell_wraps_around(self):
+        self.env.current_cell = 256 + 7
+        self.assertEqual(self.env.current_cell, 7)
+        self.env.current_cell = -1
+        self.assertEqual(self.env.current_cell, 255)
+
+    def test_tape_view_is_zero_copy(self):
+        view = self.env.tape_view()
+        self.env.current_cell = 9
+        self.assertEqual(view[self.env.cell_pointer], 9)
+
+    def test_paged_tape(self):
+        env = BFEnvironment(paged=True, max_tape_bytes=1 << 16)
+        self.assertEqual(env.cell_pointer, 0)
+        self.assertEqual(env.cells.nbytes, 0)
+        env.current_cell = 3
+        env.reset()
+        self.assertEqual(env.current_cell, 0)
+        self.assertEqual(env.cells.max_pages, 16)
+
+    def test_only_paged_tapes_are_capped(self):
+        with self.assertRaises(ValueError):
+            BFEnvironment(max_tape_bytes=1024)
+
+    def test_reset_clears_in_place(self):
+        for cell_bits in (8, 16):
+            env = BFEnvironment(cell_bits=cell_bits)
+            cells = env.cells
+            env.current_cell = 3
+            env.cells[0] = 1
+            env.reset()
+            self.assertIs(env.cells, cells)
+            self.assertFalse(any(env.cells))
@@ -1,8 +1,11 @@
+import os
+import tempfile
 import unittest
-from io import StringIO
+from io import StringIO, BytesIO
 from unittest.mock import patch
 
 from interpreters import BrainFuckInterpreter
+from interpreters.bfuck.cache import BFProgramCache
 
 
 class TestBFInterpreterUnitary(unittest.TestCase):
@@ -77,6 +80,29 @@ class TestBFInterpreterUnitary(unittest.TestCase):
         self.assertIs(cached_ast, interpreter._cached_ast)
         self.assertFalse(interpreter._code_is_dirty)
 
+    def test_second_run_does_not_assume_a_fresh_tape(self):
+        for engine in ("ast", "bytecode", "python", "tracing"):
+            interpreter = BrainFuckInterpreter("[>+<-]+", engine=engine)
+            interpreter.execute()
+            interpreter.execute()
+            self.assertEqual(interpreter.env.current_cell, 1, engine)
+            interpreter.env.cell_pointer += 1
+            self.assertEqual(interpreter.env.current_cell, 1, engine)
+
+    def test_prepared_tape_is_not_assumed_fresh(self):
+        for engine in ("ast", "bytecode", "python", "tracing"):
+            output_stream = BytesIO()
+            interpreter = BrainFuckInterpreter("[.-]", engine=engine, output_stream=output_stream)
+            interpreter.env.current_cell = 3
+            interpreter.execute()
+            self.assertEqual(output_stream.getvalue(), b"\x03\x02\x01", engine)
+            # Compiled before the tape was written to
+            interpreter = BrainFuckInterpreter("[.-]", engine=engine, output_stream=BytesIO())
+            interpreter._get_ast()
+            interpreter.env.tape_view()[interpreter.env.cell_pointer] = 2
+            interpreter.execute()
+            self.assertEqual(interpreter.env.output_buffer.stream.getvalue(), b"\x02\x01", engine)
+
 
 class TestBFPrograms(unittest.TestCase):
 
@@ -96,9 +122,8 @@ class TestBFPrograms(unittest.TestCase):
         self.assertEqual(mock_stdout.getvalue(), "a")
 
     @patch('sys.stdout', new_callable=StringIO)
-    @patch('sys.stdin.read')
+    @patch('sys.stdin', new_callable=lambda: StringIO('a'))
     def test_uppercase_char(self, mock_stdin, mock_stdout):
-        mock_stdin.return_value = 'a'
         code = "," + "-" * 32 + "."
         interpreter = BrainFuckInterpreter(code)
         interpreter.execute()
@@ -111,3 +136,192 @@ class TestBFPrograms(unittest.TestCase):
         interpreter = BrainFuckInterpreter(code)
         interpreter.execute()
         self.assertEqual(mock_stdout.getvalue(), "Hello World!\n")
+
+
+class TestBFBytecodeEngine(unittest.TestCase):
+
+    def test_unknown_engine(self):
+        with self.assertRaises(ValueError):
+            BrainFuckInterpreter("+", engine="nope")
+
+    def test_program_caching(self):
+        interpreter = BrainFuckInterpreter("+", engine="bytecode")
+        interpreter.execute()
+        program = interpreter._cached_program
+        self.assertIsNotNone(program)
+        interpreter.execute()
+        self.assertIs(program, interpreter._cached_program)
+        interpreter.code = "-"
+        interpreter.execute()
+        self.assertIsNot(program, interpreter._cached_program)
+
+    def test_add_two_cells(self):
+        interpreter = BrainFuckInterpreter("++++>+++++<[>+<-]", engine="bytecode")
+        interpreter.execute()
+        self.assertEqual(interpreter.env.current_cell, 0)
+        interpreter.env.cell_pointer += 1
+        self.assertEqual(interpreter.env.current_cell, 9)
+
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_print_hello_world(self, mock_stdout):
+        code = "++++++++++[>+++++++>++++++++++>+++>+<<<<-]>++" \
+               ".>+.+++++++..+++.>++.<<+++++++++++++++.>.+++.------.--------.>+.>."
+        interpreter = BrainFuckInterpreter(code, engine="bytecode")
+        interpreter.execute()
+        self.assertEqual(mock_stdout.getvalue(), "Hello World!\n")
+
+    def test_wraparound(self):
+        interpreter = BrainFuckInterpreter("-->+[-<+>]", engine="bytecode")
+        interpreter.execute()
+        interpreter.env.cell_pointer -= 1
+        self.assertEqual(interpreter.env.current_cell, 255)
+
+    def test_wide_cells(self):
+        interpreter = BrainFuckInterpreter("-", engine="bytecode", cell_bits=32)
+        interpreter.execute()
+        self.assertEqual(interpreter.env.current_cell, 0xFFFFFFFF)
+
+
+class TestBFPythonEngine(unittest.TestCase):
+
+    def test_program_caching(self):
+        interpreter = BrainFuckInterpreter("+", engine="python")
+        interpreter.execute()
+        program = interpreter._cached_program
+        self.assertIsNotNone(program)
+        interpreter.execute()
+        self.assertIs(program, interpreter._cached_program)
+        self.assertEqual(interpreter.env.current_cell, 2)
+
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_print_hello_world(self, mock_stdout):
+        code = "++++++++++[>+++++++>++++++++++>+++>+<<<<-]>++" \
+               ".>+.+++++++..+++.>++.<<+++++++++++++++.>.+++.------.--------.>+.>."
+        interpreter = BrainFuckInterpreter(code, engine="python")
+        interpreter.execute()
+        self.assertEqual(mock_stdout.getvalue(), "Hello World!\n")
+
+
+class TestBFInterpreterStream(unittest.TestCase):
+    ENGINES = ("ast", "bytecode", "python", "tracing")
+
+    def test_stream_chunks(self):
+        for engine in self.ENGINES:
+            interpreter = BrainFuckInterpreter("+" * 65 + "....." + "+.", engine=engine)
+            chunks = list(interpreter.stream(chunk_size=2))
+            self.assertEqual(chunks, [b"AA", b"AA", b"AB"], engine)
+
+    def test_stream_line_flush(self):
+        for engine in self.ENGINES:
+            interpreter = BrainFuckInterpreter("++++++++++>" + "+" * 65 + ".<.>.<.", engine=engine)
+            chunks = list(interpreter.stream(flush="line"))
+            self.assertEqual(chunks, [b"A\n", b"A\n"], engine)
+
+    def test_stream_input_chunks(self):
+        for engine in self.ENGINES:
+            interpreter = BrainFuckInterpreter(",[+.,]", engine=engine)
+            chunks = list(interpreter.stream(input_chunks=[b"ab", b"", b"c"]))
+            self.assertEqual(b"".join(chunks), b"bcd", engine)
+
+    def test_stream_yields_output_before_pulling_input(self):
+        for engine in self.ENGINES:
+            seen = []
+            stream = BrainFuckInterpreter("+" * 62 + ".,.", engine=engine).stream(
+                input_chunks=(seen.append(len(seen)) or b"!" for _ in range(1)))
+            self.assertEqual(next(stream), b">")
+            self.assertEqual(seen, [])
+            self.assertEqual(next(stream), b"!")
+            self.assertEqual(seen, [0])
+
+    def test_stream_restores_buffers(self):
+        interpreter = BrainFuckInterpreter("+.", engine="bytecode")
+        output_buffer = interpreter.env.output_buffer
+        stream = interpreter.stream(chunk_size=1)
+        next(stream)
+        stream.close()
+        self.assertIs(interpreter.env.output_buffer, output_buffer)
+        self.assertEqual(interpreter.env.current_cell, 1)
+
+    def test_stream_does_not_touch_stdout(self):
+        with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+            list(BrainFuckInterpreter("+.", engine="bytecode").stream())
+        self.assertEqual(mock_stdout.getvalue(), "")
+
+
+class TestBFInterpreterFromFile(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, data):
+        path = os.path.join(self.directory.name, "program.bf")
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def test_runs_mapped_source(self):
+        path = self.write(b"print A\n" + b"+" * 65 + b".")
+        for engine in ("ast", "bytecode", "python", "tracing"):
+            output_stream = BytesIO()
+            BrainFuckInterpreter.from_file(path, engine=engine, output_stream=output_stream).execute()
+            self.assertEqual(output_stream.getvalue(), b"A", engine)
+
+    def test_empty_file(self):
+        interpreter = BrainFuckInterpreter.from_file(self.write(b""))
+        interpreter.execute()
+        self.assertEqual(interpreter.env.current_cell, 0)
+
+    def test_cache_key_matches_str_source(self):
+        code = "+[->+<] comment"
+        self.assertEqual(BFProgramCache.key(code, "bytecode"), BFProgramCache.key(code.encode(), "bytecode"))
+        with tempfile.TemporaryDirectory() as directory:
+            cache = BFProgramCache(directory)
+            BrainFuckInterpreter(code, engine="bytecode", cache=cache).execute()
+            interpreter = BrainFuckInterpreter.from_file(self.write(code.encode()), engine="bytecode", cache=cache)
+            interpreter.execute()
+            self.assertEqual(len(os.listdir(directory)), 1)
+
+    def test_cache_key_of_file_objects(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = BFProgramCache(directory)
+            for source in (StringIO("+++. comment"), BytesIO(b"+++. comment")):
+                output_stream = BytesIO()
+                interpreter = BrainFuckInterpreter(source, engine="bytecode", cache=cache, output_stream=output_stream)
+                interpreter.execute()
+                # Hashing it didn't leave the stream at its end for the builder
+                self.assertEqual(output_stream.getvalue(), b"\x03")
+                # Nor does it for the second build, the first one assumed a fresh tape
+                interpreter.execute()
+                self.assertEqual(output_stream.getvalue(), b"\x03\x06")
+            self.assertEqual(len(os.listdir(directory)), 2)
+            self.assertEqual(BFProgramCache.key(StringIO("+++."), "bytecode"), BFProgramCache.key("+++.", "bytecode"))
+
+    def test_file_object_sources_run_twice(self):
+        for engine in ("ast", "bytecode", "python", "tracing"):
+            for source in (StringIO("[-]+++[.-]"), BytesIO(b"[-]+++[.-]")):
+                output_stream = BytesIO()
+                interpreter = BrainFuckInterpreter(source, engine=engine, output_stream=output_stream)
+                interpreter.execute()
+                # The tape isn't fresh anymore, so the graph is built again from the source
+                interpreter.execute()
+                self.assertEqual(output_stream.getvalue(), b"\x03\x02\x01" * 2, engine)
+
+    def test_close_unmaps_the_source(self):
+        with BrainFuckInterpreter.from_file(self.write(b"+++"), engine="bytecode") as interpreter:
+            code = interpreter.code
+            interpreter.execute()
+        self.assertTrue(code.closed)
+        self.assertEqual(interpreter.env.current_cell, 3)
+        # Sources passed in belong to the caller
+        interpreter = BrainFuckInterpreter(b"+")
+        interpreter.close()
+
+    def test_profile_maps_lines(self):
+        interpreter = BrainFuckInterpreter.from_file(self.write(b"+\n+[-]"), optimize=False,
+                                                     output_stream=BytesIO())
+        profile = interpreter.profile()
+        loop, = profile.loops
+        self.assertEqual(profile.line_column(loop.start), (2, 2))
@@ -0,0 +1,96 @@
+import pickle
+import unittest
+from io import BytesIO
+
+from interpreters import BrainFuckInterpreter
+from interpreters.bfuck.ast_builder import BEASTBuilder
+from interpreters.bfuck.bytecode import BFBytecodeCompiler
+from interpreters.bfuck.environment import BFEnvironment
+from interpreters.bfuck.limits import BFStepLimitExceeded, BFDeadlineExceeded, BFLimitExceeded, run_limited
+
+
+class TestRunLimited(unittest.TestCase):
+
+    def run_code(self, code, **kwargs):
+        env = BFEnvironment(output_stream=BytesIO())
+        program = BFBytecodeCompiler(BEASTBuilder(code).build_ast()).compile()
+        run_limited(program, env, **kwargs)
+        return env
+
+    def test_exact_step_budget(self):
+        # Ten iterations of the loop take nine back-edges
+        env = self.run_code("++++++++++[-]", max_steps=9)
+        self.assertEqual(env.current_cell, 0)
+        with self.assertRaises(BFStepLimitExceeded):
+            self.run_code("++++++++++[-]", max_steps=8)
+
+    def test_budget_over_many_checks(self):
+        self.run_code("++++++++++[-]", max_steps=9, check_every=2)
+        with self.assertRaises(BFStepLimitExceeded):
+            self.run_code("++++++++++[-]", max_steps=8, check_every=2)
+
+    def test_no_budget_for_straight_code(self):
+        env = self.run_code("+++>++", max_steps=0)
+        self.assertEqual(env.current_cell, 2)
+
+    def test_partial_output_and_stats(self):
+        env = BFEnvironment(input_stream=BytesIO(b"a"), output_stream=BytesIO())
+        program = BFBytecodeCompiler(BEASTBuilder(",[.]").build_ast()).compile()
+        with self.assertRaises(BFStepLimitExceeded) as context:
+            run_limited(program, env, max_steps=4)
+        self.assertEqual(context.exception.output, b"a" * 5)
+        self.assertEqual(env.output_buffer.stream.getvalue(), b"a" * 5)
+        stats = context.exception.stats
+        self.assertEqual((stats.steps, stats.consumed, stats.written), (5, 1, 5))
+
+    def test_output_flushed_before_a_read(self):
+        env = BFEnvironment(input_stream=BytesIO(b"x"), output_stream=BytesIO())
+        program = BFBytecodeCompiler(BEASTBuilder("+++.,+[]").build_ast()).compile()
+        with self.assertRaises(BFStepLimitExceeded) as context:
+            run_limited(program, env, max_steps=10)
+        self.assertEqual(context.exception.output, b"\x03")
+        self.assertEqual(env.output_buffer.stream.getvalue(), b"\x03")
+
+    def test_deadline(self):
+        with self.assertRaises(BFDeadlineExceeded) as context:
+            self.run_code("+[]", timeout=0.05, check_every=1000)
+        self.assertGreaterEqual(context.exception.stats.elapsed, 0.05)
+        self.assertEqual(context.exception.output, b"")
+
+    def test_negative_limits_are_rejected(self):
+        for limits in (dict(max_steps=-5), dict(timeout=-1)):
+            with self.assertRaises(ValueError):
+                self.run_code("+[]", **limits)
+
+    def test_errors_pickle(self):
+        with self.assertRaises(BFStepLimitExceeded) as context:
+            self.run_code("+[.]", max_steps=2)
+        error = pickle.loads(pickle.dumps(context.exception))
+        self.assertIsInstance(error, BFStepLimitExceeded)
+        self.assertEqual(str(error), "Program went over 2 steps")
+        self.assertEqual((error.output, error.stats), (context.exception.output, context.exception.stats))
+
+
+class TestBFInterpreterLimits(unittest.TestCase):
+
+    def test_every_engine(self):
+        for engine in ("ast", "bytecode", "python"):
+            interpreter = BrainFuckInterpreter("+[]", engine=engine)
+            with self.assertRaises(BFLimitExceeded):
+                interpreter.execute(max_steps=1000)
+
+    def test_bytecode_is_compiled_once(self):
+        for engine in ("ast", "python", "tracing"):
+            interpreter = BrainFuckInterpreter("+++[-]", engine=engine)
+            interpreter.execute(max_steps=10)
+            program = interpreter._cached_bytecode
+            interpreter.execute(max_steps=10)
+            self.assertIs(interpreter._get_bytecode_program(), program, engine)
+            interpreter.code = "++[-]"
+            self.assertIsNot(interpreter._get_bytecode_program(), program, engine)
+
+    def test_within_limits(self):
+        output_stream = BytesIO()
+        interpreter = BrainFuckInterpreter("++++++[>++++++++<-]>+.", output_stream=output_stream)
+        interpreter.execute(max_steps=100, timeout=10)
+        self.assertEqual(output_stream.getvalue(), b"1")
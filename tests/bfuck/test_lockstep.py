@@ -0,0 +1,95 @@
+import unittest
+from io import BytesIO
+from unittest.mock import patch
+
+from interpreters.bfuck import lockstep
+from interpreters.bfuck.interpreter import BrainFuckInterpreter
+from interpreters.bfuck.limits import BFStepLimitExceeded
+from interpreters.bfuck.lockstep import BFLockstepRunner
+from interpreters.bfuck.streams import EOF_MINUS_ONE, EOF_UNCHANGED, EOF_ZERO
+
+# Prints the last decimal digit of every byte, loops a different number of times for every byte
+LAST_DIGITS = ",[>++++++++++<[->-[>+>>]>[+[-<+>]>+>>]<<<<<]>[-]>" + "+" * 48 + ".[-]>[-]<<<,]"
+INPUTS = [b"", b"a", b"\x01\xff", b"hello", b"\x09\x0a\x0b", bytes(range(1, 40))]
+
+
+@unittest.skipIf(lockstep.numpy is None, "numpy isn't installed")
+class TestBFLockstepRunner(unittest.TestCase):
+
+    def run_separately(self, code, input_data, **kwargs):
+        output_stream = BytesIO()
+        BrainFuckInterpreter(code, engine="bytecode", input_stream=BytesIO(input_data), output_stream=output_stream,
+                             **kwargs).execute()
+        return output_stream.getvalue()
+
+    def test_matches_separate_runs(self):
+        codes = (LAST_DIGITS, ",[.,]", ",[->+>+<<]>[-<+>]>.<<.", ",>,<[->>+<<]>[->+<]>.", ",[[->+<]>-]>>>.")
+        for code in codes:
+            results = BFLockstepRunner(code).run(INPUTS)
+            self.assertEqual([result.output for result in results],
+                             [self.run_separately(code, input_data) for input_data in INPUTS], code)
+            self.assertEqual([result.index for result in results], list(range(len(INPUTS))))
+            self.assertTrue(all(result.error is None for result in results))
+
+    def test_eof_and_cell_bits(self):
+        code = "++++++++[>,.<-]"
+        for eof in (EOF_ZERO, EOF_MINUS_ONE, EOF_UNCHANGED):
+            for cell_bits in (8, 16, 32):
+                results = BFLockstepRunner(code, cell_bits=cell_bits, eof=eof).run(INPUTS)
+                self.assertEqual([result.output for result in results],
+                                 [self.run_separately(code, input_data, cell_bits=cell_bits, eof=eof)
+                                  for input_data in INPUTS])
+
+    def test_cells_wrap(self):
+        results = BFLockstepRunner("-.>,[-<+>]<.", cell_bits=16).run([b"\x02"])
+        self.assertEqual(results[0].output, b"\xff\x01")
+
+    def test_inputs_go_max_lanes_at_a_time(self):
+        inputs = ["abc", "", "xy", "z", "hello"]
+        results = list(BFLockstepRunner(",[+.,]", max_lanes=2).map(inputs))
+        self.assertEqual([result.index for result in results], [0, 1, 2, 3, 4])
+        self.assertEqual([result.output for result in results], [b"bcd", b"", b"yz", b"{", b"ifmmp"])
+
+    def test_step_limit(self):
+        # Prints its input back, a \x01 hangs it
+        code = ",[.>+<-[>-<[-]]>[+[]]<,]"
+        results = BFLockstepRunner(code, max_steps=1000).run([b"ab", b"a\x01b", b""])
+        self.assertEqual(results[0].output, b"ab")
+        self.assertIsNone(results[0].error)
+        self.assertIsInstance(results[1].error, BFStepLimitExceeded)
+        self.assertEqual(results[1].output, b"a\x01")
+        self.assertEqual(results[1].error.output, b"a\x01")
+        self.assertEqual(results[1].error.stats.consumed, 2)
+        self.assertIsNone(results[2].error)
+
+    def test_off_the_tape(self):
+        results = BFLockstepRunner(",[>,]<.", n_cells=8).run([b"abc", b"abcdefgh"])
+        self.assertEqual(results[0].output, b"c")
+        self.assertIsNone(results[0].error)
+        self.assertIsInstance(results[1].error, IndexError)
+
+    def test_negative_cells_wrap_like_the_flat_tape(self):
+        # Pointers start at cell 4, cell -1 is the last one
+        results = BFLockstepRunner("<<<<<+>>>>>>>>.", n_cells=8).run([b""])
+        self.assertEqual(results[0].output, b"\x01")
+
+    def test_multiply_by_zero_stays_on_the_tape(self):
+        # A zero cell doesn't look at the cells it would multiply into
+        results = BFLockstepRunner(",[->>>>>>>>>>+<<<<<<<<<<]+.", n_cells=8).run([b"", b"\x01"])
+        self.assertEqual(results[0].output, b"\x01")
+        self.assertIsInstance(results[1].error, IndexError)
+
+    def test_empty_programs(self):
+        # [] and [+-] can't be entered on a fresh tape, the optimizer drops them altogether
+        for code in ("", "-+", "[]", "[+-]"):
+            results = BFLockstepRunner(code).run([b"", b"a"])
+            self.assertEqual(results, [(0, b"", None), (1, b"", None)], code)
+
+    def test_needs_numpy(self):
+        with patch.object(lockstep, "numpy", None):
+            with self.assertRaises(ImportError):
+                BFLockstepRunner(",.")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,195 @@
+import unittest
+
+from interpreters.bfuck.ast_builder import BEASTBuilder, walk_ast
+from interpreters.bfuck.commands import BFCommand, CellValueIncrementCommand, OpenBranchCommand, \
+    ClosingBranchCommand, ClearCellCommand, MultiplyLoopCommand, AssignCellCommand, SetCellValueCommand
+from interpreters.bfuck.environment import BFEnvironment
+from interpreters.bfuck.optimizer import BFOptimizer
+
+
+class TestBFOptimizerLoopIdioms(unittest.TestCase):
+
+    def optimize(self, code):
+        ast = BEASTBuilder(code).build_ast()
+        return list(walk_ast(BFOptimizer().optimize(ast)))
+
+    def test_clear_decrement(self):
+        commands = self.optimize("[-]")
+        self.assertEqual(len(commands), 1)
+        self.assertIsInstance(commands[0], ClearCellCommand)
+
+    def test_clear_increment(self):
+        commands = self.optimize("[+]")
+        self.assertEqual(len(commands), 1)
+        self.assertIsInstance(commands[0], ClearCellCommand)
+
+    def test_copy_loop(self):
+        command, = self.optimize("[->+<]")
+        self.assertIsInstance(command, MultiplyLoopCommand)
+        self.assertEqual(command.factors, ((1, 1),))
+        self.assertEqual(command.step, -1)
+
+    def test_multiply_loop(self):
+        command, = self.optimize("[->+>++<<]")
+        self.assertIsInstance(command, MultiplyLoopCommand)
+        self.assertEqual(command.factors, ((1, 1), (2, 2)))
+        self.assertEqual(str(command), "[->+>++<<]")
+
+    def test_multiply_loop_increment_step(self):
+        command, = self.optimize("[<--->+]")
+        self.assertIsInstance(command, MultiplyLoopCommand)
+        self.assertEqual(command.factors, ((-1, -3),))
+        self.assertEqual(command.step, 1)
+
+    def test_unbalanced_loop_is_kept(self):
+        commands = self.optimize("[->+]")
+        self.assertIsInstance(commands[0], OpenBranchCommand)
+        self.assertIsInstance(commands[-1], ClosingBranchCommand)
+
+    def test_even_step_is_kept(self):
+        commands = self.optimize("[-->+<]")
+        self.assertIsInstance(commands[0], OpenBranchCommand)
+
+    def test_odd_step(self):
+        command, = self.optimize("[--->++<]")
+        self.assertIsInstance(command, MultiplyLoopCommand)
+        self.assertEqual(command.step, -3)
+        self.assertEqual(str(command), "[--->++<]")
+
+    def test_odd_step_matches_loop(self):
+        for cell_bits in (8, 16):
+            for code in ("[--->++<]", "[+++++>-<]", "[-----]"):
+                for value in (1, 2, 7, 200, 255):
+                    results = []
+                    for optimize in (False, True):
+                        env = BFEnvironment(cell_bits=cell_bits)
+                        env.current_cell = value
+                        ast = BEASTBuilder(code).build_ast()
+                        if optimize:
+                            ast = BFOptimizer(cell_bits).optimize(ast)
+                        command = ast
+                        while command is not None:
+                            command = command.execute(env)
+                        results.append(list(env.cells[env.cell_pointer:env.cell_pointer + 2]))
+                    self.assertEqual(results[0], results[1], (cell_bits, code, value))
+
+    def test_loop_with_output_is_kept(self):
+        commands = self.optimize("[-.]")
+        self.assertIsInstance(commands[0], OpenBranchCommand)
+
+    def test_inner_idioms_are_folded(self):
+        commands = self.optimize("+[>[-]<-]")
+        self.assertEqual([type(command) for command in commands],
+                         [CellValueIncrementCommand, OpenBranchCommand, ClearCellCommand, CellValueIncrementCommand,
+                          ClosingBranchCommand])
+        self.assertEqual(commands[2].offset, 1)
+        self.assertIs(commands[1].companion, commands[-1])
+
+    def test_noops_are_dropped(self):
+        commands = self.optimize("+-><[-]")
+        self.assertEqual(len(commands), 1)
+        self.assertIsInstance(commands[0], ClearCellCommand)
+
+    def test_empty_program(self):
+        commands = self.optimize("+-")
+        self.assertEqual(len(commands), 1)
+        self.assertEqual(type(commands[0]), BFCommand)
+
+
+class TestBFOptimizerOffsets(unittest.TestCase):
+
+    def optimize(self, code):
+        ast = BEASTBuilder(code).build_ast()
+        return list(walk_ast(BFOptimizer().optimize(ast)))
+
+    def test_block_ends_with_one_move(self):
+        commands = self.optimize(">+>++<<-")
+        self.assertEqual([(type(command), command.offset, command.times) for command in commands],
+                         [(CellValueIncrementCommand, 1, 1), (CellValueIncrementCommand, 2, 2),
+                          (CellValueIncrementCommand, 0, -1)])
+
+    def test_net_move_before_branches(self):
+        commands = self.optimize(">>+[<]")
+        self.assertEqual([str(command) for command in commands], [">>+<<", ">>", "[", "<", "]"])
+
+    def test_adds_to_the_same_cell_are_merged(self):
+        commands = self.optimize("+>+<+>>")
+        self.assertEqual([(command.offset, command.times) for command in commands], [(0, 2), (1, 1), (0, 2)])
+
+    def test_adds_are_not_moved_past_io(self):
+        commands = self.optimize("+.+")
+        self.assertEqual([str(command) for command in commands], ["+", ".", "+"])
+
+    def test_io_and_idioms_get_offsets(self):
+        commands = self.optimize(">.<<,>>>[-]>>[->+<]")
+        self.assertEqual([command.offset for command in commands[:-1]], [1, -1, 2, 4])
+        self.assertEqual(commands[-1].times, 4)
+
+    def test_unbalanced_program_runs_the_same(self):
+        code = "++++[>+++>++<<-]>[>+<-]<+>>."
+        for optimize in (False, True):
+            env = BFEnvironment()
+            ast = BEASTBuilder(code).build_ast()
+            if optimize:
+                ast = BFOptimizer().optimize(ast)
+            command = ast
+            while command is not None:
+                command = command.execute(env)
+            self.assertEqual(env.cell_pointer, env.N_CELLS + 2)
+            self.assertEqual(env.output_buffer.take(), bytes([20]))
+
+
+class TestBFOptimizerDataflow(unittest.TestCase):
+
+    def optimize(self, code, fresh_tape=False):
+        ast = BEASTBuilder(code).build_ast()
+        self.optimizer = BFOptimizer(fresh_tape=fresh_tape)
+        return list(walk_ast(self.optimizer.optimize(ast)))
+
+    def test_loop_after_loop_is_dropped(self):
+        commands = self.optimize(",[.,][.][-]")
+        self.assertEqual([str(command) for command in commands], [",", "[", ".", ",", "]"])
+
+    def test_loop_at_start_of_fresh_tape_is_dropped(self):
+        commands = self.optimize("[comment, with. code]+")
+        self.assertIsInstance(commands[0], OpenBranchCommand)
+        self.assertFalse(self.optimizer.assumed_fresh_tape)
+        commands = self.optimize("[comment, with. code]+", fresh_tape=True)
+        self.assertEqual([str(command) for command in commands], ["+"])
+        self.assertTrue(self.optimizer.assumed_fresh_tape)
+
+    def test_unmatched_open_branch_on_zero_drops_the_rest(self):
+        commands = self.optimize(",[-][+.")
+        self.assertEqual([type(command) for command in commands], [SetCellValueCommand, ClearCellCommand])
+
+    def test_clear_and_add_become_a_store(self):
+        commands = self.optimize(",[-]+++")
+        self.assertEqual([type(command) for command in commands], [SetCellValueCommand, AssignCellCommand])
+        self.assertEqual(commands[1].value, 3)
+
+    def test_negative_store(self):
+        command, = self.optimize("[-]--")
+        self.assertEqual(str(command), "[-]--")
+
+    def test_overwritten_add_is_dropped(self):
+        commands = self.optimize(",+++[-]")
+        self.assertEqual([type(command) for command in commands], [SetCellValueCommand, ClearCellCommand])
+
+    def test_read_add_is_kept(self):
+        commands = self.optimize(",+++.[-]")
+        self.assertEqual([str(command) for command in commands], [",", "+++", ".", "[-]"])
+
+    def test_known_multiply_loop_becomes_adds(self):
+        commands = self.optimize(",>[-]++[->+++<]<")
+        self.assertEqual([(type(command), command.offset) for command in commands],
+                         [(SetCellValueCommand, 0), (CellValueIncrementCommand, 2), (ClearCellCommand, 1)])
+        self.assertEqual(commands[1].times, 6)
+
+    def test_unknown_multiply_loop_forgets_stores(self):
+        # The target was stored to, after the loop its value is anyone's guess
+        commands = self.optimize(",>[-]<[->+<]>+.")
+        self.assertEqual([str(command) for command in commands], [",", ">[-]<", "[->+<]", ">+<", ">.<", ">"])
+
+    def test_known_values_follow_pointer_moves(self):
+        commands = self.optimize(",[>]>[-]<[-]", fresh_tape=True)
+        self.assertEqual([str(command) for command in commands], [",", "[", ">", "]", ">[-]<"])
@@ -0,0 +1,78 @@
+import unittest
+from io import BytesIO
+
+from interpreters.bfuck.limits import BFStepLimitExceeded
+from interpreters.bfuck.pool import BFInterpreterPool
+
+# Prints its input back, plus one
+CODE = ",[+.,]"
+
+
+class TestBFInterpreterPool(unittest.TestCase):
+
+    def run_pool(self, pool, data):
+        output_stream = BytesIO()
+        pool.execute(BytesIO(data), output_stream)
+        return output_stream.getvalue()
+
+    def test_interpreters_are_reused(self):
+        for engine in ("ast", "bytecode", "python"):
+            pool = BFInterpreterPool(CODE, engine=engine)
+            self.assertEqual(self.run_pool(pool, b"abc"), b"bcd")
+            self.assertEqual(self.run_pool(pool, b"xy"), b"yz")
+            self.assertEqual(pool.created, 1)
+
+    def test_program_is_shared(self):
+        pool = BFInterpreterPool(CODE)
+        first, second = pool.acquire(), pool.acquire()
+        self.assertEqual(pool.created, 2)
+        self.assertIs(first._get_program(), second._get_program())
+
+    def test_bytecode_is_shared(self):
+        for engine in ("ast", "python", "tracing"):
+            pool = BFInterpreterPool(CODE, engine=engine)
+            first, second = pool.acquire(), pool.acquire()
+            self.assertIs(first._get_bytecode_program(), second._get_bytecode_program(), engine)
+
+    def test_command_graph_is_shared(self):
+        for engine in ("ast", "tracing"):
+            pool = BFInterpreterPool(CODE, engine=engine)
+            first, second = pool.acquire(BytesIO(b"a"), BytesIO()), pool.acquire(BytesIO(b"b"), BytesIO())
+            self.assertIs(first._get_ast(), second._get_ast())
+            self.assertIs(first._cached_tracer, second._cached_tracer)
+            first.execute()
+            second.execute()
+            self.assertEqual(second.env.output_buffer.stream.getvalue(), b"c")
+            self.assertEqual(pool.created, 2)
+
+    def test_tape_is_cleared_on_release(self):
+        pool = BFInterpreterPool("+++>++")
+        with pool.interpreter() as interpreter:
+            interpreter.execute()
+            cells = interpreter.env.cells
+        with pool.interpreter() as interpreter:
+            self.assertIs(interpreter.env.cells, cells)
+            self.assertFalse(any(cells))
+            self.assertTrue(interpreter.env.pristine)
+
+    def test_fresh_tape_program_is_not_recompiled(self):
+        pool = BFInterpreterPool("+++.")
+        with pool.interpreter(output_stream=BytesIO()) as interpreter:
+            interpreter.execute()
+            program = interpreter._get_program()
+        with pool.interpreter(output_stream=BytesIO()) as interpreter:
+            interpreter.execute()
+            self.assertIs(interpreter._get_program(), program)
+
+    def test_max_idle(self):
+        pool = BFInterpreterPool(CODE, max_idle=1)
+        interpreters = [pool.acquire() for _ in range(3)]
+        for interpreter in interpreters:
+            pool.release(interpreter)
+        self.assertEqual(len(pool._idle), 1)
+
+    def test_limits(self):
+        pool = BFInterpreterPool("+[]")
+        with self.assertRaises(BFStepLimitExceeded):
+            pool.execute(max_steps=10)
+        self.assertEqual(len(pool._idle), 1)
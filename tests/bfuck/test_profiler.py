@@ -0,0 +1,69 @@
+import unittest
+from io import BytesIO, StringIO
+
+from interpreters import BrainFuckInterpreter
+from interpreters.bfuck.ast_builder import BEASTBuilder, walk_ast
+from interpreters.bfuck.environment import BFEnvironment
+from interpreters.bfuck.profiler import BFProfiler
+
+
+class TestBFProfiler(unittest.TestCase):
+
+    def profile(self, code, optimize=False):
+        interpreter = BrainFuckInterpreter(code, optimize=optimize, input_stream=BytesIO(), output_stream=BytesIO())
+        return interpreter.profile()
+
+    def test_builder_records_source_positions(self):
+        ast = BEASTBuilder("a++ >[-]").build_ast()
+        self.assertEqual([command.position for command in walk_ast(ast)], [1, 4, 5, 6, 7])
+
+    def test_command_counts(self):
+        profile = self.profile("+++[-]")
+        self.assertEqual([(command.operator, command.executions) for command in profile.commands],
+                         [("+++", 1), ("[", 1), ("-", 3), ("]", 3)])
+        self.assertEqual(profile.executions, 8)
+
+    def test_loop_counts(self):
+        loop, = self.profile("++[>+++[-]<-]").loops[:1]
+        self.assertEqual(loop.start, 7)
+        self.assertEqual(loop.entries, 2)
+        self.assertEqual(loop.iterations, 6)
+
+    def test_loop_executions_include_nested_loops(self):
+        profile = self.profile("++[>+++[-]<-]")
+        outer, = [loop for loop in profile.loops if loop.start == 2]
+        self.assertEqual(outer.executions, profile.executions - 1)
+        self.assertEqual(profile.hot_loops(1), [outer])
+
+    def test_skipped_loop(self):
+        loop, = self.profile("[+]").loops
+        self.assertEqual((loop.entries, loop.iterations, loop.executions), (1, 0, 1))
+
+    def test_optimized_commands_keep_positions(self):
+        profile = self.profile(">,[->+<]", optimize=True)
+        self.assertEqual([command.position for command in profile.commands], [1, 2, 0])
+        self.assertEqual(profile.loops, [])
+
+    def test_report(self):
+        report = self.profile("+\n++[>+++[-]<-]").report()
+        lines = report.splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertIn("2:3", lines[2])
+        self.assertIn("[>+++[-]<-]", lines[2])
+
+    def test_report_on_file_object_sources(self):
+        for source in (StringIO("+\n++[>+++[-]<-]"), BytesIO(b"+\n++[>+++[-]<-]")):
+            profile = self.profile(source)
+            self.assertIsNone(profile.line_column(4))
+            line = profile.report().splitlines()[2].split()
+            self.assertEqual(line[1:3], ["4", "?"])
+
+    def test_output_is_flushed(self):
+        output_stream = BytesIO()
+        BrainFuckInterpreter("+" * 65 + ".", output_stream=output_stream).profile()
+        self.assertEqual(output_stream.getvalue(), b"A")
+
+    def test_run_leaves_environment_like_execute(self):
+        env = BFEnvironment()
+        BFProfiler(BEASTBuilder("++>+++").build_ast()).run(env)
+        self.assertEqual(env.current_cell, 3)
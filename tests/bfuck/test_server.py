@@ -0,0 +1,100 @@
+import json
+import unittest
+import urllib.error
+import urllib.request
+from collections import OrderedDict
+
+from interpreters.bfuck import server
+from interpreters.bfuck.server import BFServer, BFServerMetrics
+
+
+class FakeConnection:
+
+    def __init__(self):
+        self.messages = []
+
+    def send(self, message):
+        self.messages.append(message)
+
+
+class TestBFServerWorker(unittest.TestCase):
+    SETTINGS = dict(engine="bytecode", optimize=True, cell_bits=8, eof=0, max_programs=2)
+
+    def test_pools_are_kept_per_program(self):
+        pools = OrderedDict()
+        pool = server._get_pool(pools, ",[.,]", self.SETTINGS)
+        self.assertIs(server._get_pool(pools, ",[.,] same program", self.SETTINGS), pool)
+        for code in ("+", "-"):
+            server._get_pool(pools, code, self.SETTINGS)
+        self.assertEqual(len(pools), 2)
+
+    def test_output_limit(self):
+        connection = FakeConnection()
+        output = server._PipeOutput(connection, limit=3)
+        output.write(b"ab")
+        with self.assertRaises(server.BFOutputLimitExceeded):
+            output.write(b"cd")
+        self.assertEqual(connection.messages, [("output", b"ab"), ("output", b"c")])
+
+
+class TestBFServerMetrics(unittest.TestCase):
+
+    def test_latency_percentiles(self):
+        metrics = BFServerMetrics()
+        for error in (None, "BFDeadlineExceeded"):
+            metrics.queued()
+            metrics.started()
+            metrics.finished(error)
+        snapshot = metrics.snapshot()
+        self.assertEqual((snapshot["completed"], snapshot["failed"], snapshot["queue_depth"]), (2, 1, 0))
+        self.assertEqual(snapshot["latency_seconds"]["count"], 2)
+        self.assertLessEqual(snapshot["latency_seconds"]["p50"], snapshot["latency_seconds"]["max"])
+
+
+class TestBFServer(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = BFServer(workers=1, max_output=100).start()
+        host, port = cls.server.address
+        cls.url = f"http://{host}:{port}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.close()
+
+    def post(self, job):
+        request = urllib.request.Request(self.url + "/run", data=json.dumps(job).encode(), method="POST")
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return [json.loads(line) for line in response.read().splitlines()]
+
+    def test_run(self):
+        lines = self.post({"code": ",[+.,]", "input": "abc"})
+        self.assertEqual(lines, [{"output": "bcd"}, {"error": None, "stats": None}])
+
+    def test_limits(self):
+        lines = self.post({"code": "+[]", "max_steps": 10})
+        self.assertEqual(lines[-1]["error"], "BFStepLimitExceeded")
+        self.assertEqual(lines[-1]["stats"]["steps"], 11)
+        lines = self.post({"code": "+[.]"})
+        self.assertEqual(lines[0], {"output": "\x01" * 100})
+        self.assertEqual(lines[-1]["error"], "BFOutputLimitExceeded")
+
+    def test_bad_job(self):
+        for job in ({"input": "a"}, {"code": "+", "timeout": "soon"}, {"code": ",", "input": "ሴ"}):
+            with self.assertRaises(urllib.error.HTTPError) as context:
+                self.post(job)
+            self.assertEqual(context.exception.code, 400)
+
+    def test_dead_worker_is_replaced(self):
+        self.server._workers[0].kill()
+        self.assertEqual(self.post({"code": "+."})[-1]["error"], "BFWorkerLost")
+        self.assertEqual(self.post({"code": "+."}), [{"output": "\x01"}, {"error": None, "stats": None}])
+
+    def test_metrics(self):
+        self.post({"code": "+"})
+        with urllib.request.urlopen(self.url + "/metrics", timeout=30) as response:
+            metrics = json.loads(response.read())
+        self.assertEqual(metrics["workers"], 1)
+        self.assertEqual(metrics["queue_depth"], 0)
+        self.assertGreater(metrics["completed"], 0)
@@ -0,0 +1,135 @@
+import unittest
+from io import BytesIO, StringIO
+
+from interpreters import BrainFuckInterpreter
+from interpreters.bfuck.streams import BFOutputBuffer, BFInputBuffer, EOF_ZERO, EOF_MINUS_ONE, EOF_UNCHANGED
+
+
+class CountingBytesIO(BytesIO):
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.reads = 0
+
+    def read1(self, size=-1):
+        self.reads += 1
+        return super().read1(size)
+
+
+class TestBFOutputBuffer(unittest.TestCase):
+
+    def test_write_is_buffered(self):
+        stream = BytesIO()
+        output = BFOutputBuffer(stream)
+        output.write(65)
+        self.assertEqual(stream.getvalue(), b"")
+        output.flush()
+        self.assertEqual(stream.getvalue(), b"A")
+        self.assertEqual(output.written, 1)
+
+    def test_write_reports_full_buffer(self):
+        output = BFOutputBuffer(BytesIO(), buffer_size=2)
+        self.assertFalse(output.write(1))
+        self.assertTrue(output.write(2))
+
+    def test_write_truncates_wide_cells(self):
+        stream = BytesIO()
+        output = BFOutputBuffer(stream)
+        output.write(0x141)
+        output.flush()
+        self.assertEqual(stream.getvalue(), b"A")
+
+    def test_text_stream(self):
+        stream = StringIO()
+        output = BFOutputBuffer(stream)
+        output.write(0xE9)
+        output.flush()
+        self.assertEqual(stream.getvalue(), "\xe9")
+
+    def test_take(self):
+        output = BFOutputBuffer(BytesIO())
+        output.write(1)
+        self.assertEqual(output.take(), b"\x01")
+        self.assertEqual(output.take(), b"")
+
+
+class TestBFInputBuffer(unittest.TestCase):
+
+    def test_reads_in_chunks(self):
+        stream = CountingBytesIO(b"abcdef")
+        input_buffer = BFInputBuffer(stream, chunk_size=4)
+        self.assertEqual([input_buffer.read() for _ in range(6)], list(b"abcdef"))
+        self.assertEqual(stream.reads, 2)
+        self.assertEqual(input_buffer.consumed, 6)
+
+    def test_skip(self):
+        input_buffer = BFInputBuffer(BytesIO(b"abcdefghij"), chunk_size=4)
+        input_buffer.read()
+        input_buffer.skip(6)
+        self.assertEqual(input_buffer.consumed, 7)
+        self.assertEqual(input_buffer.read(), ord("h"))
+        input_buffer.skip(10)
+        self.assertEqual(input_buffer.read(), 0)
+
+    def test_text_stream(self):
+        input_buffer = BFInputBuffer(StringIO("a\n\xe9"))
+        self.assertEqual([input_buffer.read() for _ in range(3)], [ord("a"), ord("\n"), 0xE9])
+
+    def test_eof_zero(self):
+        input_buffer = BFInputBuffer(BytesIO(b""), eof=EOF_ZERO)
+        self.assertEqual(input_buffer.read(7), 0)
+
+    def test_eof_minus_one(self):
+        input_buffer = BFInputBuffer(BytesIO(b""), eof=EOF_MINUS_ONE)
+        self.assertEqual(input_buffer.read(7), -1)
+
+    def test_eof_unchanged(self):
+        input_buffer = BFInputBuffer(BytesIO(b""), eof=EOF_UNCHANGED)
+        self.assertEqual(input_buffer.read(7), 7)
+
+    def test_invalid_eof(self):
+        with self.assertRaises(ValueError):
+            BFInputBuffer(eof=3)
+
+    def test_before_read_is_called_before_blocking(self):
+        calls = []
+        input_buffer = BFInputBuffer(BytesIO(b"ab"), before_read=lambda: calls.append(True))
+        input_buffer.read()
+        input_buffer.read()
+        self.assertEqual(len(calls), 1)
+
+
+class TestBFInterpreterStreams(unittest.TestCase):
+
+    def test_binary_streams(self):
+        for engine in ("ast", "bytecode", "python"):
+            output_stream = BytesIO()
+            code = ",[.,]"
+            interpreter = BrainFuckInterpreter(code, engine=engine, input_stream=BytesIO(b"\x00\xffhi\n"),
+                                               output_stream=output_stream)
+            interpreter.execute()
+            self.assertEqual(output_stream.getvalue(), b"", engine)
+            interpreter = BrainFuckInterpreter(code, engine=engine, input_stream=BytesIO(b"\xffhi\n"),
+                                               output_stream=output_stream)
+            interpreter.execute()
+            self.assertEqual(output_stream.getvalue(), b"\xffhi\n", engine)
+
+    def test_eof_behaviours(self):
+        for engine in ("ast", "bytecode", "python"):
+            for eof, expected in ((EOF_ZERO, 0), (EOF_MINUS_ONE, 255), (EOF_UNCHANGED, 5)):
+                interpreter = BrainFuckInterpreter("+++++,", engine=engine, input_stream=BytesIO(), eof=eof)
+                interpreter.execute()
+                self.assertEqual(interpreter.env.current_cell, expected, (engine, eof))
+
+    def test_prompt_is_flushed_before_reading(self):
+        output_stream = BytesIO()
+
+        class Input(BytesIO):
+            def read1(self, size=-1):
+                self.seen = output_stream.getvalue()
+                return super().read1(size)
+
+        input_stream = Input(b"x")
+        BrainFuckInterpreter("+" * 63 + ".,", engine="bytecode", input_stream=input_stream,
+                             output_stream=output_stream).execute()
+        self.assertEqual(input_stream.seen, b"?")
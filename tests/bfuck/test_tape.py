@@ -0,0 +1,99 @@
+import unittest
+from io import BytesIO
+
+from interpreters import BrainFuckInterpreter
+from interpreters.bfuck.environment import BFEnvironment
+from interpreters.bfuck.tape import BFPagedTape, BFTapeLimitExceeded, PAGE_CELLS
+
+
+class TestBFPagedTape(unittest.TestCase):
+
+    def setUp(self):
+        self.tape = BFPagedTape()
+
+    def test_starts_empty(self):
+        self.assertEqual(self.tape[12345], 0)
+        self.assertEqual(self.tape.nbytes, 0)
+
+    def test_pages_are_allocated_on_write(self):
+        self.tape[3] = 7
+        self.tape[PAGE_CELLS - 1] = 1
+        self.assertEqual(self.tape[3], 7)
+        self.assertEqual(len(self.tape.pages), 1)
+        self.tape[PAGE_CELLS] = 1
+        self.assertEqual(len(self.tape.pages), 2)
+
+    def test_zeros_allocate_nothing(self):
+        self.tape[3] = 0
+        self.assertFalse(self.tape.pages)
+
+    def test_negative_indexes(self):
+        self.tape[-1] = 5
+        self.tape[-PAGE_CELLS * 3] = 6
+        self.assertEqual((self.tape[-1], self.tape[-PAGE_CELLS * 3], self.tape[PAGE_CELLS - 1]), (5, 6, 0))
+
+    def test_page_limit(self):
+        tape = BFPagedTape(max_pages=1)
+        tape[0] = 1
+        tape[PAGE_CELLS - 1] = 1
+        with self.assertRaises(BFTapeLimitExceeded):
+            tape[PAGE_CELLS] = 1
+        with self.assertRaises(MemoryError):
+            tape[-1] = 1
+
+    def test_wide_cells(self):
+        tape = BFPagedTape("H")
+        tape[-2] = 0xFFFF
+        self.assertEqual(tape[-2], 0xFFFF)
+        self.assertEqual(tape.nbytes, PAGE_CELLS * 2)
+
+    def test_used_and_load(self):
+        self.tape[-3] = 1
+        self.tape[PAGE_CELLS * 2] = 2
+        start, data = self.tape.used()
+        self.assertEqual((start, len(data)), (-PAGE_CELLS, PAGE_CELLS * 4))
+        tape = BFPagedTape()
+        tape.load(start, data)
+        self.assertEqual((tape[-3], tape[PAGE_CELLS * 2]), (1, 2))
+        self.assertEqual(len(tape.pages), 2)
+
+
+class TestBFEnvironmentPagedTape(unittest.TestCase):
+
+    def test_no_flat_view(self):
+        env = BFEnvironment(paged=True)
+        env.current_cell = 4
+        with self.assertRaisesRegex(TypeError, "Paged tapes have no flat view"):
+            env.tape_view()
+        start, data = env.cells.used()
+        self.assertEqual(data[env.cell_pointer - start], 4)
+
+
+class TestBFInterpreterPagedTape(unittest.TestCase):
+    CODE = "<" * 40000 + "+." + ">" * 80000 + "+++.[<]"
+
+    def test_runs_off_both_ends_of_the_flat_tape(self):
+        for engine in ("ast", "bytecode", "python"):
+            output_stream = BytesIO()
+            interpreter = BrainFuckInterpreter(self.CODE, engine=engine, paged=True, output_stream=output_stream)
+            interpreter.execute()
+            self.assertEqual(output_stream.getvalue(), b"\x01\x03")
+            self.assertEqual(interpreter.env.cells.nbytes, 2 * PAGE_CELLS)
+
+    def test_tape_cap(self):
+        interpreter = BrainFuckInterpreter(self.CODE, paged=True, max_tape_bytes=PAGE_CELLS,
+                                           output_stream=BytesIO())
+        with self.assertRaises(BFTapeLimitExceeded):
+            interpreter.execute()
+
+    def test_checkpoints(self):
+        code = "<" * 5000 + "+" + ">" * 10000 + "++++++++++[-.]"
+        snapshot = next(BrainFuckInterpreter(code, paged=True, output_stream=BytesIO()).checkpoints(back_edges=3))
+        self.assertIsNone(snapshot.tape_length)
+        output_stream = BytesIO()
+        interpreter = BrainFuckInterpreter(code, paged=True, output_stream=output_stream)
+        interpreter.resume(snapshot)
+        self.assertEqual(output_stream.getvalue(), bytes(range(6, -1, -1)))
+        self.assertEqual(interpreter.env.cells[-5000], 1)
+        with self.assertRaises(ValueError):
+            BrainFuckInterpreter(code).resume(snapshot)
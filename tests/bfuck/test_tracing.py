@@ -0,0 +1,119 @@
+import unittest
+from io import BytesIO
+
+from examples.bfuck import SIERPINSKI_TRINAGLE
+from interpreters import BrainFuckInterpreter
+from interpreters.bfuck.ast_builder import BEASTBuilder, walk_ast
+from interpreters.bfuck.bytecode import BFBytecodeCompiler
+from interpreters.bfuck.environment import BFEnvironment
+from interpreters.bfuck.pool import BFInterpreterPool
+from interpreters.bfuck.tracing import BFCompiledLoopCommand, BFTracer
+
+
+class TestBFTracer(unittest.TestCase):
+
+    def trace(self, code, hot_loop, input_data=b""):
+        self.env = BFEnvironment(input_stream=BytesIO(input_data), output_stream=BytesIO())
+        tracer = BFTracer(BEASTBuilder(code).build_ast(), hot_loop=hot_loop)
+        tracer.run(self.env)
+        self.env.output_buffer.flush()
+        return tracer
+
+    def output(self):
+        return self.env.output_buffer.stream.getvalue()
+
+    def compiled_loops(self, tracer):
+        return [command for command in walk_ast(tracer.root) if type(command) is BFCompiledLoopCommand]
+
+    def test_cold_loops_are_interpreted(self):
+        tracer = self.trace("+++++[>++<-]>.", hot_loop=10)
+        self.assertEqual(self.output(), b"\x0a")
+        self.assertEqual(tracer.compiled, 0)
+        self.assertEqual(self.compiled_loops(tracer), [])
+
+    def test_hot_loop_is_compiled_mid_run(self):
+        tracer = self.trace("+++++[>++<-]>.", hot_loop=3)
+        self.assertEqual(self.output(), b"\x0a")
+        self.assertEqual(tracer.compiled, 1)
+        self.assertEqual(self.env.cell_pointer, BFEnvironment.N_CELLS + 1)
+
+    def test_inner_loop_is_compiled_first(self):
+        code = "++++[>+++++[>++<-]<-]>>."
+        tracer = self.trace(code, hot_loop=6)
+        self.assertEqual(self.output(), b"\x28")
+        self.assertEqual(tracer.compiled, 1)
+        [loop] = self.compiled_loops(tracer)
+        self.assertEqual(loop.position, code.index("[>++<"))
+
+    def test_outer_loop_is_compiled_later(self):
+        tracer = self.trace("++++++++[>+++++[>++<-]<-]>>.", hot_loop=5)
+        self.assertEqual(self.output(), b"\x50")
+        self.assertEqual(tracer.compiled, 2)
+
+    def test_loop_at_the_root(self):
+        env = BFEnvironment(output_stream=BytesIO())
+        env.cells[env.cell_pointer] = 50
+        tracer = BFTracer(BEASTBuilder("[>+<-]>.").build_ast(), hot_loop=2)
+        tracer.run(env)
+        self.assertIsInstance(tracer.root, BFCompiledLoopCommand)
+        env.output_buffer.flush()
+        self.assertEqual(env.output_buffer.stream.getvalue(), b"\x32")
+
+    def test_io_in_compiled_loops(self):
+        self.trace(",[+.,]", hot_loop=2, input_data=b"abcdef")
+        self.assertEqual(self.output(), b"bcdefg")
+
+    def test_graph_still_walks_like_the_source(self):
+        code = "++++[>+++++[>++<-]<-]>>[-]."
+        env = BFEnvironment(output_stream=BytesIO())
+        tracer = BFTracer(BEASTBuilder(code).build_ast(), hot_loop=2)
+        tracer.run(env)
+        self.assertEqual(tracer.compiled, 3)
+        expected = BFBytecodeCompiler(BEASTBuilder(code).build_ast()).compile()
+        program = BFBytecodeCompiler(tracer.ast).compile()
+        self.assertEqual((program.ops, program.args, program.jumps), (expected.ops, expected.args, expected.jumps))
+
+
+class TestTracingEngine(unittest.TestCase):
+
+    def run_program(self, code, engine, input_data=b""):
+        output_stream = BytesIO()
+        BrainFuckInterpreter(code, engine=engine, input_stream=BytesIO(input_data),
+                             output_stream=output_stream).execute()
+        return output_stream.getvalue()
+
+    def test_matches_the_ast_engine(self):
+        self.assertEqual(self.run_program(SIERPINSKI_TRINAGLE, "tracing"), self.run_program(SIERPINSKI_TRINAGLE, "ast"))
+
+    def test_compiled_loops_survive_runs(self):
+        pool = BFInterpreterPool("+[>++++[>+<-]<+]>>.", engine="tracing", optimize=False)
+        for _ in range(2):
+            output_stream = BytesIO()
+            with pool.interpreter(output_stream=output_stream) as interpreter:
+                interpreter.execute()
+            self.assertEqual(output_stream.getvalue(), b"\xfc")
+        self.assertEqual(pool.created, 1)
+        self.assertEqual(interpreter._cached_tracer.compiled, 2)
+
+    def test_profile_counts_compiled_loops(self):
+        interpreter = BrainFuckInterpreter("+" * 200 + "[>+>++<<-]>[-].", engine="tracing", optimize=False,
+                                           output_stream=BytesIO())
+        interpreter.execute()
+        self.assertEqual(interpreter._cached_tracer.compiled, 2)
+        interpreter.env.reset()
+        profile = interpreter.profile()
+        self.assertEqual([(loop.entries, loop.iterations) for loop in profile.loops], [(1, 200), (1, 200)])
+        self.assertIn("[>+>++<<-]", profile.report())
+
+    def test_checkpoints_see_the_whole_program(self):
+        code = "+[>++++[>+<-]<+]>>."
+        interpreter = BrainFuckInterpreter(code, engine="tracing", optimize=False, output_stream=BytesIO())
+        interpreter.execute()
+        self.assertEqual(interpreter._cached_tracer.compiled, 2)
+        bytecode = BFBytecodeCompiler(interpreter._get_ast()).compile()
+        fresh = BrainFuckInterpreter(code, engine="bytecode", optimize=False)
+        self.assertEqual(bytecode.dumps(), fresh._get_program().dumps())
+
+
+if __name__ == '__main__':
+    unittest.main()